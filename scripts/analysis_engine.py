@@ -0,0 +1,141 @@
+"""
+analysis_engine.py
+
+Bounded-concurrency engine for running image analysis calls in parallel.
+Almost all of the time spent on a folder is network wait on generate_content,
+so several requests are kept in flight at once while each API key is capped
+at a fixed number of concurrent calls.
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.key_scheduler import KeyScheduler
+
+
+class KeySlots:
+    """
+    Hands out API keys so that no key carries more than `per_key_limit`
+    concurrent requests. The least busy key is handed out first, or, with a
+    KeyScheduler, the key with the most RPM/RPD headroom among those with a
+    free slot.
+    """
+
+    def __init__(self, api_keys: List[str], per_key_limit: int = 2,
+                 scheduler: Optional[KeyScheduler] = None):
+        if not api_keys:
+            raise ValueError("At least one API key is required")
+        self.per_key_limit = max(1, per_key_limit)
+        self.scheduler = scheduler
+        self._in_use: Dict[str, int] = {key: 0 for key in api_keys}
+        self._cond = threading.Condition()
+
+    @property
+    def capacity(self) -> int:
+        """Total number of calls that may be in flight across all keys"""
+        return len(self._in_use) * self.per_key_limit
+
+    def acquire(self) -> str:
+        """Block until a key has a free slot (and quota), then reserve it"""
+        with self._cond:
+            while True:
+                free = [key for key, count in self._in_use.items() if count < self.per_key_limit]
+                timeout = None
+                if free and self.scheduler is None:
+                    key = min(free, key=self._in_use.get)
+                elif free:
+                    key = self.scheduler.try_acquire(free)
+                    # Out of quota: wake up when the first free key refills
+                    timeout = self.scheduler.wait_time(free) if key is None else None
+                else:
+                    key = None
+                if key is not None:
+                    self._in_use[key] += 1
+                    return key
+                self._cond.wait(timeout)
+
+    def release(self, key: str):
+        """Return a slot taken with acquire()"""
+        with self._cond:
+            self._in_use[key] -= 1
+            self._cond.notify()
+
+
+class AnalysisEngine:
+    """
+    Runs `analyze_fn(item, api_key)` over a stream of items with at most
+    `max_in_flight` calls outstanding.
+
+    Results are yielded from run() as (item, result) pairs, either as soon as
+    each call finishes (streaming, the default) or in input order.
+    With a scheduler, calls are also paced to each key's RPM/RPD budget.
+    """
+
+    def __init__(self, api_keys: List[str], analyze_fn: Callable[[Any, str], Any],
+                 max_in_flight: int = 8, per_key_limit: int = 2,
+                 scheduler: Optional[KeyScheduler] = None):
+        self.key_slots = KeySlots(api_keys, per_key_limit, scheduler)
+        self.analyze_fn = analyze_fn
+        # More workers than key slots would only sit blocked in acquire()
+        self.max_in_flight = max(1, min(max_in_flight, self.key_slots.capacity))
+
+    def _call(self, item):
+        key = self.key_slots.acquire()
+        try:
+            return self.analyze_fn(item, key)
+        finally:
+            self.key_slots.release(key)
+
+    def run(self, items: Iterable, ordered: bool = False) -> Iterator[Tuple[Any, Any]]:
+        """
+        Analyze all items, yielding (item, result) pairs.
+
+        Args:
+            items: Iterable of work items (e.g. image paths); consumed lazily
+            ordered: If True, yield results in input order instead of
+                     completion order
+
+        Exceptions raised by analyze_fn are re-raised from the generator.
+        """
+        source = iter(enumerate(items))
+        pending = {}
+        finished = {}
+        next_index = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            def submit_next() -> bool:
+                try:
+                    index, item = next(source)
+                except StopIteration:
+                    return False
+                pending[executor.submit(self._call, item)] = (index, item)
+                return True
+
+            try:
+                while len(pending) < self.max_in_flight and submit_next():
+                    pass
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index, item = pending.pop(future)
+                        result = future.result()
+                        submit_next()
+
+                        if not ordered:
+                            yield item, result
+                            continue
+
+                        finished[index] = (item, result)
+                        while next_index in finished:
+                            yield finished.pop(next_index)
+                            next_index += 1
+            finally:
+                # Caller stopped early or a call failed: drop queued work
+                for future in pending:
+                    future.cancel()
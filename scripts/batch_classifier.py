@@ -0,0 +1,214 @@
+"""
+batch_classifier.py
+
+Batched yes/no image classification with Gemini.
+Packs several images into one generate_content call (or several queries
+against one image) and asks for a JSON verdict per index, so the fixed
+per-request overhead is paid once per batch instead of once per item.
+Anything that can't be parsed is reported back to the caller, which falls
+back to single-image, single-query calls for those items.
+"""
+
+import os
+import re
+import sys
+import json
+from typing import Dict, List, Tuple
+
+from google.genai import types
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODEL_NAME = "gemini-2.0-flash-exp"
+
+BATCH_PROMPT = """You will be shown {count} images, labelled "Image 0" to "Image {last}".
+For EACH image, decide whether it matches the following description:
+
+"{criteria}"
+
+Important instructions:
+- Judge every image independently
+- Focus on the main subject of the image
+- Ignore irrelevant background details
+- Consider all the criteria mentioned in the description
+
+Respond with ONLY a JSON array containing exactly {count} objects, one per image, in order:
+[{{"index": 0, "match": true, "explanation": "brief reason"}}, ...]"""
+
+
+MULTI_QUERY_PROMPT = """Analyze this image carefully and decide, for EACH of the {count} descriptions below, whether the image matches it:
+
+{descriptions}
+
+Important instructions:
+- Judge every description independently
+- Focus on the main subject of the image
+- Ignore irrelevant background details
+- Consider all the criteria mentioned in each description
+
+Respond with ONLY a JSON array containing exactly {count} objects, one per description, in order:
+[{{"index": 0, "match": true, "explanation": "brief reason"}}, ...]"""
+
+
+def build_batch_contents(criteria: str, image_parts: List) -> List:
+    """Interleave a label before each image so the model can refer to indices"""
+    contents = [BATCH_PROMPT.format(count=len(image_parts), last=len(image_parts) - 1, criteria=criteria)]
+    for i, part in enumerate(image_parts):
+        contents.append(f"Image {i}:")
+        contents.append(part)
+    return contents
+
+
+def parse_batch_response(text: str, count: int) -> Dict[int, Tuple[bool, str]]:
+    """
+    Parse and validate the model's JSON verdicts.
+
+    Returns:
+        {index: (is_match, explanation)} for every item that parsed cleanly.
+        Missing, duplicated or malformed items are left out.
+    """
+    # Tolerate ```json fences and chatter around the array
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        items = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    results = {}
+    duplicates = set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index")
+        verdict = item.get("match")
+        if isinstance(verdict, str) and verdict.strip().lower() in ("yes", "no", "true", "false"):
+            verdict = verdict.strip().lower() in ("yes", "true")
+        if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < count:
+            continue
+        if not isinstance(verdict, bool):
+            continue
+        if index in results:
+            duplicates.add(index)
+        explanation = str(item.get("explanation", "")).strip()
+        # Keep the same "Yes/No, reason" shape as single-image answers
+        results[index] = (verdict, f"{'Yes' if verdict else 'No'}, {explanation}" if explanation
+                          else ("Yes" if verdict else "No"))
+
+    # Conflicting answers for the same image are not trustworthy
+    for index in duplicates:
+        del results[index]
+    return results
+
+
+def classify_images(client, criteria: str, image_parts: List,
+                    model: str = MODEL_NAME) -> Dict[int, Tuple[bool, str]]:
+    """
+    Classify a batch of images in a single request.
+
+    Args:
+        client: genai.Client
+        criteria: Description the images are matched against
+        image_parts: types.Part images, in batch order
+
+    Returns:
+        {index: (is_match, explanation)} for every item that parsed;
+        callers should retry missing indices with single-image calls.
+        API errors are raised to the caller.
+    """
+    response = client.models.generate_content(
+        model=model,
+        contents=build_batch_contents(criteria, image_parts),
+        config=types.GenerateContentConfig(response_mime_type="application/json")
+    )
+    return parse_batch_response(response.text or "", len(image_parts))
+
+
+def classify_queries(client, criteria_list: List[str], image_part,
+                     model: str = MODEL_NAME) -> Dict[int, Tuple[bool, str]]:
+    """
+    Evaluate one image against several descriptions in a single request.
+
+    Returns:
+        {query_index: (is_match, explanation)} for every item that parsed;
+        callers should retry missing indices with single-query calls.
+        API errors are raised to the caller.
+    """
+    descriptions = "\n".join(f'Description {i}: "{criteria}"' for i, criteria in enumerate(criteria_list))
+    prompt = MULTI_QUERY_PROMPT.format(count=len(criteria_list), descriptions=descriptions)
+    response = client.models.generate_content(
+        model=model,
+        contents=[prompt, image_part],
+        config=types.GenerateContentConfig(response_mime_type="application/json")
+    )
+    return parse_batch_response(response.text or "", len(criteria_list))
+
+
+def chunked(items: List, size: int) -> List[List]:
+    """Split items into consecutive batches of at most size"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+if __name__ == "__main__":
+    import time
+    import argparse
+    from pathlib import Path
+    from scripts.client_pool import get_client
+    from scripts.query_expander import load_api_key
+    from scripts.thumbnails import ThumbnailCache
+    from scripts.media_loader import IMAGE_EXTENSIONS
+
+    parser = argparse.ArgumentParser(
+        description="Compare API calls and wall time per 1,000 images for different batch sizes"
+    )
+    parser.add_argument("folder", help="Folder of sample images")
+    parser.add_argument("--criteria", default="A person wearing a long-sleeve shirt with the sleeves rolled up")
+    parser.add_argument("--batch-sizes", default="1,4,8,16", help="Comma-separated batch sizes (default: 1,4,8,16)")
+    parser.add_argument("--limit", type=int, default=48, help="Images to sample from the folder (default: 48)")
+    args = parser.parse_args()
+
+    images = sorted(f for f in Path(args.folder).iterdir() if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS)
+    images = images[:args.limit]
+    if not images:
+        print(f"No images found in '{args.folder}'")
+        sys.exit(1)
+
+    client = get_client(load_api_key())
+    thumbnails = ThumbnailCache()
+    # Thumbnails are prepared up front so only API time is measured
+    parts = [types.Part.from_bytes(data=thumbnails.get_bytes(p), mime_type='image/jpeg') for p in images]
+
+    def single(part):
+        response = client.models.generate_content(
+            model=MODEL_NAME,
+            contents=[f'Does this image match: "{args.criteria}"? Answer ONLY "Yes" or "No", '
+                      f'followed by a brief explanation.', part]
+        )
+        return response.text.strip().lower().startswith("yes")
+
+    print(f"📊 Benchmarking {len(images)} images\n")
+    print(f"{'batch':>6} {'calls':>7} {'fallbacks':>10} {'wall s':>8} {'calls/1k':>9} {'s/1k imgs':>10}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        calls = fallbacks = 0
+        start = time.perf_counter()
+        for batch in chunked(parts, batch_size):
+            if batch_size == 1:
+                single(batch[0])
+                calls += 1
+                continue
+            results = classify_images(client, args.criteria, batch)
+            calls += 1
+            for i in range(len(batch)):
+                if i not in results:
+                    single(batch[i])
+                    calls += 1
+                    fallbacks += 1
+        elapsed = time.perf_counter() - start
+        scale = 1000 / len(images)
+        print(f"{batch_size:>6} {calls:>7} {fallbacks:>10} {elapsed:>8.1f} {calls * scale:>9.0f} {elapsed * scale:>10.0f}")
@@ -0,0 +1,82 @@
+"""
+cache_store.py
+
+Process-safe SQLite backend shared by the caches in this folder
+(image_cache.py, query_expander.py, content_hash.py, folder_manifest.py).
+
+Several Streamlit sessions and CLI runs can use the same cache files at once:
+- WAL journal, so readers never block the single writer
+- One connection per thread (no connection shared between threads)
+- A busy timeout instead of "database is locked" errors under contention
+- Explicit BEGIN IMMEDIATE transactions, so multi-statement updates are
+  atomic and never interleave with another process's writes
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+BUSY_TIMEOUT_SECONDS = 30
+
+
+class SQLiteStore:
+    """
+    Thin wrapper around a SQLite database file.
+
+    Args:
+        db_path: Database file; created if missing
+        setup: Optional fn(conn) that creates tables and indexes. It runs
+               once per store inside a write transaction, so two processes
+               starting at the same time can't race on schema changes.
+    """
+
+    def __init__(self, db_path, setup: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        if setup:
+            with self.transaction() as conn:
+                setup(conn)
+
+    def connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: autocommit, transactions are managed explicitly
+            conn = sqlite3.connect(str(self.db_path), timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            # Only takes effect on a brand new file, and must precede the WAL switch
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Atomic write transaction; rolled back if the block raises"""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def execute(self, sql: str, params: Iterable = ()) -> sqlite3.Cursor:
+        """Run a single statement (atomic on its own)"""
+        return self.connect().execute(sql, tuple(params))
+
+    def executemany(self, sql: str, rows: Iterable) -> int:
+        """Run a statement for many rows in one transaction; returns rows affected"""
+        with self.transaction() as conn:
+            return conn.executemany(sql, rows).rowcount
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,113 @@
+"""
+content_hash.py
+
+Two-tier content identity for media files.
+- Fast tier: (size, mtime_ns, inode) from a single stat() call, memoised in-process
+- Full tier: streaming BLAKE2b digest of the whole file, computed once and
+  persisted, so later runs only re-hash files whose fast key changed
+"""
+
+import sys
+import os
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.cache_store import SQLiteStore
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path) -> str:
+    """Streaming BLAKE2b digest of the full file contents"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fast_key(path) -> Tuple[int, int, int]:
+    """Cheap identity from file metadata: (size, mtime_ns, inode)"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class ContentHasher:
+    """
+    Maps file paths to full-content digests, re-hashing only when the
+    fast key of a file changes.
+    """
+
+    def __init__(self, db_file: str = "content_hashes.db"):
+        self.db_file = Path(__file__).parent / db_file
+        self._lock = threading.Lock()
+        self._memo: Dict[str, Tuple[Tuple[int, int, int], str]] = {}
+        self.store = SQLiteStore(self.db_file, lambda conn: conn.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            )
+        """))
+        self.stats = {"memo_hits": 0, "persisted_hits": 0, "hashed": 0}
+
+    def digest(self, path, key: Optional[Tuple[int, int, int]] = None) -> str:
+        """
+        Return the full-content digest of a file.
+
+        Args:
+            path: File to identify
+            key: Fast key if the caller already has the stat() result
+        """
+        path = str(path)
+        key = key or fast_key(path)
+
+        with self._lock:
+            memo = self._memo.get(path)
+            if memo and memo[0] == key:
+                self.stats["memo_hits"] += 1
+                return memo[1]
+
+        row = self.store.execute(
+            "SELECT size, mtime_ns, inode, digest FROM hashes WHERE path = ?", (path,)
+        ).fetchone()
+        if row and tuple(row[:3]) == key:
+            with self._lock:
+                self._memo[path] = (key, row[3])
+                self.stats["persisted_hits"] += 1
+            return row[3]
+
+        digest = hash_file(path)
+        self.store.execute(
+            "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)", (path, *key, digest)
+        )
+        with self._lock:
+            self._memo[path] = (key, digest)
+            self.stats["hashed"] += 1
+        return digest
+
+    def forget(self, path):
+        """Drop a path (e.g. after the file was deleted)"""
+        path = str(path)
+        with self._lock:
+            self._memo.pop(path, None)
+        self.store.execute("DELETE FROM hashes WHERE path = ?", (path,))
+
+
+_default_hasher = None
+_default_lock = threading.Lock()
+
+
+def get_hasher() -> ContentHasher:
+    """Process-wide ContentHasher, so every module shares one memo"""
+    global _default_hasher
+    with _default_lock:
+        if _default_hasher is None:
+            _default_hasher = ContentHasher()
+        return _default_hasher
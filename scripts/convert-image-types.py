@@ -1,64 +1,267 @@
+#!/usr/bin/env python3
+"""
+convert-image-types.py
+
+Convert HEIC photos (or other image types) to JPEG, WebP or PNG.
+Files are converted in parallel by a pool of worker processes. EXIF data,
+orientation and the color profile are kept. Outputs that are already newer
+than their source are skipped, so an interrupted run simply resumes. Each
+output is written to a temporary file first, so a half-written file never
+counts as done. Sources that would produce the same output name (IMG_1.heic
+and IMG_1.HEIF) keep their extension in the name (IMG_1_heic.jpg).
+"""
+
 import os
+import sys
+import time
+import argparse
 from pathlib import Path
-from PIL import Image
-from pillow_heif import register_heif_opener
+from concurrent.futures import ProcessPoolExecutor
+from PIL import ImageOps
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Register HEIF opener with Pillow
-register_heif_opener()
+# HEIC decoders are registered at import, so every worker process has them too
+from scripts.media_loader import HEIC_BACKEND, HEIC_EXTENSIONS, open_image
 
-# Hard-coded folder path - change this to your desired folder
+# Default folder when none is given on the command line
 FOLDER_PATH = "/Users/jay/Downloads/mumbai-photos"
 
-def convert_heic_to_png(folder_path):
+FORMATS = {
+    # name: (Pillow format, file extension)
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+    "png": ("PNG", ".png"),
+}
+DEFAULT_FORMAT = "jpeg"
+DEFAULT_QUALITY = 90
+DEFAULT_SOURCE_TYPES = ("heic", "heif")
+
+
+def find_sources(folder, source_types, recursive=False):
+    """All files in `folder` with one of the given extensions (case-insensitive), sorted"""
+    suffixes = {"." + ext.lower().lstrip(".") for ext in source_types}
+    pattern = "**/*" if recursive else "*"
+    return sorted(path for path in folder.glob(pattern)
+                  if path.is_file() and path.suffix.lower() in suffixes)
+
+
+def output_path_for(source, folder, output_dir, extension):
+    """Same name with the new extension, mirrored under output_dir if given"""
+    target_dir = output_dir / source.parent.relative_to(folder) if output_dir else source.parent
+    return target_dir / (source.stem + extension)
+
+
+def assign_targets(sources, folder, output_dir, extension):
     """
-    Convert all HEIC images in the specified folder to PNG format.
-    Keeps the same filename with .png extension.
-    Ignores all other file types.
+    Output path for every source that needs converting. Sources that would
+    write the same file (IMG_1.heic and IMG_1.HEIF, or a.png next to a.heic)
+    get their own extension added to the name (IMG_1_heic.jpg), so no output
+    overwrites another. Names are compared case-insensitively, as on the
+    default macOS and Windows file systems. Sources already in the target
+    format are left out.
+
+    Returns:
+        {source: target}
+
+    Raises:
+        ValueError: names still collide after disambiguation
+    """
+    targets = {}
+    for source in sources:
+        target = output_path_for(source, folder, output_dir, extension)
+        if target != source:
+            targets[source] = target
+    claims = {}
+    for source, target in targets.items():
+        claims.setdefault(str(target).casefold(), []).append(source)
+    for claimants in claims.values():
+        if len(claimants) > 1:
+            for source in claimants:
+                targets[source] = targets[source].with_name(f"{source.stem}_{source.suffix.lstrip('.')}{extension}")
+
+    owners = {}
+    for source, target in targets.items():
+        owner = owners.setdefault(str(target).casefold(), source)
+        if owner != source:
+            raise ValueError(f"{owner.name} and {source.name} would both be written to {target}")
+    return targets
+
+
+def is_up_to_date(source, target):
+    try:
+        return target.stat().st_mtime_ns >= source.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def convert_file(source, target, fmt, quality):
+    """
+    Worker: convert one image, keeping EXIF, orientation and color profile.
+
+    Returns:
+        (bytes_in, bytes_out, error); error is None on success
+    """
+    pil_format = FORMATS[fmt][0]
+    temp_path = target.with_name(f".{target.name}.part")
+    try:
+        with open_image(source) as img:
+            icc_profile = img.info.get("icc_profile")
+            # Bake the orientation into the pixels; the saved EXIF then says "upright"
+            image = ImageOps.exif_transpose(img)
+            exif = image.getexif()
+
+            if pil_format == "JPEG" and image.mode != "RGB":
+                image = image.convert("RGB")
+            elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+            options = {"exif": exif.tobytes()} if exif else {}
+            if icc_profile:
+                options["icc_profile"] = icc_profile
+            if pil_format == "JPEG":
+                options.update(quality=quality, optimize=True, subsampling="4:2:0" if quality < 90 else "4:4:4")
+            elif pil_format == "WEBP":
+                options.update(quality=quality, method=4)
+            else:
+                # PNG is lossless; compress_level 6 is far faster than optimize=True for a similar size
+                options.update(compress_level=6)
+
+            target.parent.mkdir(parents=True, exist_ok=True)
+            image.save(temp_path, pil_format, **options)
+        os.replace(temp_path, target)
+        return source.stat().st_size, target.stat().st_size, None
+    except Exception as e:
+        temp_path.unlink(missing_ok=True)
+        return 0, 0, str(e)
+
+
+def convert_images(folder_path, fmt=DEFAULT_FORMAT, quality=DEFAULT_QUALITY, output_dir=None,
+                   source_types=DEFAULT_SOURCE_TYPES, recursive=False, workers=None, force=False):
+    """
+    Convert every matching image in a folder.
+
+    Args:
+        folder_path: Folder with the source images
+        fmt: Target format: 'jpeg', 'webp' or 'png'
+        quality: JPEG/WebP quality (1-100; ignored for PNG)
+        output_dir: Where to write the converted files (default: next to the sources)
+        source_types: File extensions to convert
+        recursive: Include subfolders
+        workers: Worker processes (default: CPU count)
+        force: Convert even if the output is already up to date
+
+    Returns:
+        Summary dict: found, converted, skipped, failed, bytes_in, bytes_out, seconds
     """
     folder = Path(folder_path)
-    
+
     if not folder.exists():
         print(f"Error: Folder '{folder_path}' does not exist!")
-        return
-    
+        sys.exit(1)
+
     if not folder.is_dir():
         print(f"Error: '{folder_path}' is not a directory!")
-        return
-    
-    # Find all HEIC files (case-insensitive)
-    heic_files = list(folder.glob("*.heic")) + list(folder.glob("*.HEIC"))
-    
-    if not heic_files:
-        print(f"No HEIC files found in '{folder_path}'")
-        return
-    
-    print(f"Found {len(heic_files)} HEIC file(s) to convert...")
-    
-    converted = 0
-    failed = 0
-    
-    for heic_file in heic_files:
-        try:
-            # Open HEIC image
-            img = Image.open(heic_file)
-            
-            # Create PNG filename (same name, different extension)
-            png_filename = heic_file.stem + ".png"
-            png_path = folder / png_filename
-            
-            # Convert and save as PNG
-            img.save(png_path, "PNG")
-            
-            print(f"✓ Converted: {heic_file.name} → {png_filename}")
-            converted += 1
-            
-        except Exception as e:
-            print(f"✗ Failed to convert {heic_file.name}: {str(e)}")
-            failed += 1
-    
+        sys.exit(1)
+
+    sources = find_sources(folder, source_types, recursive)
+    if not sources:
+        print(f"No {'/'.join(t.upper() for t in source_types)} files found in '{folder_path}'")
+        sys.exit(0)
+
+    if HEIC_BACKEND is None and any(source.suffix.lower() in HEIC_EXTENSIONS for source in sources):
+        print("Error: HEIC support needs pillow-heif (pip install pillow-heif)")
+        sys.exit(1)
+
+    extension = FORMATS[fmt][1]
+    output_dir = Path(output_dir) if output_dir else None
+    try:
+        targets = assign_targets(sources, folder, output_dir, extension)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    renamed = [source for source, target in targets.items()
+               if target != output_path_for(source, folder, output_dir, extension)]
+    for source in renamed:
+        print(f"⚠ {source.name} shares its name with another file; writing {targets[source].name}")
+
+    jobs = []
+    skipped = 0
+    for source, target in targets.items():
+        if not force and is_up_to_date(source, target):
+            skipped += 1
+        else:
+            jobs.append((source, target))
+
+    print(f"Found {len(sources)} file(s): {len(jobs)} to convert to {fmt.upper()}, "
+          f"{skipped} already up to date")
+
+    summary = {"found": len(sources), "converted": 0, "skipped": skipped, "failed": 0,
+               "bytes_in": 0, "bytes_out": 0}
+    start = time.perf_counter()
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, min(8, len(jobs) // ((workers or os.cpu_count() or 1) * 4)))
+            results = executor.map(
+                convert_file,
+                [source for source, _ in jobs], [target for _, target in jobs],
+                [fmt] * len(jobs), [quality] * len(jobs),
+                chunksize=chunksize
+            )
+            for (source, target), (bytes_in, bytes_out, error) in zip(jobs, results):
+                if error:
+                    print(f"✗ Failed to convert {source.name}: {error}")
+                    summary["failed"] += 1
+                    continue
+                print(f"✓ Converted: {source.name} → {target.name} "
+                      f"({bytes_in / 1e6:.1f} MB → {bytes_out / 1e6:.1f} MB)")
+                summary["converted"] += 1
+                summary["bytes_in"] += bytes_in
+                summary["bytes_out"] += bytes_out
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert HEIC photos to JPEG, WebP or PNG, keeping EXIF and orientation",
+        epilog="Examples:\n"
+               "  python convert-image-types.py ~/Photos/trip\n"
+               "  python convert-image-types.py ~/Photos/trip --format webp --quality 80 -o ~/Photos/trip-web\n"
+               "  python convert-image-types.py ~/Scans --from png tiff --format jpeg -r",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("folder", nargs="?", default=FOLDER_PATH,
+                        help=f"Folder with the images to convert (default: {FOLDER_PATH})")
+    parser.add_argument("-f", "--format", choices=sorted(FORMATS), default=DEFAULT_FORMAT,
+                        help=f"Target format (default: {DEFAULT_FORMAT})")
+    parser.add_argument("-q", "--quality", type=int, default=DEFAULT_QUALITY,
+                        help=f"JPEG/WebP quality, 1-100 (default: {DEFAULT_QUALITY}; ignored for PNG)")
+    parser.add_argument("-o", "--output-dir", help="Write converted files here (default: next to the originals)")
+    parser.add_argument("--from", dest="source_types", nargs="+", default=list(DEFAULT_SOURCE_TYPES),
+                        help=f"Source file types to convert (default: {' '.join(DEFAULT_SOURCE_TYPES)})")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Include subfolders")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true", help="Reconvert files that are already up to date")
+    args = parser.parse_args()
+
+    if not 1 <= args.quality <= 100:
+        parser.error("--quality must be between 1 and 100")
+
+    summary = convert_images(
+        args.folder, fmt=args.format, quality=args.quality, output_dir=args.output_dir,
+        source_types=args.source_types, recursive=args.recursive, workers=args.workers, force=args.force
+    )
+
     print(f"\nConversion complete!")
-    print(f"Successfully converted: {converted}")
-    print(f"Failed: {failed}")
+    print(f"Successfully converted: {summary['converted']}")
+    print(f"Already up to date: {summary['skipped']}")
+    print(f"Failed: {summary['failed']}")
+    if summary["converted"]:
+        print(f"Throughput: {summary['converted'] / summary['seconds']:.1f} images/sec "
+              f"({summary['seconds']:.1f}s)")
+        print(f"Size: {summary['bytes_in'] / 1e6:.1f} MB → {summary['bytes_out'] / 1e6:.1f} MB")
+
 
 if __name__ == "__main__":
-    convert_heic_to_png(FOLDER_PATH)
\ No newline at end of file
+    main()
@@ -1,25 +1,62 @@
+"""
+download-gdrive-content.py
+
+Download a Google Drive folder (with all subfolders) using the Drive API.
+- Listings are paged with nextPageToken, so large folders are complete
+- Files are downloaded by a bounded pool of worker threads (one API client
+  per thread; the Google client is not thread-safe) while folders are still
+  being listed
+- Downloads go to <name>.part in chunks using HTTP Range requests, so an
+  interrupted run resumes where it stopped; the file is renamed into place
+  once its md5Checksum has been verified
+- Files that already exist locally with the same size and md5 are skipped
+
+The Drive service is passed in through a factory, so a fake service object
+(anything with files().list(...).execute() and files().get_media(fileId=...)
+returning a request with .headers and .execute()) can stand in for tests.
+"""
+
 import os
-import io
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-import pickle
 import re
+import sys
+import time
+import pickle
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List
 
 # If modifying these scopes, delete the file token.pickle.
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+LIST_FIELDS = "nextPageToken, files(id, name, mimeType, size, md5Checksum)"
+LIST_PAGE_SIZE = 1000
+
+DEFAULT_WORKERS = 4
+CHUNK_SIZE = 8 * 1024 * 1024
+NUM_RETRIES = 3
+MD5_READ_SIZE = 1024 * 1024
+
+DEFAULT_URL = "https://drive.google.com/drive/u/3/folders/1UIHQNDz5Fwr50LlFF-_N0jgbQVS_2wNF"
+DEFAULT_OUTPUT = "downloaded_files"
+
+
 def get_credentials():
     """Authenticate and get credentials"""
+    # Imported here so the download logic can be used (and tested) without the Google client libraries
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
     creds = None
-    
+
     # Token file stores user's access and refresh tokens
     if os.path.exists('token.pickle'):
         with open('token.pickle', 'rb') as token:
             creds = pickle.load(token)
-    
+
     # If there are no valid credentials, let the user log in
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
@@ -28,11 +65,11 @@ def get_credentials():
             flow = InstalledAppFlow.from_client_secrets_file(
                 'credentials.json', SCOPES)
             creds = flow.run_local_server(port=0)
-        
+
         # Save credentials for next run
         with open('token.pickle', 'wb') as token:
             pickle.dump(creds, token)
-    
+
     return creds
 
 def extract_folder_id(url):
@@ -41,113 +78,228 @@ def extract_folder_id(url):
         r'/folders/([a-zA-Z0-9-_]+)',
         r'id=([a-zA-Z0-9-_]+)',
     ]
-    
+
     for pattern in patterns:
         match = re.search(pattern, url)
         if match:
             return match.group(1)
-    
+
     return None
 
-def download_file(service, file_id, file_name, output_path):
-    """Download a single file"""
-    try:
-        request = service.files().get_media(fileId=file_id)
-        file_path = os.path.join(output_path, file_name)
-        
-        fh = io.FileIO(file_path, 'wb')
-        downloader = MediaIoBaseDownload(fh, request)
-        
-        done = False
-        print(f"  Downloading: {file_name}")
-        while not done:
-            status, done = downloader.next_chunk()
-            if status:
-                print(f"    Progress: {int(status.progress() * 100)}%", end='\r')
-        print(f"    ✓ Complete: {file_name}")
-        
-    except Exception as e:
-        print(f"    ✗ Error downloading {file_name}: {str(e)}")
+def file_md5(path):
+    """Hex md5 of a local file (Drive's md5Checksum format)"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(MD5_READ_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def is_up_to_date(file_path, item):
+    """Local file matches the Drive file's size and (if Drive has one) md5"""
+    if not os.path.exists(file_path):
+        return False
+    if 'size' in item and os.path.getsize(file_path) != int(item['size']):
+        return False
+    return 'md5Checksum' not in item or file_md5(file_path) == item['md5Checksum']
 
 def list_files_in_folder(service, folder_id):
-    """List all files and folders in a Google Drive folder"""
+    """List all files and folders in a Google Drive folder, following every page"""
     query = f"'{folder_id}' in parents and trashed=false"
-    results = service.files().list(
-        q=query,
-        fields="files(id, name, mimeType)",
-        pageSize=1000
-    ).execute()
-    
-    return results.get('files', [])
-
-def download_folder_recursive(service, folder_id, output_dir, folder_name=""):
-    """Recursively download all files and subfolders"""
-    # Create directory for current folder
-    current_dir = os.path.join(output_dir, folder_name) if folder_name else output_dir
-    os.makedirs(current_dir, exist_ok=True)
-    
-    print(f"\n📁 Processing folder: {folder_name or 'root'}")
-    
-    # Get all items in folder
-    items = list_files_in_folder(service, folder_id)
-    
-    if not items:
-        print("  (empty folder)")
-        return
-    
-    # Separate files and folders
-    files = [item for item in items if item['mimeType'] != 'application/vnd.google-apps.folder']
-    folders = [item for item in items if item['mimeType'] == 'application/vnd.google-apps.folder']
-    
-    # Download files
-    for file in files:
-        # Skip Google Docs, Sheets, Slides (need export instead of download)
-        if file['mimeType'].startswith('application/vnd.google-apps'):
-            print(f"  ⚠ Skipping Google Doc/Sheet/Slide: {file['name']}")
-            continue
-        
-        download_file(service, file['id'], file['name'], current_dir)
-    
-    # Recursively download subfolders
-    for folder in folders:
-        subfolder_path = folder['name']
-        download_folder_recursive(service, folder['id'], current_dir, subfolder_path)
+    items = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=query,
+            fields=LIST_FIELDS,
+            pageSize=LIST_PAGE_SIZE,
+            pageToken=page_token
+        ).execute(num_retries=NUM_RETRIES)
+        items.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return items
+
+def local_names(items):
+    """
+    Map file IDs to safe, unique local names. Drive allows slashes in names
+    and several files with the same name in one folder.
+    """
+    names, taken = {}, set()
+    for item in items:
+        name = item['name'].replace('/', '_').replace(os.sep, '_') or item['id']
+        stem, ext = os.path.splitext(name)
+        counter = 2
+        while name.lower() in taken:
+            name = f"{stem} ({counter}){ext}"
+            counter += 1
+        taken.add(name.lower())
+        names[item['id']] = name
+    return names
+
+def download_file(service, item, file_path):
+    """
+    Download one file in Range-request chunks, resuming a previous .part file.
+
+    Returns:
+        Number of bytes already present from an earlier run
+
+    Raises:
+        IOError: incomplete download, or its md5 doesn't match Drive's checksum
+    """
+    part_path = file_path + '.part'
+    size = int(item['size']) if 'size' in item else None
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if size is not None and offset > size:
+        # Not a prefix of this file (it changed on Drive); start over
+        offset = 0
+    resumed = offset
+
+    with open(part_path, 'ab' if offset else 'wb') as fh:
+        while size is None or offset < size:
+            request = service.files().get_media(fileId=item['id'])
+            request.headers['Range'] = f"bytes={offset}-{offset + CHUNK_SIZE - 1}"
+            data = request.execute(num_retries=NUM_RETRIES)
+            if not data:
+                break
+            fh.write(data)
+            offset += len(data)
+            if size is None and len(data) < CHUNK_SIZE:
+                break
+    if size is not None and offset < size:
+        raise IOError(f"download stopped at {offset} of {size} bytes")
+
+    if 'md5Checksum' in item and file_md5(part_path) != item['md5Checksum']:
+        os.remove(part_path)
+        raise IOError("md5 mismatch, discarded the partial download")
+    os.replace(part_path, file_path)
+    return resumed
+
+@dataclass
+class DownloadStats:
+    downloaded: int = 0
+    resumed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    bytes: int = 0
+    errors: List[str] = field(default_factory=list)
+
+def download_folder(service_factory: Callable, folder_id, output_dir, workers=DEFAULT_WORKERS):
+    """
+    Download a folder tree. Folders are listed breadth-first on the calling
+    thread; each file is handed to the worker pool as soon as it is listed.
+
+    Args:
+        service_factory: Zero-argument callable returning a Drive service;
+                         called once per worker thread (and once for listing)
+        folder_id: Drive folder to download
+        output_dir: Local folder (created if missing)
+        workers: Concurrent downloads
+
+    Returns:
+        DownloadStats
+    """
+    stats = DownloadStats()
+    lock = threading.Lock()
+    local = threading.local()
+
+    def thread_service():
+        if not hasattr(local, 'service'):
+            local.service = service_factory()
+        return local.service
+
+    def fetch(item, file_path):
+        try:
+            if is_up_to_date(file_path, item):
+                with lock:
+                    stats.skipped += 1
+                return
+            resumed = download_file(thread_service(), item, file_path)
+            note = f" (resumed at {resumed / 1e6:.1f} MB)" if resumed else ""
+            # Printing under the lock keeps lines from different threads apart
+            with lock:
+                stats.downloaded += 1
+                stats.resumed += bool(resumed)
+                stats.bytes += os.path.getsize(file_path) - resumed
+                print(f"    ✓ Complete: {os.path.relpath(file_path, output_dir)}{note}")
+        except Exception as e:
+            with lock:
+                stats.failed += 1
+                stats.errors.append(f"{file_path}: {e}")
+                print(f"    ✗ Error downloading {item['name']}: {str(e)}")
+
+    list_service = service_factory()
+    pending = [(folder_id, output_dir, "root")]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending:
+            current_id, current_dir, label = pending.pop(0)
+            os.makedirs(current_dir, exist_ok=True)
+
+            # Get all items in folder
+            items = list_files_in_folder(list_service, current_id)
+            with lock:
+                print(f"\n📁 {label}: {len(items)} item(s)")
+            names = local_names(items)
+
+            for item in items:
+                path = os.path.join(current_dir, names[item['id']])
+                if item['mimeType'] == FOLDER_MIME_TYPE:
+                    pending.append((item['id'], path, os.path.relpath(path, output_dir)))
+                elif item['mimeType'].startswith('application/vnd.google-apps'):
+                    # Google Docs, Sheets, Slides need export instead of download
+                    with lock:
+                        print(f"  ⚠ Skipping Google Doc/Sheet/Slide: {item['name']}")
+                else:
+                    executor.submit(fetch, item, path)
+    return stats
 
 def main():
+    parser = argparse.ArgumentParser(description="Download a Google Drive folder with all subfolders")
+    parser.add_argument("url", nargs="?", default=DEFAULT_URL, help="Drive folder URL or ID")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT,
+                        help=f"Output directory (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrent downloads (default: {DEFAULT_WORKERS})")
+    args = parser.parse_args()
+
     print("=" * 70)
     print("Google Drive Folder Downloader (with Authentication)")
     print("=" * 70)
-    
-    # Your Google Drive folder URL
-    drive_url = "https://drive.google.com/drive/u/3/folders/1UIHQNDz5Fwr50LlFF-_N0jgbQVS_2wNF"
-    output_directory = "downloaded_files"
-    
-    # Extract folder ID
-    folder_id = extract_folder_id(drive_url)
+
+    # Extract folder ID (a bare ID is accepted too)
+    folder_id = extract_folder_id(args.url) or (args.url if re.fullmatch(r'[a-zA-Z0-9-_]+', args.url) else None)
     if not folder_id:
         print("Error: Could not extract folder ID from URL")
-        return
-    
+        sys.exit(1)
+
     print(f"\nFolder ID: {folder_id}")
-    print(f"Output directory: {output_directory}")
+    print(f"Output directory: {args.output}")
     print("\nAuthenticating...")
-    
+
     try:
-        # Authenticate and create service
+        from googleapiclient.discovery import build
+
         creds = get_credentials()
-        service = build('drive', 'v3', credentials=creds)
-        
         print("✓ Authentication successful!")
-        print("\nStarting download...")
-        
-        # Download folder contents
-        download_folder_recursive(service, folder_id, output_directory)
-        
+        print(f"\nStarting download with {args.workers} workers...")
+
+        # One client per thread: the underlying HTTP connection isn't thread-safe
+        start = time.perf_counter()
+        stats = download_folder(
+            lambda: build('drive', 'v3', credentials=creds, cache_discovery=False),
+            folder_id, args.output, workers=args.workers
+        )
+        elapsed = time.perf_counter() - start
+
         print("\n" + "=" * 70)
-        print(f"✓ Download completed!")
-        print(f"Files saved to: {os.path.abspath(output_directory)}")
+        print(f"✓ Download completed in {elapsed:.1f}s!")
+        print(f"Downloaded: {stats.downloaded} ({stats.resumed} resumed), "
+              f"already up to date: {stats.skipped}, failed: {stats.failed}")
+        print(f"Transferred: {stats.bytes / 1e6:.1f} MB ({stats.bytes / 1e6 / max(elapsed, 1e-9):.1f} MB/s)")
+        print(f"Files saved to: {os.path.abspath(args.output)}")
         print("=" * 70)
-        
+        if stats.failed:
+            print("Re-run to retry the failed files; partial downloads resume.")
+
     except Exception as e:
         print(f"\n✗ Error: {str(e)}")
         print("\nMake sure you have:")
@@ -156,4 +308,4 @@ def main():
         print("3. Downloaded credentials.json to this directory")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
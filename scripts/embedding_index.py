@@ -0,0 +1,211 @@
+"""
+embedding_index.py
+
+Local CLIP embedding index for pre-filtering images before Gemini verification.
+A folder is embedded once on CPU and stored as a NumPy vector file; a query is
+then embedded and only the top-K most similar images are sent to the model.
+"""
+
+import os
+import sys
+import json
+import hashlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.media_loader import IMAGE_EXTENSIONS, load_image
+
+MODEL_NAME = "clip-ViT-B-32"
+BATCH_SIZE = 32
+
+_model = None
+
+
+def get_model():
+    """Load the CLIP model once per process (CPU only)"""
+    global _model
+    if _model is None:
+        from sentence_transformers import SentenceTransformer
+        _model = SentenceTransformer(MODEL_NAME, device="cpu")
+    return _model
+
+
+def _load_for_embedding(image_path: Path) -> Image.Image:
+    """Open an image at roughly model resolution (CLIP uses 224x224)"""
+    # Draft decoding; the decode is shared with the thumbnails via media_loader's LRU
+    return load_image(image_path, 448)
+
+
+class EmbeddingIndex:
+    """
+    Embedding index for a single folder, stored as:
+    - vectors.npy: float32 matrix of L2-normalised image embeddings
+    - entries.json: one {path, size, mtime} record per row in vectors.npy
+
+    build() is incremental: rows for files whose size and mtime are
+    unchanged are kept, so re-indexing only embeds new or modified images.
+    """
+
+    def __init__(self, folder: str, index_dir: str = "embedding_index"):
+        self.folder = Path(folder).resolve()
+        folder_hash = hashlib.md5(str(self.folder).encode()).hexdigest()
+        self.index_dir = Path(__file__).parent / index_dir / folder_hash
+        self.vectors_file = self.index_dir / "vectors.npy"
+        self.entries_file = self.index_dir / "entries.json"
+        self.vectors, self.entries = self._load()
+
+    def _load(self) -> Tuple[np.ndarray, List[dict]]:
+        """Load the index from disk, or return an empty one"""
+        if self.vectors_file.exists() and self.entries_file.exists():
+            try:
+                vectors = np.load(self.vectors_file)
+                with open(self.entries_file, 'r') as f:
+                    entries = json.load(f)
+                if len(entries) == len(vectors):
+                    return vectors, entries
+            except Exception as e:
+                print(f"Warning: Failed to load embedding index: {e}")
+        return np.zeros((0, 0), dtype=np.float32), []
+
+    def _save(self):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        np.save(self.vectors_file, self.vectors)
+        with open(self.entries_file, 'w') as f:
+            json.dump(self.entries, f)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def build(self, image_paths: List[Path], progress_callback=None) -> int:
+        """
+        Bring the index up to date with image_paths.
+
+        Args:
+            image_paths: All images that should be in the index
+            progress_callback: Optional fn(done, total) called after each batch
+
+        Returns:
+            Number of images that had to be (re-)embedded
+        """
+        existing = {entry["path"]: i for i, entry in enumerate(self.entries)}
+
+        keep_rows, keep_entries, to_embed = [], [], []
+        for path in image_paths:
+            stat = Path(path).stat()
+            entry = {"path": str(path), "size": stat.st_size, "mtime": stat.st_mtime}
+            row = existing.get(entry["path"])
+            if row is not None and self.entries[row]["size"] == entry["size"] \
+                    and self.entries[row]["mtime"] == entry["mtime"]:
+                keep_rows.append(row)
+                keep_entries.append(entry)
+            else:
+                to_embed.append(entry)
+
+        new_vectors, new_entries = [], []
+        model = get_model() if to_embed else None
+        for start in range(0, len(to_embed), BATCH_SIZE):
+            batch = to_embed[start:start + BATCH_SIZE]
+            images, loaded = [], []
+            for entry in batch:
+                try:
+                    images.append(_load_for_embedding(Path(entry["path"])))
+                    loaded.append(entry)
+                except Exception as e:
+                    print(f"Warning: Could not embed {entry['path']}: {e}")
+            if images:
+                new_vectors.append(model.encode(
+                    images, batch_size=BATCH_SIZE, convert_to_numpy=True,
+                    normalize_embeddings=True
+                ).astype(np.float32))
+                new_entries.extend(loaded)
+            if progress_callback:
+                progress_callback(min(start + BATCH_SIZE, len(to_embed)), len(to_embed))
+
+        parts = []
+        if keep_rows:
+            parts.append(self.vectors[keep_rows])
+        parts.extend(new_vectors)
+        self.vectors = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        self.entries = keep_entries + new_entries
+
+        if to_embed or len(keep_rows) != len(existing):
+            self._save()
+        return len(to_embed)
+
+    def remove(self, image_paths: List[Path]) -> int:
+        """Drop rows for the given paths (e.g. deleted files); returns rows removed"""
+        drop = {str(p) for p in image_paths}
+        keep = [i for i, entry in enumerate(self.entries) if entry["path"] not in drop]
+        removed = len(self.entries) - len(keep)
+        if removed:
+            self.vectors = self.vectors[keep]
+            self.entries = [self.entries[i] for i in keep]
+            self._save()
+        return removed
+
+    def search(self, query: str, top_k: int = 100,
+               restrict_to: Optional[List[Path]] = None) -> List[Tuple[Path, float]]:
+        """
+        Return the top_k images most similar to a text query.
+
+        Args:
+            query: Short natural-language query (CLIP text input is capped
+                   at 77 tokens, so prefer the user's phrase over the
+                   expanded description)
+            top_k: Number of candidates to return
+            restrict_to: Optional subset of paths to rank
+
+        Returns:
+            List of (image_path, cosine_similarity), best first
+        """
+        if not self.entries:
+            return []
+
+        rows = range(len(self.entries))
+        if restrict_to is not None:
+            allowed = {str(p) for p in restrict_to}
+            rows = [i for i in rows if self.entries[i]["path"] in allowed]
+            if not rows:
+                return []
+        rows = np.asarray(rows)
+
+        query_vector = get_model().encode(
+            [query], convert_to_numpy=True, normalize_embeddings=True
+        )[0].astype(np.float32)
+        scores = self.vectors[rows] @ query_vector
+
+        top_k = min(top_k, len(rows))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(Path(self.entries[rows[i]]["path"]), float(scores[i])) for i in best]
+
+
+# -------------------------
+# CLI Testing Interface
+# -------------------------
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ("build", "search"):
+        print("Usage:")
+        print("  python embedding_index.py build <folder>                - Index a folder")
+        print("  python embedding_index.py search <folder> <query> [k]   - Show top-k matches")
+        sys.exit(1)
+
+    index = EmbeddingIndex(sys.argv[2])
+    images = [f for f in Path(sys.argv[2]).iterdir() if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS]
+    embedded = index.build(
+        images, lambda done, total: print(f"  Embedded {done}/{total}", end='\r')
+    )
+    print(f"📦 Index: {len(index)} images ({embedded} newly embedded)")
+
+    if sys.argv[1] == "search":
+        query = sys.argv[3]
+        top_k = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+        for path, score in index.search(query, top_k):
+            print(f"  {score:.3f}  {path.name}")
@@ -0,0 +1,246 @@
+"""
+folder_manifest.py
+
+Incremental manifest of the images in a folder.
+Stores (path, size, mtime, content hash, dimensions, EXIF datetime) per file in
+SQLite so re-opening a large library only stats files; only new or changed
+files are read and hashed. Quality scores from image_quality.py live in the
+same rows and are cleared whenever a file changes.
+"""
+
+import sys
+import os
+from pathlib import Path
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Set, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.cache_store import SQLiteStore
+from scripts.content_hash import get_hasher
+from scripts.media_loader import IMAGE_EXTENSIONS, open_image
+
+HASH_WORKERS = 8
+
+QUALITY_COLUMNS = ("sharpness", "dark_fraction", "bright_fraction")
+
+# EXIF tags: DateTimeOriginal lives in the Exif sub-IFD, DateTime in IFD0
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+
+
+def read_image_metadata(path):
+    """
+    Read dimensions and EXIF capture time without decoding pixels.
+
+    Returns:
+        (width, height, exif_datetime); values are None if unavailable
+    """
+    try:
+        with open_image(path) as img:
+            width, height = img.size
+            exif = img.getexif()
+            taken = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+            return width, height, str(taken) if taken else None
+    except Exception:
+        return None, None, None
+
+
+@dataclass
+class ManifestEntry:
+    path: Path
+    size: int
+    mtime_ns: int
+    content_hash: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    exif_datetime: Optional[str] = None
+    # Quality scores (see image_quality.py); None until scored
+    sharpness: Optional[float] = None
+    dark_fraction: Optional[float] = None
+    bright_fraction: Optional[float] = None
+
+
+@dataclass
+class ManifestDiff:
+    """What changed in the folder since the previous refresh()"""
+    added: List[ManifestEntry] = field(default_factory=list)
+    changed: List[ManifestEntry] = field(default_factory=list)
+    removed: List[ManifestEntry] = field(default_factory=list)
+    # Content hashes the changed files had before this refresh
+    replaced_hashes: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+
+class FolderManifest:
+    """
+    Manifest for one folder (non-recursive, like the search scripts).
+    All folders share a single database file in the script directory.
+    """
+
+    def __init__(self, folder: str, db_file: str = "folder_manifest.db",
+                 extensions: Iterable[str] = IMAGE_EXTENSIONS):
+        self.folder = Path(folder).resolve()
+        self.extensions = {ext.lower() for ext in extensions}
+        self.db_file = Path(__file__).parent / db_file
+        self.store = SQLiteStore(self.db_file, self._create_schema)
+
+    @staticmethod
+    def _create_schema(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                exif_datetime TEXT
+            )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+        for column in QUALITY_COLUMNS:
+            if column not in columns:
+                # Manifests created before quality scoring
+                conn.execute(f"ALTER TABLE files ADD COLUMN {column} REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS files_folder ON files (folder)")
+        conn.execute("CREATE INDEX IF NOT EXISTS files_hash ON files (content_hash)")
+
+    def _row_to_entry(self, row) -> ManifestEntry:
+        return ManifestEntry(Path(row[0]), *row[1:])
+
+    def entries(self) -> List[ManifestEntry]:
+        """All files currently recorded for this folder, sorted by name"""
+        rows = self.store.execute(
+            "SELECT path, size, mtime_ns, content_hash, width, height, exif_datetime, "
+            f"{', '.join(QUALITY_COLUMNS)} FROM files WHERE folder = ? ORDER BY path",
+            (str(self.folder),)
+        ).fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def _scan(self):
+        """Yield (path, size, mtime_ns) for matching files; stat only, no reads"""
+        with os.scandir(self.folder) as it:
+            for dir_entry in it:
+                if not dir_entry.is_file():
+                    continue
+                if os.path.splitext(dir_entry.name)[1].lower() not in self.extensions:
+                    continue
+                stat = dir_entry.stat()
+                yield Path(dir_entry.path), stat.st_size, stat.st_mtime_ns
+
+    def _describe(self, path: Path, size: int, mtime_ns: int) -> ManifestEntry:
+        width, height, taken = read_image_metadata(path)
+        return ManifestEntry(path, size, mtime_ns, get_hasher().digest(path), width, height, taken)
+
+    def refresh(self, progress_callback=None) -> ManifestDiff:
+        """
+        Re-scan the folder and update the manifest.
+
+        Args:
+            progress_callback: Optional fn(done, total) called while hashing
+
+        Returns:
+            ManifestDiff listing added, changed and removed files
+        """
+        if not self.folder.is_dir():
+            raise FileNotFoundError(f"Folder '{self.folder}' does not exist")
+
+        known = {str(entry.path): entry for entry in self.entries()}
+        diff = ManifestDiff()
+
+        to_describe = []
+        seen = set()
+        for path, size, mtime_ns in self._scan():
+            seen.add(str(path))
+            entry = known.get(str(path))
+            if entry and entry.size == size and entry.mtime_ns == mtime_ns:
+                diff.unchanged += 1
+            else:
+                to_describe.append((path, size, mtime_ns, entry is not None))
+
+        # Hashing is I/O bound and hashlib releases the GIL on large buffers
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+            futures = [executor.submit(self._describe, path, size, mtime_ns)
+                       for path, size, mtime_ns, _ in to_describe]
+            for i, (future, (_, _, _, existed)) in enumerate(zip(futures, to_describe)):
+                try:
+                    entry = future.result()
+                except OSError as e:
+                    print(f"Warning: Could not read {to_describe[i][0]}: {e}")
+                    continue
+                if existed:
+                    diff.changed.append(entry)
+                    diff.replaced_hashes.append(known[str(entry.path)].content_hash)
+                else:
+                    diff.added.append(entry)
+                if progress_callback:
+                    progress_callback(i + 1, len(to_describe))
+
+        diff.removed = [entry for path, entry in known.items() if path not in seen]
+        for entry in diff.removed:
+            get_hasher().forget(entry.path)
+
+        with self.store.transaction() as conn:
+            # Replacing the row also clears the quality scores of changed files
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (path, folder, size, mtime_ns, content_hash, "
+                "width, height, exif_datetime) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(str(e.path), str(self.folder), e.size, e.mtime_ns, e.content_hash,
+                  e.width, e.height, e.exif_datetime) for e in diff.added + diff.changed]
+            )
+            conn.executemany(
+                "DELETE FROM files WHERE path = ?",
+                [(str(e.path),) for e in diff.removed]
+            )
+
+        return diff
+
+    def set_quality(self, scores: Iterable[Tuple[Path, float, float, float]]) -> int:
+        """Store (path, sharpness, dark_fraction, bright_fraction) rows in one transaction"""
+        return self.store.executemany(
+            f"UPDATE files SET {' = ?, '.join(QUALITY_COLUMNS)} = ? WHERE path = ?",
+            [(*values, str(path)) for path, *values in scores]
+        )
+
+    def orphaned_hashes(self, content_hashes: Iterable[str]) -> Set[str]:
+        """
+        Of the given content hashes, return those no longer referenced by any
+        file in any folder's manifest (safe to evict from caches).
+        """
+        orphaned = set()
+        for content_hash in set(content_hashes):
+            row = self.store.execute(
+                "SELECT 1 FROM files WHERE content_hash = ? LIMIT 1", (content_hash,)
+            ).fetchone()
+            if row is None:
+                orphaned.add(content_hash)
+        return orphaned
+
+    def stale_hashes(self, diff: ManifestDiff) -> Set[str]:
+        """Hashes of removed or replaced file contents that nothing references any more"""
+        previous = [e.content_hash for e in diff.removed] + diff.replaced_hashes
+        return self.orphaned_hashes(previous)
+
+
+# -------------------------
+# CLI Testing Interface
+# -------------------------
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print("Usage: python folder_manifest.py <folder>")
+        sys.exit(1)
+
+    start = time.time()
+    manifest = FolderManifest(sys.argv[1])
+    diff = manifest.refresh()
+    print(f"📁 {manifest.folder}")
+    print(f"  Added: {len(diff.added)}  Changed: {len(diff.changed)}  "
+          f"Removed: {len(diff.removed)}  Unchanged: {diff.unchanged}")
+    print(f"  Refreshed in {time.time() - start:.2f}s")
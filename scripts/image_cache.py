@@ -5,11 +5,21 @@ Intelligent caching system for image analysis results.
 Saves analysis results to avoid re-analyzing the same images.
 """
 
+import os
+import sys
 import json
+import time
+import sqlite3
 import hashlib
+import threading
 from pathlib import Path
-from datetime import datetime
-from typing import Dict, List, Tuple, Optional
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.cache_store import SQLiteStore
+from scripts.content_hash import get_hasher
 
 class ImageAnalysisCache:
     """
@@ -21,59 +31,132 @@ class ImageAnalysisCache:
     1. Same image with different filenames = cached
     2. Same query phrasing = cached (via query expansion cache)
     3. Different queries on same images = separate cache entries
+    
+    Entries live in a SQLite database (see cache_store.SQLiteStore), so each
+    new result is a single row insert instead of a rewrite of the whole
+    cache, and several processes can share the cache safely.
+    
+    The cache is bounded: every `compact_every` writes a background
+    compaction drops entries older than `ttl_days`, then evicts the least
+    recently used entries beyond `max_entries` / `max_size_mb`, and
+    reclaims the freed pages.
     """
     
-    def __init__(self, cache_file: str = "image_analysis_cache.json"):
+    def __init__(self, cache_file: str = "image_analysis_cache.db",
+                 max_entries: Optional[int] = 500_000,
+                 max_size_mb: Optional[float] = None,
+                 ttl_days: Optional[int] = 365,
+                 compact_every: int = 1000):
         self.cache_file = Path(__file__).parent / cache_file
-        self.cache = self._load_cache()
+        self.max_entries = max_entries
+        self.max_size_mb = max_size_mb
+        self.ttl_days = ttl_days
+        self.compact_every = compact_every
+        # Guards the in-memory stats and buffered access times; the database
+        # itself is protected by SQLite's own locking
+        self._lock = threading.Lock()
+        self._compacting = threading.Lock()
+        self._writes_since_compact = 0
+        # Hits are recorded here and written in bulk instead of one UPDATE per get()
+        self._pending_access: Dict[Tuple[str, str], float] = {}
+        self.store = self._open_db()
         self.stats = {
             "hits": 0,
             "misses": 0,
             "total_queries": 0
         }
     
-    def _load_cache(self) -> Dict:
-        """Load cache from JSON file"""
-        if self.cache_file.exists():
-            try:
-                with open(self.cache_file, 'r') as f:
-                    data = json.load(f)
-                    # Migrate old format if needed
-                    if isinstance(data, dict) and "cache" in data:
-                        return data["cache"]
-                    return data
-            except Exception as e:
-                print(f"Warning: Failed to load cache: {e}")
-                return {}
-        return {}
-    
-    def _save_cache(self):
-        """Save cache to JSON file"""
+    def _open_db(self) -> SQLiteStore:
+        """Open (and create if needed) the SQLite cache database"""
+        is_new = not self.cache_file.exists()
+        store = SQLiteStore(self.cache_file, self._create_schema)
+        if is_new:
+            self._migrate_json_cache(store)
+        return store
+    
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                image_hash TEXT NOT NULL,
+                query_hash TEXT NOT NULL,
+                is_match INTEGER NOT NULL,
+                explanation TEXT NOT NULL,
+                image_path TEXT,
+                timestamp TEXT NOT NULL,
+                last_access REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (image_hash, query_hash)
+            )
+        """)
+        
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+        if "last_access" not in columns:
+            # Databases created before LRU eviction: seed access time from creation time
+            conn.execute("ALTER TABLE entries ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+            conn.execute("UPDATE entries SET last_access = COALESCE(CAST(strftime('%s', timestamp) AS REAL), 0)")
+        
+        # Secondary indexes: per-query clearing, TTL and LRU scans
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_query ON entries (query_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_access ON entries (last_access)")
+    
+    def _migrate_json_cache(self, store: SQLiteStore):
+        """
+        Import entries from the old whole-file JSON cache, if present.
+        The old cache keyed images by the MD5 of their first 1MB, which never
+        matches today's content hashes, so each entry is re-keyed by hashing
+        its recorded image_path. Entries whose file is gone or has changed
+        since it was analyzed are dropped.
+        """
+        json_file = self.cache_file.with_suffix(".json")
+        if not json_file.exists():
+            return
+        
         try:
-            # Add metadata
-            data = {
-                "cache": self.cache,
-                "metadata": {
-                    "last_updated": datetime.now().isoformat(),
-                    "total_entries": len(self.cache),
-                    "stats": self.stats
-                }
-            }
-            with open(self.cache_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with open(json_file, 'r') as f:
+                data = json.load(f)
+            # Old files either wrap entries in "cache" or are the bare dict
+            if isinstance(data, dict) and "cache" in data:
+                data = data["cache"]
+            
+            rows = []
+            for key, entry in data.items():
+                old_hash, query_hash = key.split(":", 1)
+                image_path = entry.get("image_path")
+                if not image_path or self._legacy_image_hash(image_path) != old_hash:
+                    continue
+                timestamp = entry.get("timestamp", datetime.now().isoformat())
+                rows.append((
+                    get_hasher().digest(image_path), query_hash, int(entry["is_match"]), entry["explanation"],
+                    image_path, timestamp, datetime.fromisoformat(timestamp).timestamp()
+                ))
+            store.executemany(
+                "INSERT OR REPLACE INTO entries "
+                "(image_hash, query_hash, is_match, explanation, image_path, timestamp, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            print(f"Migrated {len(rows)} of {len(data)} entries from {json_file.name} "
+                  f"(the rest point to missing or changed files)")
         except Exception as e:
-            print(f"Warning: Failed to save cache: {e}")
+            print(f"Warning: Failed to migrate JSON cache: {e}")
+    
+    @staticmethod
+    def _legacy_image_hash(image_path: str) -> Optional[str]:
+        """The old JSON cache's image key: MD5 of the first 1MB, or None if unreadable"""
+        try:
+            with open(image_path, 'rb') as f:
+                return hashlib.md5(f.read(1024 * 1024)).hexdigest()
+        except OSError:
+            return None
     
     def _get_image_hash(self, image_path: Path) -> str:
         """
         Generate content-based hash of image file.
-        Uses first 1MB of file for speed (good enough for uniqueness).
+        The full-content digest is memoised per (size, mtime, inode) and
+        persisted, so get() followed by set() reads the file at most once.
         """
         try:
-            with open(image_path, 'rb') as f:
-                # Read first 1MB or entire file if smaller
-                content = f.read(1024 * 1024)
-                return hashlib.md5(content).hexdigest()
+            return get_hasher().digest(image_path)
         except Exception as e:
             # Fallback to path-based hash if file can't be read
             return hashlib.md5(str(image_path).encode()).hexdigest()
@@ -82,45 +165,133 @@ class ImageAnalysisCache:
         """Generate hash of expanded query"""
         return hashlib.md5(expanded_query.encode()).hexdigest()
     
-    def _get_cache_key(self, image_path: Path, expanded_query: str) -> str:
-        """Generate unique cache key for image + query combination"""
-        img_hash = self._get_image_hash(image_path)
-        query_hash = self._get_query_hash(expanded_query)
-        return f"{img_hash}:{query_hash}"
-    
-    def get(self, image_path: Path, expanded_query: str) -> Optional[Tuple[bool, str]]:
+    def get(self, image_path: Path, expanded_query: str,
+            image_hash: Optional[str] = None) -> Optional[Tuple[bool, str]]:
         """
         Retrieve cached analysis result.
         
+        Args:
+            image_path: Image file
+            expanded_query: Query the image was analyzed against
+            image_hash: Content hash if already known (e.g. from folder_manifest),
+                        saves re-reading the file
+        
         Returns:
             (is_match, explanation) if cached, None if not found
         """
-        cache_key = self._get_cache_key(image_path, expanded_query)
+        img_hash = image_hash or self._get_image_hash(image_path)
+        query_hash = self._get_query_hash(expanded_query)
         
-        if cache_key in self.cache:
-            self.stats["hits"] += 1
-            entry = self.cache[cache_key]
-            return (entry["is_match"], entry["explanation"])
+        row = self.store.execute(
+            "SELECT is_match, explanation FROM entries WHERE image_hash = ? AND query_hash = ?",
+            (img_hash, query_hash)
+        ).fetchone()
         
-        self.stats["misses"] += 1
-        return None
+        with self._lock:
+            if row:
+                self.stats["hits"] += 1
+                self._pending_access[(img_hash, query_hash)] = time.time()
+                return (bool(row[0]), row[1])
+            
+            self.stats["misses"] += 1
+            return None
     
-    def set(self, image_path: Path, expanded_query: str, is_match: bool, explanation: str):
+    def set(self, image_path: Path, expanded_query: str, is_match: bool, explanation: str,
+            image_hash: Optional[str] = None):
         """
         Store analysis result in cache.
         """
-        cache_key = self._get_cache_key(image_path, expanded_query)
+        img_hash = image_hash or self._get_image_hash(image_path)
+        query_hash = self._get_query_hash(expanded_query)
         
-        self.cache[cache_key] = {
-            "is_match": is_match,
-            "explanation": explanation,
-            "image_path": str(image_path),  # For reference only
-            "timestamp": datetime.now().isoformat()
-        }
+        self.store.execute(
+            "INSERT OR REPLACE INTO entries "
+            "(image_hash, query_hash, is_match, explanation, image_path, timestamp, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (img_hash, query_hash, int(is_match), explanation,
+             str(image_path),  # For reference only
+             datetime.now().isoformat(), time.time())
+        )
+        
+        with self._lock:
+            self._writes_since_compact += 1
+            due = self.compact_every and self._writes_since_compact >= self.compact_every
+        
+        if due:
+            self.compact_in_background()
+    
+    def _flush_access_times(self):
+        """Write buffered hit times"""
+        with self._lock:
+            pending, self._pending_access = self._pending_access, {}
+        if pending:
+            self.store.executemany(
+                "UPDATE entries SET last_access = ? WHERE image_hash = ? AND query_hash = ?",
+                [(t, img_hash, query_hash) for (img_hash, query_hash), t in pending.items()]
+            )
     
     def save(self):
-        """Persist cache to disk"""
-        self._save_cache()
+        """Persist buffered access times (entries are already committed by set())"""
+        self._flush_access_times()
+    
+    def compact(self) -> Dict[str, int]:
+        """
+        Apply the TTL and size bounds and reclaim free space.
+        
+        Returns:
+            Number of entries removed by each rule
+        """
+        removed = {"expired": 0, "evicted": 0}
+        with self._compacting:
+            self._flush_access_times()
+            with self._lock:
+                self._writes_since_compact = 0
+            
+            with self.store.transaction() as conn:
+                if self.ttl_days:
+                    cutoff = (datetime.now() - timedelta(days=self.ttl_days)).isoformat()
+                    removed["expired"] = conn.execute(
+                        "DELETE FROM entries WHERE timestamp < ?", (cutoff,)
+                    ).rowcount
+                
+                count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                limit = self.max_entries if self.max_entries else count
+                if self.max_size_mb and count:
+                    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                    used_pages = conn.execute("PRAGMA page_count").fetchone()[0] - \
+                        conn.execute("PRAGMA freelist_count").fetchone()[0]
+                    bytes_per_entry = max(1, used_pages * page_size / count)
+                    limit = min(limit, int(self.max_size_mb * 1024 * 1024 / bytes_per_entry))
+                
+                if count > limit:
+                    # Least recently used first, via the last_access index
+                    removed["evicted"] = conn.execute(
+                        "DELETE FROM entries WHERE rowid IN "
+                        "(SELECT rowid FROM entries ORDER BY last_access LIMIT ?)",
+                        (count - limit,)
+                    ).rowcount
+            
+            # Give freed pages back to the filesystem once a quarter of the file is free
+            conn = self.store.connect()
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            total_pages = conn.execute("PRAGMA page_count").fetchone()[0]
+            if total_pages and free_pages / total_pages > 0.25:
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                    # executescript steps the pragma to completion; execute() frees one page
+                    conn.executescript("PRAGMA incremental_vacuum;")
+                else:
+                    conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+    
+    def compact_in_background(self):
+        """Run compact() on a daemon thread unless one is already running"""
+        if self._compacting.locked():
+            return
+        threading.Thread(target=self.compact, name="image-cache-compaction", daemon=True).start()
+    
+    def _count_entries(self) -> int:
+        return self.store.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
     
     def get_stats(self) -> Dict:
         """Get cache performance statistics"""
@@ -128,7 +299,7 @@ class ImageAnalysisCache:
         hit_rate = (self.stats["hits"] / total * 100) if total > 0 else 0
         
         return {
-            "total_cached_entries": len(self.cache),
+            "total_cached_entries": self._count_entries(),
             "cache_hits": self.stats["hits"],
             "cache_misses": self.stats["misses"],
             "hit_rate": f"{hit_rate:.1f}%",
@@ -149,56 +320,39 @@ class ImageAnalysisCache:
         else:
             return f"{size_bytes / (1024 * 1024):.1f} MB"
     
+    def _delete(self, where: str = "", params: Tuple = ()) -> int:
+        """Delete matching entries and return how many were removed"""
+        self._flush_access_times()
+        return self.store.execute(f"DELETE FROM entries {where}", params).rowcount
+    
     def clear_old_entries(self, days: int = 30):
         """
         Remove cache entries older than specified days.
         Useful for preventing cache from growing too large.
         """
-        from datetime import timedelta
-        
         cutoff_date = datetime.now() - timedelta(days=days)
-        initial_count = len(self.cache)
-        
-        # Filter out old entries
-        self.cache = {
-            key: value for key, value in self.cache.items()
-            if datetime.fromisoformat(value["timestamp"]) > cutoff_date
-        }
-        
-        removed_count = initial_count - len(self.cache)
-        self._save_cache()
-        
-        return removed_count
+        # ISO-8601 timestamps sort lexicographically
+        return self._delete("WHERE timestamp < ?", (cutoff_date.isoformat(),))
     
     def clear_by_query(self, expanded_query: str):
-        """Remove all cache entries for a specific query"""
+        """Remove all cache entries for a specific query (uses the query_hash index)"""
         query_hash = self._get_query_hash(expanded_query)
-        initial_count = len(self.cache)
-        
-        self.cache = {
-            key: value for key, value in self.cache.items()
-            if not key.endswith(f":{query_hash}")
-        }
-        
-        removed_count = initial_count - len(self.cache)
-        self._save_cache()
-        
-        return removed_count
+        return self._delete("WHERE query_hash = ?", (query_hash,))
+    
+    def evict_images(self, image_hashes: Iterable[str]) -> int:
+        """Remove all entries for the given image content hashes"""
+        return self.store.executemany(
+            "DELETE FROM entries WHERE image_hash = ?", [(h,) for h in image_hashes]
+        )
     
     def clear_all(self):
         """Clear entire cache"""
-        count = len(self.cache)
-        self.cache = {}
-        self._save_cache()
-        return count
+        return self._delete()
     
     def get_queries_analyzed(self) -> List[str]:
         """Get list of unique queries that have been cached"""
-        query_hashes = set()
-        for key in self.cache.keys():
-            _, query_hash = key.split(":", 1)
-            query_hashes.add(query_hash)
-        return list(query_hashes)
+        rows = self.store.execute("SELECT DISTINCT query_hash FROM entries").fetchall()
+        return [row[0] for row in rows]
 
 
 # -------------------------
@@ -229,9 +383,16 @@ if __name__ == "__main__":
             count = cache.clear_old_entries(days)
             print(f"✅ Removed {count} entries older than {days} days")
         
+        elif command == "compact":
+            if len(sys.argv) > 2:
+                cache.max_entries = int(sys.argv[2])
+            removed = cache.compact()
+            print(f"✅ Removed {removed['expired']} expired and {removed['evicted']} least recently used entries")
+            print(f"  cache_file_size: {cache.get_stats()['cache_file_size']}")
+        
         else:
             print(f"Unknown command: {command}")
-            print("Available commands: stats, clear, clean [days]")
+            print("Available commands: stats, clear, clean [days], compact [max_entries]")
     
     else:
         stats = cache.get_stats()
@@ -241,4 +402,5 @@ if __name__ == "__main__":
         print("\nUsage:")
         print("  python image_cache.py stats      - Show cache statistics")
         print("  python image_cache.py clear      - Clear all cache")
-        print("  python image_cache.py clean 30   - Remove entries older than 30 days")
\ No newline at end of file
+        print("  python image_cache.py clean 30   - Remove entries older than 30 days")
+        print("  python image_cache.py compact    - Apply size/TTL bounds and reclaim space")
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+image_quality.py
+
+Cheap quality gate run before any image is sent to Gemini.
+Each image is decoded once at reduced size (OpenCV's IMREAD_REDUCED_* modes
+let the JPEG decoder skip most of the work) and normalised to a fixed long
+edge, so scores are comparable across camera resolutions:
+- sharpness: variance of the Laplacian (low = blurry / out of focus)
+- dark_fraction / bright_fraction: share of crushed shadows and blown
+  highlights from the grayscale histogram (high = badly exposed)
+Resolution comes from the folder manifest. Scores are computed in a pool of
+worker processes and stored in the folder manifest, so each image is scored
+once; QualityFilter then drops unusable shots with no decoding at all.
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import ImageOps
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# OpenCV can't read HEIC; everything it can't do goes through Pillow
+from scripts.media_loader import open_image
+
+SCORE_LONG_EDGE = 512
+SCORE_CHUNKSIZE = 32
+# Grey levels that count as crushed shadows / blown highlights
+DARK_LEVEL = 8
+BRIGHT_LEVEL = 247
+
+# Default filter: Laplacian variance at 512px, clipped share, short edge in px
+DEFAULT_MIN_SHARPNESS = 40.0
+DEFAULT_MAX_CLIPPED = 0.6
+DEFAULT_MIN_SHORT_EDGE = 256
+
+# Sharpness stored for images that could not be decoded (e.g. HEIC without pillow-heif);
+# they are tried again on every run, so installing a decoder brings them back
+UNREADABLE = -1.0
+# Older manifests stored unreadable images as if they were black frames
+LEGACY_UNREADABLE = (0.0, 1.0, 0.0)
+
+
+def _read_gray(path) -> Optional[np.ndarray]:
+    """Grayscale image at roughly SCORE_LONG_EDGE, decoded at reduced size where possible"""
+    image = None
+    if os.path.splitext(str(path))[1].lower() in ('.jpg', '.jpeg'):
+        # Peek at the size (header only) to pick the largest safe reduction
+        try:
+            with open_image(path) as img:
+                long_edge = max(img.size)
+            reduction = next((flag for factor, flag in (
+                (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+                (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+            ) if long_edge // factor >= SCORE_LONG_EDGE), cv2.IMREAD_GRAYSCALE)
+            # IMREAD_REDUCED_* also applies the EXIF orientation
+            image = cv2.imread(str(path), reduction)
+        except Exception:
+            image = None
+    if image is None:
+        try:
+            with open_image(path) as img:
+                img.draft("L", (SCORE_LONG_EDGE, SCORE_LONG_EDGE))
+                image = np.asarray(ImageOps.exif_transpose(img).convert("L"))
+        except Exception:
+            return None
+
+    scale = SCORE_LONG_EDGE / max(image.shape)
+    if scale < 1:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return image
+
+
+def score_image(path) -> Optional[Tuple[float, float, float]]:
+    """
+    Worker: (sharpness, dark_fraction, bright_fraction) for one image, or
+    None if it can't be read.
+    """
+    gray = _read_gray(path)
+    if gray is None or gray.size == 0:
+        return None
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel() / gray.size
+    return sharpness, float(hist[:DARK_LEVEL + 1].sum()), float(hist[BRIGHT_LEVEL:].sum())
+
+
+def score_folder(manifest, entries=None, workers: Optional[int] = None, progress_callback=None) -> int:
+    """
+    Score manifest entries that have no quality scores yet (or could not be
+    decoded last time) and store them.
+
+    Args:
+        manifest: FolderManifest (already refreshed)
+        entries: Entries to score (default: all of the manifest's entries)
+        workers: Worker processes (default: CPU count)
+        progress_callback: Optional fn(done, total)
+
+    Returns:
+        Number of images scored
+    """
+    entries = manifest.entries() if entries is None else entries
+    todo = [entry for entry in entries if entry.sharpness is None or entry.sharpness == UNREADABLE
+            or (entry.sharpness, entry.dark_fraction, entry.bright_fraction) == LEGACY_UNREADABLE]
+    if not todo:
+        return 0
+
+    scores = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(score_image, [entry.path for entry in todo], chunksize=SCORE_CHUNKSIZE)
+        for i, (entry, result) in enumerate(zip(todo, results), 1):
+            entry.sharpness, entry.dark_fraction, entry.bright_fraction = result or (UNREADABLE, None, None)
+            scores.append((entry.path, entry.sharpness, entry.dark_fraction, entry.bright_fraction))
+            if progress_callback and (i % 64 == 0 or i == len(todo)):
+                progress_callback(i, len(todo))
+            if len(scores) >= 1000:
+                manifest.set_quality(scores)
+                scores = []
+    if scores:
+        manifest.set_quality(scores)
+    return len(todo)
+
+
+@dataclass
+class QualityFilter:
+    """
+    Thresholds for usable images; a threshold of 0 (or 1 for
+    max_clipped) disables that check.
+    """
+    min_sharpness: float = DEFAULT_MIN_SHARPNESS
+    max_clipped: float = DEFAULT_MAX_CLIPPED
+    min_short_edge: int = DEFAULT_MIN_SHORT_EDGE
+
+    def reason(self, entry) -> Optional[str]:
+        """Why an entry is rejected ('unreadable', 'blurry', 'dark', 'overexposed', 'small'), or None if usable"""
+        if entry.sharpness == UNREADABLE:
+            return "unreadable"
+        if entry.width and entry.height and min(entry.width, entry.height) < self.min_short_edge:
+            return "small"
+        if entry.sharpness is None:
+            return None
+        if entry.dark_fraction >= self.max_clipped and self.max_clipped < 1:
+            return "dark"
+        if entry.bright_fraction >= self.max_clipped and self.max_clipped < 1:
+            return "overexposed"
+        if entry.sharpness < self.min_sharpness:
+            return "blurry"
+        return None
+
+    def split(self, entries) -> Tuple[List, Dict[str, List]]:
+        """(usable entries, {reason: [rejected entries]})"""
+        usable, rejected = [], {}
+        for entry in entries:
+            reason = self.reason(entry)
+            if reason:
+                rejected.setdefault(reason, []).append(entry)
+            else:
+                usable.append(entry)
+        return usable, rejected
+
+
+def describe_rejections(rejected: Dict[str, List]) -> str:
+    """'3 blurry, 1 dark' style summary"""
+    return ", ".join(f"{len(entries)} {reason}" for reason, entries in sorted(rejected.items()))
+
+
+# -------------------------
+# CLI Testing Interface
+# -------------------------
+if __name__ == "__main__":
+    import sys
+    import time
+    import argparse
+    from scripts.folder_manifest import FolderManifest
+
+    parser = argparse.ArgumentParser(description="Score image sharpness/exposure and list unusable shots")
+    parser.add_argument("folder", help="Folder to scan")
+    parser.add_argument("--min-sharpness", type=float, default=DEFAULT_MIN_SHARPNESS)
+    parser.add_argument("--max-clipped", type=float, default=DEFAULT_MAX_CLIPPED)
+    parser.add_argument("--min-short-edge", type=int, default=DEFAULT_MIN_SHORT_EDGE)
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPUs)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = FolderManifest(args.folder)
+    manifest.refresh()
+    entries = manifest.entries()
+    scored = score_folder(
+        manifest, entries, args.workers,
+        progress_callback=lambda done, total: print(f"\r  Scoring {done}/{total}", end="", flush=True)
+    )
+    elapsed = time.perf_counter() - start
+    if scored:
+        print(f"\n  Scored {scored} images in {elapsed:.1f}s ({scored / elapsed:.1f} images/sec)")
+
+    quality = QualityFilter(args.min_sharpness, args.max_clipped, args.min_short_edge)
+    usable, rejected = quality.split(entries)
+    for reason, bad in sorted(rejected.items()):
+        print(f"\n✗ {reason}:")
+        for entry in bad:
+            if reason == "unreadable":
+                print(f"    {entry.path.name}")
+                continue
+            print(f"    {entry.path.name}  sharpness={entry.sharpness:.0f} "
+                  f"dark={entry.dark_fraction:.0%} bright={entry.bright_fraction:.0%}")
+    print(f"\n📊 {len(usable)} of {len(entries)} images are usable"
+          + (f" ({describe_rejections(rejected)} skipped)" if rejected else ""))
+    sys.exit(0)
@@ -0,0 +1,330 @@
+"""
+key_scheduler.py
+
+Quota-aware API key scheduler.
+Every key gets two token buckets, requests per minute (RPM) and requests per
+day (RPD), that refill continuously. The minute bucket only holds a small
+burst, so a key never sends more than rpm + burst - 1 requests in any sliding
+minute, which is how the API counts. acquire() hands out the key with the most
+headroom and waits only when every key is exhausted, so any number of workers
+can share the combined quota without tripping limits. A key that still gets a
+429 is cooled down (honouring the server's retry delay when it sends one) and
+backs off exponentially if it keeps failing.
+
+The clock and sleep function are injectable; `python key_scheduler.py simulate`
+drives the scheduler with a fake clock and checks the configured rates hold.
+"""
+
+import re
+import time
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Free-tier limits for gemini-2.0-flash-exp
+DEFAULT_RPM = 10
+DEFAULT_RPD = 1500
+DEFAULT_BURST = 1
+DEFAULT_COOLDOWN_SECONDS = 30
+MAX_COOLDOWN_SECONDS = 15 * 60
+
+RATE_LIMIT_INDICATORS = (
+    'rate limit',
+    'quota',
+    'too many requests',
+    'resource exhausted',
+    'resource_exhausted',
+    'limit exceeded',
+)
+
+
+def is_rate_limit_error(error) -> bool:
+    """Check if an exception (or error message) is a rate limit / quota error"""
+    # google.genai.errors.APIError carries the HTTP status
+    if getattr(error, 'code', None) == 429:
+        return True
+    error_str = str(error).lower()
+    return '429' in error_str or any(indicator in error_str for indicator in RATE_LIMIT_INDICATORS)
+
+
+def retry_delay(error) -> Optional[float]:
+    """Server-suggested retry delay in seconds from a 429 response, if present"""
+    # Gemini reports it as RetryInfo: {'retryDelay': '27s'}
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(error))
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """Holds up to `capacity` tokens, refilled at `rate` (default capacity / period) per second"""
+
+    def __init__(self, capacity: float, period: float, now: float, rate: Optional[float] = None):
+        self.capacity = float(capacity)
+        self.rate = rate if rate is not None else self.capacity / period
+        self.tokens = self.capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until_available(self) -> float:
+        """Seconds until one whole token is available (call refill() first)"""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+@dataclass
+class KeyState:
+    minute: TokenBucket
+    day: TokenBucket
+    cooldown_until: float = 0.0
+    strikes: int = 0
+    issued: int = 0
+    rate_limited: int = 0
+
+
+class KeyScheduler:
+    """
+    Hands out API keys according to per-key RPM/RPD budgets.
+
+    Args:
+        api_keys: Keys to schedule
+        rpm: Requests per minute allowed per key
+        rpd: Requests per day allowed per key
+        burst: Requests a rested key may send back to back
+        cooldown_seconds: Base cooldown after a 429 without a retry delay;
+                          doubles on consecutive 429s for the same key
+        clock: Monotonic time source in seconds (injectable for tests)
+        sleep: Sleep function matching clock (injectable for tests)
+    """
+
+    def __init__(self, api_keys: List[str], rpm: float = DEFAULT_RPM, rpd: float = DEFAULT_RPD,
+                 burst: float = DEFAULT_BURST, cooldown_seconds: float = DEFAULT_COOLDOWN_SECONDS,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        if not api_keys:
+            raise ValueError("At least one API key is required")
+        self.clock = clock
+        self.sleep = sleep
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        now = clock()
+        self.rpm, self.rpd, self.burst = rpm, rpd, burst
+        self._keys: Dict[str, KeyState] = {
+            key: KeyState(TokenBucket(burst, 60, now, rate=rpm / 60), TokenBucket(rpd, 86400, now))
+            for key in dict.fromkeys(api_keys)
+        }
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self._keys)
+
+    def get_key_count(self) -> int:
+        return len(self._keys)
+
+    def set_limits(self, rpm: float, rpd: float):
+        """Change the per-key budgets, keeping the fraction of the daily budget already used"""
+        with self._lock:
+            if (rpm, rpd) == (self.rpm, self.rpd):
+                return
+            now = self.clock()
+            for state in self._keys.values():
+                state.minute.refill(now)
+                state.minute.rate = rpm / 60
+                state.day.refill(now)
+                fraction = state.day.tokens / state.day.capacity
+                state.day.capacity = float(rpd)
+                state.day.rate = rpd / 86400
+                state.day.tokens = fraction * state.day.capacity
+            self.rpm, self.rpd = rpm, rpd
+
+    def _wait_time(self, state: KeyState, now: float) -> float:
+        state.minute.refill(now)
+        state.day.refill(now)
+        return max(state.cooldown_until - now,
+                   state.minute.time_until_available(),
+                   state.day.time_until_available())
+
+    def try_acquire(self, candidates: Optional[Iterable[str]] = None) -> Optional[str]:
+        """
+        Take one request's worth of quota from the key with the most headroom.
+
+        Args:
+            candidates: Restrict the choice to these keys (default: all keys)
+
+        Returns:
+            The key, or None if none of the candidates can send a request now
+        """
+        with self._lock:
+            now = self.clock()
+            best, best_headroom = None, None
+            for key in (self._keys if candidates is None else candidates):
+                state = self._keys[key]
+                if self._wait_time(state, now) > 0:
+                    continue
+                # Headroom is the scarcer of the two budgets, as a fraction of its size
+                headroom = min(state.minute.tokens / state.minute.capacity,
+                               state.day.tokens / state.day.capacity)
+                if best is None or headroom > best_headroom:
+                    best, best_headroom = key, headroom
+            if best is not None:
+                state = self._keys[best]
+                state.minute.tokens -= 1
+                state.day.tokens -= 1
+                state.issued += 1
+            return best
+
+    def wait_time(self, candidates: Optional[Iterable[str]] = None) -> float:
+        """Seconds until one of the candidate keys can send a request"""
+        with self._lock:
+            now = self.clock()
+            return min(self._wait_time(self._keys[key], now)
+                       for key in (self._keys if candidates is None else candidates))
+
+    def acquire(self, timeout: Optional[float] = None) -> str:
+        """
+        Block until some key has quota, then take one request's worth of it.
+
+        Raises:
+            TimeoutError: if no key frees up within timeout seconds
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            key = self.try_acquire()
+            if key is not None:
+                return key
+            delay = self.wait_time()
+            if deadline is not None:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    raise TimeoutError(f"No API key available within {timeout}s")
+                delay = min(delay, remaining)
+            self.sleep(max(delay, 0.001))
+
+    def report_success(self, key: str):
+        """A request on key succeeded: reset its 429 backoff"""
+        with self._lock:
+            if key in self._keys:
+                self._keys[key].strikes = 0
+
+    def report_rate_limited(self, key: str, retry_after: Optional[float] = None):
+        """
+        A request on key was rejected with a 429. The key is benched for
+        retry_after seconds (or an exponential cooldown) and its minute
+        budget is drained, since the server evidently counts differently.
+        """
+        with self._lock:
+            if key not in self._keys:
+                return
+            state = self._keys[key]
+            now = self.clock()
+            if retry_after is None:
+                retry_after = min(self.cooldown_seconds * 2 ** state.strikes, MAX_COOLDOWN_SECONDS)
+            state.strikes += 1
+            state.rate_limited += 1
+            state.cooldown_until = max(state.cooldown_until, now + retry_after)
+            state.minute.refill(now)
+            state.minute.tokens = min(state.minute.tokens, 0.0)
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Per-key snapshot, keyed by a short key suffix so it is safe to display"""
+        with self._lock:
+            now = self.clock()
+            stats = {}
+            for key, state in self._keys.items():
+                state.minute.refill(now)
+                state.day.refill(now)
+                stats[f"...{key[-4:]}"] = {
+                    "issued": state.issued,
+                    "rate_limited": state.rate_limited,
+                    "minute_tokens": round(state.minute.tokens, 2),
+                    "day_tokens": round(state.day.tokens, 2),
+                    "cooling_down_for": round(max(0.0, state.cooldown_until - now), 1),
+                }
+            return stats
+
+
+class FakeClock:
+    """Manually advanced clock; sleep() advances time instead of blocking"""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        with self._lock:
+            self.now += seconds
+
+
+# -------------------------
+# CLI Testing Interface
+# -------------------------
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Key scheduler self-check with a fake clock")
+    sub = parser.add_subparsers(dest="command", required=True)
+    simulate = sub.add_parser("simulate", help="Issue requests as fast as possible and verify the rate limits hold")
+    simulate.add_argument("--keys", type=int, default=5, help="Number of API keys (default: 5)")
+    simulate.add_argument("--rpm", type=float, default=DEFAULT_RPM)
+    simulate.add_argument("--rpd", type=float, default=DEFAULT_RPD)
+    simulate.add_argument("--burst", type=float, default=DEFAULT_BURST)
+    simulate.add_argument("--minutes", type=int, default=30, help="Simulated duration (default: 30)")
+    simulate.add_argument("--throttle-every", type=int, default=97,
+                          help="Simulate a 429 on every Nth request (0 = never, default: 97)")
+    args = parser.parse_args()
+
+    clock = FakeClock()
+    keys = [f"key-{i:02d}" for i in range(args.keys)]
+    scheduler = KeyScheduler(keys, rpm=args.rpm, rpd=args.rpd, burst=args.burst, clock=clock, sleep=clock.sleep)
+
+    issued = {key: [] for key in keys}
+    throttled_at = {}
+    duration = args.minutes * 60
+    count = 0
+    while clock() < duration:
+        key = scheduler.acquire()
+        if clock() >= duration:
+            break
+        count += 1
+        if key in throttled_at and clock() < throttled_at[key]:
+            print(f"❌ {key} issued during its cooldown at t={clock():.1f}s")
+            sys.exit(1)
+        issued[key].append(clock())
+        if args.throttle_every and count % args.throttle_every == 0:
+            scheduler.report_rate_limited(key)
+            throttled_at[key] = scheduler._keys[key].cooldown_until
+        else:
+            scheduler.report_success(key)
+        clock.sleep(0.01)  # simulated request latency
+
+    # In any sliding 60s window a key may send its burst plus what refilled
+    window_limit = args.rpm + args.burst - 1
+    failures = 0
+    for key, times in issued.items():
+        start = 0
+        for end, t in enumerate(times):
+            while times[start] <= t - 60:
+                start += 1
+            if end - start + 1 > window_limit + 1e-9:
+                failures += 1
+                print(f"❌ {key}: {end - start + 1} requests in the 60s before t={t:.1f}s")
+                break
+        # The daily bucket starts full and keeps refilling at rpd per 24h
+        day_limit = args.rpd * (1 + duration / 86400)
+        if len(times) > day_limit:
+            failures += 1
+            print(f"❌ {key}: {len(times)} requests exceeds the daily budget ({day_limit:.0f})")
+
+    total = sum(len(times) for times in issued.values())
+    ceiling = min(args.rpm * args.minutes + args.burst, args.rpd * (1 + duration / 86400)) * args.keys
+    print(f"📊 {total} requests over {args.minutes} simulated minutes with {args.keys} keys "
+          f"({total / args.minutes:.1f}/min, ceiling {ceiling / args.minutes:.1f}/min)")
+    for key, times in issued.items():
+        print(f"   {key}: {len(times)} requests")
+    if failures:
+        sys.exit(1)
+    print("✅ Per-key RPM/RPD limits held")
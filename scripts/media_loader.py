@@ -0,0 +1,229 @@
+"""
+media_loader.py
+
+One place to open and decode images for every script.
+- Decoders are registered once at import: HEIC/HEIF through pillow-heif,
+  or pyheif (decoded in memory) if that is all that's installed
+- decode_image() lets the decoder do the downscaling (JPEG draft mode
+  decodes at 1/2-1/8 scale) and applies the EXIF orientation
+- load_image() adds a small in-process LRU of decoded images, so a file that
+  is needed at several sizes (upload thumbnail, grid thumbnail, embedding)
+  is decoded once; smaller sizes are resized from the cached decode
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.content_hash import fast_key
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+    HEIC_BACKEND = 'pillow-heif'
+except ImportError:
+    try:
+        import pyheif
+        HEIC_BACKEND = 'pyheif'
+    except ImportError:
+        HEIC_BACKEND = None
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff', '.heic', '.heif'}
+HEIC_EXTENSIONS = {'.heic', '.heif'}
+
+DEFAULT_CACHE_MB = 256
+EXIF_ORIENTATION = 0x0112
+
+
+def open_image(path) -> Image.Image:
+    """
+    Open an image lazily (pixels are decoded on first use), including HEIC.
+
+    Raises:
+        ValueError: HEIC file but no HEIC decoder installed
+    """
+    if os.path.splitext(str(path))[1].lower() in HEIC_EXTENSIONS and HEIC_BACKEND != 'pillow-heif':
+        if HEIC_BACKEND is None:
+            raise ValueError("Cannot open HEIC files: install pillow-heif (or pyheif)")
+        heif_file = pyheif.read(str(path))
+        image = Image.frombytes(
+            heif_file.mode, heif_file.size, heif_file.data, "raw", heif_file.mode, heif_file.stride
+        )
+        _copy_heif_metadata(heif_file, image)
+        return image
+    return Image.open(path)
+
+
+def _copy_heif_metadata(heif_file, image: Image.Image):
+    """Carry pyheif's EXIF block and color profile over into image.info, as pillow-heif does"""
+    profile = heif_file.color_profile
+    if profile and profile.get('type') in ('prof', 'rICC') and profile.get('data'):
+        image.info['icc_profile'] = profile['data']
+    for block in heif_file.metadata or []:
+        if block.get('type') != 'Exif' or not block.get('data'):
+            continue
+        data = block['data']
+        # HEIF stores a 4-byte offset to the TIFF header in front of "Exif\0\0"
+        if data[4:10] == b'Exif\x00\x00':
+            data = data[4:]
+        image.info['exif'] = data
+        # libheif has already rotated the pixels; keep exif_transpose from doing it twice
+        exif = image.getexif()
+        if exif.get(EXIF_ORIENTATION, 1) != 1:
+            exif[EXIF_ORIENTATION] = 1
+            image.info['exif'] = exif.tobytes()
+        break
+
+
+def decode_image(path, max_edge: Optional[int] = None, mode: str = "RGB") -> Image.Image:
+    """
+    Decode an image, upright and in `mode`, no larger than max_edge.
+
+    Args:
+        path: Image file
+        max_edge: Long edge in pixels (None = full resolution)
+        mode: Pillow mode of the result ("RGB", "L", ...)
+    """
+    with open_image(path) as img:
+        if max_edge:
+            # Let the JPEG decoder downscale by a power of two while decoding
+            img.draft(mode, (max_edge, max_edge))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert(mode)
+    if max_edge and max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return img
+
+
+class DecodedImageCache:
+    """
+    LRU of decoded images bounded by their size in memory.
+
+    One entry per (file, mode) holds the largest decode requested so far;
+    requests for a smaller size are resized from it. Entries are dropped
+    when the file's size, mtime or inode changes. Returned images are
+    shared: treat them as read-only.
+    """
+
+    def __init__(self, max_mb: int = DEFAULT_CACHE_MB):
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        # (path, mode) -> (fast key, max_edge decoded at (None = full), image)
+        self._entries: "OrderedDict[tuple[str, str], tuple[tuple, Optional[int], Image.Image]]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"hits": 0, "resized": 0, "decoded": 0}
+
+    @staticmethod
+    def _covers(decoded_edge: Optional[int], image: Image.Image, max_edge: Optional[int]) -> bool:
+        """Can a request for max_edge be served from this decode?"""
+        if decoded_edge is None or max(image.size) < decoded_edge:
+            # Full resolution (or the original is smaller than what was asked for)
+            return True
+        return max_edge is not None and max_edge <= decoded_edge
+
+    def get(self, path, max_edge: Optional[int] = None, mode: str = "RGB") -> Image.Image:
+        """Decoded image no larger than max_edge (see decode_image)"""
+        cache_key = (str(path), mode)
+        key = fast_key(path)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[0] == key and self._covers(entry[1], entry[2], max_edge):
+                self._entries.move_to_end(cache_key)
+                image = entry[2]
+                self.stats["hits"] += 1
+            else:
+                image = None
+
+        if image is not None:
+            if max_edge and max(image.size) > max_edge:
+                with self._lock:
+                    self.stats["resized"] += 1
+                image = image.copy()
+                image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            return image
+
+        image = decode_image(path, max_edge, mode)
+        with self._lock:
+            self.stats["decoded"] += 1
+        self._store(cache_key, (key, max_edge, image))
+        return image
+
+    def _store(self, cache_key, entry):
+        size = self._nbytes(entry[2])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(cache_key, None)
+            if old:
+                self._bytes -= self._nbytes(old[2])
+            self._entries[cache_key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= self._nbytes(evicted)
+
+    @staticmethod
+    def _nbytes(image: Image.Image) -> int:
+        return len(image.getbands()) * image.width * image.height
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "mb": round(self._bytes / 1024 / 1024, 1)}
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_decoded_cache() -> DecodedImageCache:
+    """Process-wide DecodedImageCache, so every module shares one LRU"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = DecodedImageCache()
+        return _default_cache
+
+
+def load_image(path, max_edge: Optional[int] = None, mode: str = "RGB") -> Image.Image:
+    """decode_image() through the process-wide LRU; the result is shared, don't modify it"""
+    return get_decoded_cache().get(path, max_edge, mode)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print("Usage: python media_loader.py <image> [<image> ...]")
+        sys.exit(1)
+    paths = [Path(p) for p in sys.argv[1:]]
+    print(f"HEIC backend: {HEIC_BACKEND or 'none'}")
+
+    for label, fn in (
+        ("full decode + resize", lambda p, edge: ImageOps.contain(decode_image(p), (edge, edge))),
+        ("draft decode", lambda p, edge: decode_image(p, edge)),
+        ("cached (1024, then 512 / 448 / 256)", lambda p, edge: load_image(p, edge)),
+    ):
+        start = time.perf_counter()
+        for path in paths:
+            for edge in (1024, 512, 448, 256):
+                fn(path, edge)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>38}: {elapsed * 1000 / len(paths):7.1f} ms per image (4 sizes)")
+    print(f"Cache: {get_decoded_cache().get_stats()}")
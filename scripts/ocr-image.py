@@ -2,135 +2,326 @@
 """
 Ultra-Simple Image OCR with HEIC Support
 Extracts text from any image format including HEIC
+
+Runs Tesseract once (image_to_data) for both the text and the word boxes.
+Use --jsonl to get a machine-readable record with word bounding boxes and
+confidences; results are cached by the image's content hash.
+
+Pass a folder, a glob pattern or several files to OCR a whole batch: images
+are spread over a pool of worker processes, images already processed (under
+any filename) come from the cache, and every result goes to one JSONL file
+in input order. HEIC files are decoded in memory, never via a temporary JPG.
+
+All text also goes into the local full-text index (ocr_index.py), which the
+image search page can query without any model calls.
 """
 
 import sys
 import os
-from PIL import Image
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pytesseract
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.ocr_output import OCROutput, OCRResultCache, text_from_data, words_from_data
+from scripts.ocr_index import OCRTextIndex
+# HEIC decoders are registered once at import (workers inherit them)
+from scripts.media_loader import IMAGE_EXTENSIONS, open_image
 
+HASH_WORKERS = 8
+# Cache writes are batched into one transaction per this many results
+CACHE_FLUSH_EVERY = 100
 
-def convert_heic_to_jpg(heic_path):
+
+def _init_ocr_worker():
+    # One Tesseract thread per process; the pool provides the parallelism
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def ocr_file(image_path):
     """
-    Convert HEIC image to JPG
-    
+    OCR worker: one Tesseract call per image, never raises.
+
     Returns:
-        Path to converted JPG file
+        dict with width, height, text, words and error (None on success)
     """
+    record = {'width': None, 'height': None, 'text': '', 'words': [], 'error': None}
     try:
-        from pillow_heif import register_heif_opener
-        register_heif_opener()
-        print("✓ HEIC support enabled")
-        return None  # PIL can now open HEIC directly
-    except ImportError:
-        print("Note: pillow-heif not installed, attempting conversion...")
-        
-        # Try using pyheif if available
-        try:
-            import pyheif
-            
-            heif_file = pyheif.read(heic_path)
-            image = Image.frombytes(
-                heif_file.mode,
-                heif_file.size,
-                heif_file.data,
-                "raw",
-                heif_file.mode,
-                heif_file.stride,
-            )
-            
-            # Save as temporary JPG
-            jpg_path = heic_path.rsplit('.', 1)[0] + '_converted.jpg'
-            image.save(jpg_path, "JPEG")
-            print(f"✓ Converted HEIC to: {jpg_path}")
-            return jpg_path
-            
-        except ImportError:
-            print("\nError: Cannot process HEIC files without additional libraries")
-            print("\nInstall HEIC support with ONE of these:")
-            print("  pip install pillow-heif")
-            print("  OR")
-            print("  pip install pyheif")
-            print("\nAlternatively, convert the HEIC file to JPG manually:")
-            print("  macOS: Open in Preview, File > Export > Format: JPEG")
-            return None
-
-
-def open_image(image_path):
+        with open_image(image_path) as image:
+            record['width'], record['height'] = image.size
+            data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+        record['text'] = text_from_data(data)
+        record['words'] = words_from_data(data)
+    except Exception as e:
+        record['error'] = str(e)
+    return record
+
+
+def _hash_or_error(path):
+    """(content_hash, None), or (None, error) if the file can't be read (e.g. it vanished)"""
+    try:
+        return OCRResultCache.content_hash(path), None
+    except OSError as e:
+        return None, str(e)
+
+
+def ocr_settings():
+    """What a cached result depends on besides the image itself"""
+    return {'kind': 'image', 'engine': str(pytesseract.get_tesseract_version())}
+
+
+def ocr_image(image_path, use_cache=True):
     """
-    Open image, handling HEIC format if needed
+    OCR one image, reusing a cached result for identical content.
+
+    Returns:
+        (record, from_cache); record has source, content_hash, width,
+        height, text, words (text, conf, left, top, width, height) and error
     """
-    file_ext = os.path.splitext(image_path)[1].lower()
-    
-    if file_ext in ['.heic', '.heif']:
-        # Try to handle HEIC
-        converted_path = convert_heic_to_jpg(image_path)
-        if converted_path:
-            return Image.open(converted_path), converted_path
-        else:
-            # pillow_heif registered, can open directly
-            return Image.open(image_path), None
+    content_hash = OCRResultCache.content_hash(image_path)
+    settings = ocr_settings()
+    cache = OCRResultCache() if use_cache else None
+    cached = cache.get(content_hash, settings) if cache else None
+    if cached:
+        record = {'source': image_path, 'content_hash': content_hash, **cached}
     else:
-        # Regular image format
-        return Image.open(image_path), None
+        # Cached under the content alone: the same image may turn up under other names
+        result = ocr_file(image_path)
+        if cache and not result['error']:
+            cache.set(content_hash, settings, result)
+        record = {'source': image_path, 'content_hash': content_hash, **result}
+    OCRTextIndex().add(record)
+    return record, bool(cached)
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python heic_ocr.py <image_path>")
-        print("\nExample:")
-        print("  python heic_ocr.py photo.jpg")
-        print("  python heic_ocr.py photo.HEIC")
-        print("\nSupported formats: JPG, PNG, HEIC, HEIF, and more")
-        sys.exit(1)
-    
-    image_path = sys.argv[1]
-    
+def collect_images(inputs, recursive=False):
+    """
+    Expand files, folders and glob patterns into a sorted, de-duplicated
+    list of image paths.
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*') if recursive else os.path.join(item, '*')
+            candidates = glob.glob(pattern, recursive=recursive)
+        elif os.path.isfile(item):
+            paths.append(item)
+            continue
+        else:
+            candidates = glob.glob(item, recursive=True)
+        paths.extend(path for path in candidates
+                     if os.path.isfile(path) and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS)
+    return sorted(dict.fromkeys(paths))
+
+
+def ocr_batch(paths, jsonl, workers=None, use_cache=True):
+    """
+    OCR many images with a process pool, writing one JSONL record per image.
+
+    Records are written in input order and carry an `index` (their position
+    in `paths`). Images with identical content are OCR'd once. A file that
+    can't be read gets an error record instead of stopping the batch.
+
+    Args:
+        paths: Image files
+        jsonl: Output file ('-' = stdout)
+        workers: OCR worker processes (default: CPU count)
+        use_cache: Skip images whose content was already OCR'd
+
+    Returns:
+        Summary dict: images, unique, cached, ocr, failed, seconds
+    """
+    log = sys.stderr if jsonl == '-' else sys.stdout
+    start = time.perf_counter()
+    settings = ocr_settings()
+    cache = OCRResultCache() if use_cache else None
+
+    # Content hashes (stat-only for files seen before; see content_hash.py)
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        hashed = list(pool.map(_hash_or_error, paths))
+    first_path = {}
+    for path, (content_hash, error) in zip(paths, hashed):
+        if error:
+            # Unreadable files get an error record; the rest of the batch carries on
+            print(f"  ✗ {path}: {error}", file=log)
+        else:
+            first_path.setdefault(content_hash, path)
+
+    results = cache.get_many(first_path, settings) if cache else {}
+    todo = [(content_hash, path) for content_hash, path in first_path.items() if content_hash not in results]
+    unreadable = sum(1 for _, error in hashed if error)
+    summary = {'images': len(paths), 'unique': len(first_path), 'cached': len(results),
+               'ocr': len(todo), 'failed': unreadable}
+    print(f"🖼️  {len(paths)} images ({len(first_path)} unique), {len(results)} cached, "
+          f"{len(todo)} to OCR with {workers or os.cpu_count()} workers", file=log)
+
+    # Text for the full-text index, one entry per unique content
+    index_records = {}
+
+    with OCROutput(jsonl=jsonl) as output:
+        def write_ready(next_index):
+            # Emit records in input order as soon as their content is done
+            while next_index < len(paths):
+                content_hash, error = hashed[next_index]
+                if error:
+                    output.write({'index': next_index, 'source': paths[next_index], 'content_hash': None,
+                                  'width': None, 'height': None, 'text': '', 'words': [], 'error': error})
+                elif content_hash in results:
+                    result = results[content_hash]
+                    output.write({'index': next_index, 'source': paths[next_index],
+                                  'content_hash': content_hash, **result})
+                    index_records.setdefault(content_hash, {
+                        'content_hash': content_hash, 'source': paths[next_index],
+                        'text': result['text'], 'error': result['error']
+                    })
+                else:
+                    break
+                next_index += 1
+            return next_index
+
+        next_index = write_ready(0)
+        if todo:
+            pending_cache = []
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker) as executor:
+                chunksize = max(1, min(16, len(todo) // ((workers or os.cpu_count() or 1) * 4)))
+                records = executor.map(ocr_file, [path for _, path in todo], chunksize=chunksize)
+                for done, ((content_hash, path), record) in enumerate(zip(todo, records), 1):
+                    results[content_hash] = record
+                    if record['error']:
+                        summary['failed'] += 1
+                        print(f"  ✗ {path}: {record['error']}", file=log)
+                    elif cache:
+                        pending_cache.append((content_hash, record))
+                    if cache and len(pending_cache) >= CACHE_FLUSH_EVERY:
+                        cache.set_many(pending_cache, settings)
+                        pending_cache = []
+                    next_index = write_ready(next_index)
+                    if done % 50 == 0 or done == len(todo):
+                        rate = done / (time.perf_counter() - start)
+                        print(f"  {done}/{len(todo)} OCR'd ({rate:.1f} images/sec)", file=log)
+            if cache and pending_cache:
+                cache.set_many(pending_cache, settings)
+
+    OCRTextIndex().add_many(index_records.values())
+
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def print_tesseract_help():
+    print("\nMake sure Tesseract is installed:")
+    print("  macOS:   brew install tesseract")
+    print("  Ubuntu:  sudo apt-get install tesseract-ocr")
+    print("  Windows: https://github.com/UB-Mannheim/tesseract/wiki")
+    print("\nFor HEIC support, install:")
+    print("  pip install pillow-heif")
+
+
+def ocr_single(image_path, jsonl=None, use_cache=True):
+    """OCR one image and print its text"""
+    # Keep stdout clean for the record with --jsonl -
+    log = sys.stderr if jsonl == '-' else sys.stdout
+
     try:
-        # Check if file exists
-        if not os.path.exists(image_path):
-            print(f"Error: Image file '{image_path}' not found")
-            sys.exit(1)
-        
-        print(f"Processing: {image_path}")
-        print("=" * 80)
-        
-        # Open image (handles HEIC conversion if needed)
-        image, temp_file = open_image(image_path)
-        
-        print(f"Image size: {image.size[0]}x{image.size[1]}")
-        print("\nRunning OCR...")
-        
-        # Extract text
-        text = pytesseract.image_to_string(image)
-        
+        print(f"Processing: {image_path}", file=log)
+        print("=" * 80, file=log)
+        print("\nRunning OCR...", file=log)
+
+        record, from_cache = ocr_image(image_path, use_cache=use_cache)
+        if record['error']:
+            raise RuntimeError(record['error'])
+        print(f"Image size: {record['width']}x{record['height']}" + (" (cached result)" if from_cache else ""),
+              file=log)
+
         # Print text
-        print("\n📄 EXTRACTED TEXT:")
-        print("-" * 80)
+        text = record['text']
+        print("\n📄 EXTRACTED TEXT:", file=log)
+        print("-" * 80, file=log)
         if text.strip():
-            print(text)
+            print(text, file=log)
         else:
-            print("[No text detected]")
-        print("-" * 80)
-        
-        # Clean up temporary file if created
-        if temp_file and os.path.exists(temp_file):
-            os.remove(temp_file)
-            print(f"\n(Temporary file removed: {temp_file})")
-        
+            print("[No text detected]", file=log)
+        print("-" * 80, file=log)
+
+        if jsonl:
+            with OCROutput(jsonl=jsonl) as output:
+                output.write(record)
+            if jsonl != '-':
+                print(f"\nWrote {jsonl}")
+
     except FileNotFoundError:
         print(f"Error: Image file '{image_path}' not found")
         sys.exit(1)
     except Exception as e:
         print(f"Error: {e}")
-        print("\nMake sure Tesseract is installed:")
-        print("  macOS:   brew install tesseract")
-        print("  Ubuntu:  sudo apt-get install tesseract-ocr")
-        print("  Windows: https://github.com/UB-Mannheim/tesseract/wiki")
-        print("\nFor HEIC support, install:")
-        print("  pip install pillow-heif")
+        print_tesseract_help()
         sys.exit(1)
 
 
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Extract text from images (JPG, PNG, HEIC, HEIF, and more)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python ocr-image.py photo.jpg
+  python ocr-image.py photo.HEIC
+  python ocr-image.py photo.jpg --jsonl photo.jsonl
+
+  # Batch: a folder, a glob, or several files -> one JSONL file
+  python ocr-image.py ~/Screenshots --jsonl screenshots.jsonl
+  python ocr-image.py "shots/**/*.png" -w 8
+        """
+    )
+    parser.add_argument('inputs', nargs='+', help='Image file(s), folder(s) or glob pattern(s)')
+    parser.add_argument(
+        '--jsonl',
+        help='Write JSON records with word boxes and confidences; - for stdout '
+             '(batch default: ocr_results.jsonl)'
+    )
+    parser.add_argument('-r', '--recursive', action='store_true', help='Include images in subfolders')
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=None,
+        help='OCR worker processes in batch mode (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Re-run OCR even if an image was already processed'
+    )
+    args = parser.parse_args()
+
+    # A single existing file keeps the interactive single-image output
+    if len(args.inputs) == 1 and os.path.isfile(args.inputs[0]):
+        ocr_single(args.inputs[0], args.jsonl, use_cache=not args.no_cache)
+        return
+
+    paths = collect_images(args.inputs, recursive=args.recursive)
+    if not paths:
+        print(f"Error: No images found in {', '.join(args.inputs)}")
+        sys.exit(1)
+
+    jsonl = args.jsonl or 'ocr_results.jsonl'
+    log = sys.stderr if jsonl == '-' else sys.stdout
+    try:
+        summary = ocr_batch(paths, jsonl, workers=args.workers, use_cache=not args.no_cache)
+    except pytesseract.TesseractNotFoundError as e:
+        print(f"Error: {e}")
+        print_tesseract_help()
+        sys.exit(1)
+
+    print("=" * 80, file=log)
+    print(f"✅ {summary['images']} images in {summary['seconds']:.1f}s "
+          f"({summary['images'] / summary['seconds']:.1f} images/sec): "
+          f"{summary['cached']} cached, {summary['ocr']} OCR'd, {summary['failed']} failed", file=log)
+    if jsonl != '-':
+        print(f"Wrote {jsonl}", file=log)
+
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
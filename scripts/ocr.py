@@ -2,126 +2,486 @@
 """
 Multi-Frame OCR
 Extract frames at regular intervals and run OCR on each one
+
+Frames are decoded sequentially (grab() every frame, retrieve() only the
+sampled ones) instead of seeking to each sample, and handed as numpy arrays
+to a pool of OCR worker processes. Each frame costs a single Tesseract call
+(image_to_data); the plain text is rebuilt from its word boxes.
+
+A cheap scene-change gate skips OCR for frames that look like the last
+OCR'd one, so static slides and captions come out as a single text span
+with start/end timestamps instead of one result per sampled frame.
+
+Spans can be written as JSONL records (with word boxes) and as SRT/WebVTT
+caption tracks, and are cached by the video's content hash. Their text is
+added to the local full-text index (ocr_index.py).
 """
 
 import cv2
 import pytesseract
-from PIL import Image
 import argparse
 import sys
 import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.ocr_output import OCROutput, OCRResultCache, text_from_data, words_from_data
+from scripts.ocr_index import OCRTextIndex
+
+# Gaps between samples longer than this are crossed with a seek: decoding
+# every frame only pays off while the gap is shorter than a typical GOP
+SEEK_GAP_FRAMES = 250
+
+# Fraction of a frame's low-res cells that must change before it is OCR'd again
+DEFAULT_SCENE_THRESHOLD = 0.02
+
+
+def _init_ocr_worker():
+    # One Tesseract thread per process; the pool provides the parallelism
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def ocr_frame(idx, timestamp, frame, frame_path=None):
+    """
+    OCR worker: run Tesseract once on a BGR frame.
+
+    Returns:
+        dict with index, timestamp, text, words and error (None on success)
+    """
+    result = {'index': idx, 'timestamp': timestamp, 'text': '', 'words': [], 'error': None}
+    try:
+        if frame_path:
+            cv2.imwrite(frame_path, frame)
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        data = pytesseract.image_to_data(rgb, output_type=pytesseract.Output.DICT)
+        result['text'] = text_from_data(data)
+        result['words'] = words_from_data(data)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
 
+def sample_targets(fps, total_frames, interval):
+    """(frame_number, timestamp) of every frame to sample, one per interval"""
+    duration = total_frames / fps
+    targets = []
+    current_time = 0
+    while current_time <= duration:
+        frame_number = int(current_time * fps)
+        if not targets or frame_number != targets[-1][0]:
+            targets.append((frame_number, current_time))
+        current_time += interval
+    return targets
+
+
+def iter_sampled_frames(video, fps, total_frames, interval):
+    """
+    Decode the video front to back, yielding (idx, timestamp, frame) for one
+    frame every `interval` seconds. grab() advances without converting the
+    frame; only sampled frames are retrieve()d. Very sparse samples
+    (gaps over SEEK_GAP_FRAMES) are reached with a seek instead.
+    """
+    position = 0
+    for idx, (frame_number, timestamp) in enumerate(sample_targets(fps, total_frames, interval)):
+        if frame_number - position > SEEK_GAP_FRAMES:
+            video.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            position = frame_number
+        while position < frame_number:
+            if not video.grab():
+                return
+            position += 1
+        if not video.grab():
+            return
+        position += 1
+        ret, frame = video.retrieve()
+        if ret:
+            yield idx, timestamp, frame
 
-def extract_and_ocr_frames(video_path, interval=1.0, output_dir='frames', min_confidence=30):
+
+class FrameGate:
+    """
+    Cheap scene-change test run on every sampled frame before OCR.
+    Frames are reduced to a small blurred grayscale thumbnail and compared
+    with the last frame that was OCR'd; the frame counts as changed when
+    more than `threshold` of the thumbnail's cells moved by over
+    `pixel_delta` grey levels. Comparing against the last OCR'd frame (not
+    the previous sample) means slow drift still triggers eventually.
+
+    Args:
+        threshold: Fraction of cells that must change (0 = OCR every frame)
+        pixel_delta: Grey-level difference for a cell to count as changed
+    """
+
+    SIGNATURE_SIZE = (64, 36)
+
+    def __init__(self, threshold=None, pixel_delta=12):
+        self.threshold = DEFAULT_SCENE_THRESHOLD if threshold is None else threshold
+        self.pixel_delta = pixel_delta
+        self.reference = None
+
+    def signature(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, self.SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (3, 3), 0).astype(np.int16)
+
+    def changed(self, frame):
+        """True if the frame should be OCR'd (and becomes the new reference)"""
+        if self.threshold <= 0:
+            return True
+        signature = self.signature(frame)
+        if self.reference is not None:
+            changed_cells = np.count_nonzero(np.abs(signature - self.reference) > self.pixel_delta)
+            if changed_cells < self.threshold * signature.size:
+                return False
+        self.reference = signature
+        return True
+
+
+def print_frame_result(result, count, min_confidence):
+    """Print one text span's OCR result"""
+    print(f"\n{'='*80}")
+    print(f"Span {result['index'] + 1} @ {result['start']:.2f}s - {result['end']:.2f}s "
+          f"({result['frames']}/{count} sampled frames)")
+    print(f"{'='*80}")
+
+    if result['error']:
+        print(f"  Error running OCR: {result['error']}")
+    elif result['text'].strip():
+        print(f"\n📄 TEXT FOUND:")
+        print("-" * 80)
+        print(result['text'].strip())
+        print("-" * 80)
+
+        # Print word-by-word with confidence
+        print(f"\n📊 DETAILS:")
+        for word in result['words']:
+            if word['conf'] >= min_confidence:
+                print(f"  '{word['text']}' ({word['conf']}%)")
+    else:
+        print(f"  [No text detected]")
+
+
+def run_ocr_pipeline(video_path, interval=1.0, output_dir='frames', workers=None, on_result=None,
+                     scene_threshold=None):
+    """
+    Decode sampled frames sequentially and OCR them in a process pool.
+    Only frames that pass the FrameGate are OCR'd; unchanged frames extend
+    the current span, and consecutive spans with identical text are merged.
+
+    Args:
+        video_path: Path to video file
+        interval: Seconds between frames
+        output_dir: Directory to save OCR'd frames (None = don't save)
+        workers: OCR worker processes (default: CPU count)
+        on_result: Optional callback(span, sampled_frame_count), called in order
+        scene_threshold: FrameGate threshold (default DEFAULT_SCENE_THRESHOLD;
+                         0 = OCR every sampled frame)
+
+    Returns:
+        (text spans in time order, video info dict), or (None, None) if the
+        video could not be opened. Each span has index, start, end, frames
+        (sampled frames covered), ocr_frames, text, words and error.
+    """
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        print(f"Error: Could not open video '{video_path}'")
+        return None, None
+
+    fps = video.get(cv2.CAP_PROP_FPS)
+    total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    info = {
+        'fps': fps,
+        'total_frames': total_frames,
+        'duration': total_frames / fps,
+        'width': int(video.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'frame_count': len(sample_targets(fps, total_frames, interval)),
+        'sampled_frames': 0,
+        'ocr_frames': 0,
+    }
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    gate = FrameGate(scene_threshold)
+    # Bounded queue of decoded frames so memory stays flat on long videos
+    max_pending = workers * 2
+    candidates = []      # one per OCR'd frame: start, end, frames covered
+    results = {}
+    next_index = 0
+    spans = []
+    decoding = True
+
+    def emit(result):
+        # Gate fired but the text is the same (e.g. the speaker moved): one span
+        previous = spans[-1] if spans else None
+        if (previous and not previous['error'] and not result['error']
+                and previous['text'] == result['text'] and previous['end'] >= result['start']):
+            previous['end'] = result['end']
+            previous['frames'] += result['frames']
+            previous['ocr_frames'] += 1
+            return
+        if previous and on_result:
+            on_result(previous, info['frame_count'])
+        result['index'] = len(spans)
+        spans.append(result)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker) as executor:
+        pending = set()
+
+        def drain(block):
+            nonlocal pending, next_index
+            if pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED, timeout=None if block else 0)
+                for future in done:
+                    result = future.result()
+                    results[result['index']] = result
+            # A candidate is final once the next one has started (its end is known)
+            while next_index in results and (next_index + 1 < len(candidates) or not decoding):
+                result = results.pop(next_index)
+                candidate = candidates[next_index]
+                del result['timestamp']
+                result.update(start=candidate['start'], end=candidate['end'],
+                              frames=candidate['frames'], ocr_frames=1)
+                next_index += 1
+                emit(result)
+
+        for idx, timestamp, frame in iter_sampled_frames(video, fps, total_frames, interval):
+            info['sampled_frames'] += 1
+            end = min(timestamp + interval, info['duration'])
+            # Always consult the gate, so the first sample becomes its reference
+            changed = gate.changed(frame)
+            if candidates and not changed:
+                candidates[-1]['end'] = end
+                candidates[-1]['frames'] += 1
+                continue
+
+            candidates.append({'start': timestamp, 'end': end, 'frames': 1})
+            frame_path = os.path.join(output_dir, f'frame_{idx:04d}_{timestamp:.1f}s.jpg') if output_dir else None
+            pending.add(executor.submit(ocr_frame, len(candidates) - 1, timestamp, frame, frame_path))
+            info['ocr_frames'] += 1
+            drain(block=len(pending) >= max_pending)
+
+        decoding = False
+        drain(block=False)
+        while pending:
+            drain(block=True)
+
+    if spans and on_result:
+        on_result(spans[-1], info['frame_count'])
+
+    video.release()
+    return spans, info
+
+
+def extract_and_ocr_frames(video_path, interval=1.0, output_dir='frames', min_confidence=30, workers=None,
+                           scene_threshold=None, jsonl=None, srt=None, vtt=None, use_cache=True):
     """
     Extract frames at intervals and run OCR on each
-    
+
     Args:
         video_path: Path to video file
         interval: Seconds between frames
         output_dir: Directory to save frames
         min_confidence: Minimum OCR confidence to display
+        workers: OCR worker processes (default: CPU count)
+        scene_threshold: Scene-change sensitivity (0 = OCR every sampled frame)
+        jsonl: Write one JSON record per text span here ('-' = stdout)
+        srt: Write an SRT caption track here
+        vtt: Write a WebVTT caption track here
+        use_cache: Reuse results for the same video content and settings
+
+    Returns:
+        List of text spans (index, start, end, frames, text, words, error)
     """
     # Check Tesseract
     try:
-        pytesseract.get_tesseract_version()
+        engine = str(pytesseract.get_tesseract_version())
     except Exception as e:
         print("Error: Tesseract OCR is not installed")
         return
-    
+
     # Open video
     video = cv2.VideoCapture(video_path)
     if not video.isOpened():
         print(f"Error: Could not open video '{video_path}'")
         return
-    
+
     # Get video info
     fps = video.get(cv2.CAP_PROP_FPS)
     total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
     duration = total_frames / fps
     width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    
-    print(f"Video Information:")
-    print(f"  File: {video_path}")
-    print(f"  Resolution: {width}x{height}")
-    print(f"  FPS: {fps:.2f}")
-    print(f"  Duration: {duration:.2f} seconds")
-    print(f"  Extracting frames every {interval} seconds")
-    print("=" * 80)
-    print()
-    
-    # Create output directory
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Calculate frame positions
-    frame_positions = []
+    video.release()
+
+    # Machine-readable records go to stdout with --jsonl -, so keep the report off it
+    log = sys.stderr if jsonl == '-' else sys.stdout
+
+    def report(*args):
+        print(*args, file=log)
+
+    report(f"Video Information:")
+    report(f"  File: {video_path}")
+    report(f"  Resolution: {width}x{height}")
+    report(f"  FPS: {fps:.2f}")
+    report(f"  Duration: {duration:.2f} seconds")
+    report(f"  Extracting frames every {interval} seconds")
+    report(f"  OCR workers: {workers or os.cpu_count()}")
+    report("=" * 80)
+    report()
+
+    cache = OCRResultCache() if use_cache else None
+    content_hash = OCRResultCache.content_hash(video_path)
+    settings = {
+        'kind': 'video',
+        'interval': interval,
+        'scene_threshold': DEFAULT_SCENE_THRESHOLD if scene_threshold is None else scene_threshold,
+        'engine': engine,
+    }
+
+    records = []
+    with OCROutput(jsonl=jsonl, srt=srt, vtt=vtt) as output:
+        def on_result(span, count):
+            if log is sys.stdout:
+                print_frame_result(span, count, min_confidence)
+            records.append({'source': video_path, 'content_hash': content_hash, **span})
+            output.write(records[-1])
+
+        start = time.perf_counter()
+        cached = cache.get(content_hash, settings) if cache else None
+        if cached:
+            spans, info = cached['spans'], cached['info']
+            for span in spans:
+                on_result(span, info['frame_count'])
+        else:
+            spans, info = run_ocr_pipeline(
+                video_path, interval, output_dir, workers,
+                on_result=on_result,
+                scene_threshold=scene_threshold
+            )
+            if spans is None:
+                return
+            if cache and not any(span['error'] for span in spans):
+                cache.set(content_hash, settings, {'spans': spans, 'info': info})
+        elapsed = time.perf_counter() - start
+    sampled = info['sampled_frames']
+    if not any(record['error'] for record in records):
+        OCRTextIndex().add_many(records)
+
+    report(f"\n{'='*80}")
+    if cached:
+        report(f"Complete! Reused cached OCR for this video ({len(spans)} text spans)")
+    else:
+        report(f"Complete! OCR'd frames saved to: {output_dir}/")
+        report(f"Sampled {sampled} frames in {elapsed:.1f}s ({sampled / elapsed:.2f} frames/sec)")
+        report(f"OCR ran on {info['ocr_frames']} of them ({len(spans)} text spans)")
+    for path in (jsonl, srt, vtt):
+        if path and path != '-':
+            report(f"Wrote {path}")
+    report(f"{'='*80}")
+    return spans
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+SLIDE_TEXT = [
+    ("Quarterly results", "Revenue grew 12 percent"),
+    ("Roadmap", "Launch the new editor in spring"),
+    ("Hiring plan", "Two designers and one engineer"),
+    ("Customer feedback", "Search needs to be faster"),
+    ("Next steps", "Ship the beta to all users"),
+    ("Questions", "Thank you for watching"),
+]
+
+
+def make_test_video(path, seconds=60, fps=30, width=1280, height=720, slide_seconds=10):
+    """
+    Write a screen-recording-like video: a new text slide every
+    slide_seconds, plus a small moving "presenter" blob on every frame.
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for frame_number in range(seconds * fps):
+        slide = (frame_number // (fps * slide_seconds)) % len(SLIDE_TEXT)
+        title, body = SLIDE_TEXT[slide]
+        frame = np.full((height, width, 3), 255, dtype=np.uint8)
+        cv2.putText(frame, title, (60, height // 2 - 60), cv2.FONT_HERSHEY_SIMPLEX, 2.0, (0, 0, 0), 4)
+        cv2.putText(frame, body, (60, height // 2 + 40), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (0, 0, 0), 3)
+        # Moving element so consecutive frames are never identical
+        cv2.circle(frame, (width - 120, height - 100 + int(20 * np.sin(frame_number / 5))), 30, (60, 60, 200), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def _seek_baseline(video_path, interval, output_dir, run_ocr):
+    """The previous implementation: seek per sample, JPEG round trip, two OCR calls"""
+    from PIL import Image
+    video = cv2.VideoCapture(video_path)
+    fps = video.get(cv2.CAP_PROP_FPS)
+    duration = int(video.get(cv2.CAP_PROP_FRAME_COUNT)) / fps
+    count = 0
     current_time = 0
     while current_time <= duration:
-        frame_positions.append(current_time)
-        current_time += interval
-    
-    print(f"Will extract {len(frame_positions)} frames\n")
-    
-    # Process each frame
-    for idx, timestamp in enumerate(frame_positions):
-        frame_number = int(timestamp * fps)
-        
-        # Read frame
-        video.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        video.set(cv2.CAP_PROP_POS_FRAMES, int(current_time * fps))
         ret, frame = video.read()
-        
-        if not ret:
-            continue
-        
-        # Save frame
-        frame_filename = os.path.join(output_dir, f'frame_{idx:04d}_{timestamp:.1f}s.jpg')
-        cv2.imwrite(frame_filename, frame)
-        
-        # Run OCR
-        print(f"\n{'='*80}")
-        print(f"Frame {idx + 1}/{len(frame_positions)} @ {timestamp:.2f}s")
-        print(f"{'='*80}")
-        
-        try:
-            # Convert to PIL Image for pytesseract
-            image = Image.open(frame_filename)
-            
-            # Get simple text
-            text = pytesseract.image_to_string(image)
-            
-            # Get detailed data
-            data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-            
-            # Print text if found
-            if text.strip():
-                print(f"\n📄 TEXT FOUND:")
-                print("-" * 80)
-                print(text.strip())
-                print("-" * 80)
-                
-                # Print word-by-word with confidence
-                print(f"\n📊 DETAILS:")
-                for i in range(len(data['text'])):
-                    word = data['text'][i].strip()
-                    if word:
-                        try:
-                            conf = int(data['conf'][i])
-                            if conf >= min_confidence:
-                                print(f"  '{word}' ({conf}%)")
-                        except (ValueError, TypeError):
-                            pass
-            else:
-                print(f"  [No text detected]")
-        
-        except Exception as e:
-            print(f"  Error running OCR: {e}")
-    
+        if ret:
+            frame_filename = os.path.join(output_dir, f'frame_{count:04d}_{current_time:.1f}s.jpg')
+            cv2.imwrite(frame_filename, frame)
+            if run_ocr:
+                image = Image.open(frame_filename)
+                pytesseract.image_to_string(image)
+                pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+            count += 1
+        current_time += interval
     video.release()
-    
-    print(f"\n{'='*80}")
-    print(f"Complete! Frames saved to: {output_dir}/")
-    print(f"{'='*80}")
+    return count
+
+
+def benchmark(interval=1.0, seconds=60, workers=None, scene_threshold=None):
+    """Compare frames/sec and OCR calls of the old loop, the pipeline, and the gated pipeline"""
+    import tempfile
+
+    try:
+        pytesseract.get_tesseract_version()
+        run_ocr = True
+    except Exception:
+        run_ocr = False
+        print("⚠️ Tesseract not installed: timing decoding and scene gating only\n")
+
+    scene_threshold = DEFAULT_SCENE_THRESHOLD if scene_threshold is None else scene_threshold
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, 'benchmark.mp4')
+        print(f"🎬 Generating {seconds}s 1280x720 test video (new slide every 10s)...")
+        make_test_video(video_path, seconds=seconds)
+
+        rows = []
+        start = time.perf_counter()
+        count = _seek_baseline(video_path, interval, tmp, run_ocr)
+        rows.append(("seek + JPEG + 2x OCR (before)", count, count * 2, time.perf_counter() - start))
+
+        for label, threshold in (("pipeline, every frame", 0), ("pipeline + scene gate", scene_threshold)):
+            start = time.perf_counter()
+            if run_ocr:
+                _, info = run_ocr_pipeline(video_path, interval, None, workers, scene_threshold=threshold)
+                count, calls = info['sampled_frames'], info['ocr_frames']
+            else:
+                video = cv2.VideoCapture(video_path)
+                gate = FrameGate(threshold)
+                count = calls = 0
+                for _, _, frame in iter_sampled_frames(
+                    video, video.get(cv2.CAP_PROP_FPS), int(video.get(cv2.CAP_PROP_FRAME_COUNT)), interval
+                ):
+                    count += 1
+                    calls += gate.changed(frame)
+                video.release()
+            rows.append((label, count, calls, time.perf_counter() - start))
+
+    print(f"\n{'mode':<32} {'frames':>7} {'OCR calls':>10} {'seconds':>8} {'frames/sec':>11}")
+    for label, count, calls, elapsed in rows:
+        print(f"{label:<32} {count:>7} {calls:>10} {elapsed:>8.2f} {count / elapsed:>11.2f}")
 
 
 def main():
@@ -131,17 +491,23 @@ def main():
         epilog="""
 Examples:
   # Extract frames every 1 second and run OCR
-  python multi_frame_ocr.py video.mp4
-  
+  python ocr.py video.mp4
+
   # Extract frames every 5 seconds
-  python multi_frame_ocr.py video.mp4 --interval 5
-  
+  python ocr.py video.mp4 --interval 5
+
   # Custom output directory and lower confidence threshold
-  python multi_frame_ocr.py video.mp4 --output my_frames --min-confidence 20
+  python ocr.py video.mp4 --output my_frames --min-confidence 20
+
+  # Write JSONL records with word boxes plus SRT / WebVTT captions
+  python ocr.py video.mp4 --jsonl video.jsonl --srt video.srt --vtt video.vtt
+
+  # Compare frames/sec against the old seek-per-frame approach
+  python ocr.py --benchmark
         """
     )
-    
-    parser.add_argument('video_path', help='Path to video file')
+
+    parser.add_argument('video_path', nargs='?', help='Path to video file')
     parser.add_argument(
         '-i', '--interval',
         type=float,
@@ -159,17 +525,58 @@ Examples:
         default=30,
         help='Minimum confidence to show text (default: 30)'
     )
-    
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=None,
+        help='OCR worker processes (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--benchmark',
+        action='store_true',
+        help='Run on a generated test video and report frames/sec'
+    )
+    parser.add_argument(
+        '--scene-threshold',
+        type=float,
+        default=DEFAULT_SCENE_THRESHOLD,
+        help=f'Fraction of the frame that must change before it is OCR\'d again; '
+             f'0 OCRs every sampled frame (default: {DEFAULT_SCENE_THRESHOLD})'
+    )
+    parser.add_argument(
+        '--jsonl',
+        help='Write one JSON record per text span (timestamps, word boxes, confidences); - for stdout'
+    )
+    parser.add_argument('--srt', help='Write the text spans as an SRT caption track')
+    parser.add_argument('--vtt', help='Write the text spans as a WebVTT caption track')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Re-run OCR even if this video was already processed with the same settings'
+    )
+
     args = parser.parse_args()
-    
+
+    if args.benchmark:
+        benchmark(interval=args.interval, workers=args.workers, scene_threshold=args.scene_threshold)
+        return 0
+    if not args.video_path:
+        parser.error("video_path is required (or use --benchmark)")
+
     extract_and_ocr_frames(
         args.video_path,
         interval=args.interval,
         output_dir=args.output,
-        min_confidence=args.min_confidence
+        min_confidence=args.min_confidence,
+        workers=args.workers,
+        scene_threshold=args.scene_threshold,
+        jsonl=args.jsonl,
+        srt=args.srt,
+        vtt=args.vtt,
+        use_cache=not args.no_cache
     )
-    
+
     return 0
 
 if __name__ == '__main__':
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+ocr_index.py
+
+Local full-text index of OCR text, keyed by content hash.
+ocr-image.py and ocr.py add every result they produce; the search page's
+"Text in image" mode and the CLI below query it with SQLite FTS5, so finding
+"the screenshot that says 'launch day'" takes milliseconds and no model calls.
+
+One row per image, or per text span for videos (with start/end seconds).
+Re-indexing a content hash replaces its rows, so running OCR again (or on a
+renamed copy) never creates duplicates.
+"""
+
+import os
+import sys
+import re
+import json
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.cache_store import SQLiteStore
+
+
+def to_fts_query(text: str) -> str:
+    """
+    Turn free text into a safe FTS5 query. "Quoted phrases" must appear as
+    written; other words must all appear, matched as prefixes, so "launch
+    day" also finds "Launched" and "days".
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        if phrase.strip():
+            terms.append('"' + phrase.strip().replace('"', '') + '"')
+        else:
+            # Keep letters/digits only; FTS5 would parse the rest as syntax
+            for token in re.findall(r'\w+', word):
+                terms.append(f'"{token}"*')
+    return " ".join(terms)
+
+
+class OCRTextIndex:
+    """
+    Full-text index over OCR results.
+
+    Args:
+        db_file: Database file name in the script directory
+    """
+
+    def __init__(self, db_file: str = "ocr_index.db"):
+        self.db_file = Path(__file__).parent / db_file
+        self.store = SQLiteStore(self.db_file, self._create_schema)
+
+    @staticmethod
+    def _create_schema(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                start REAL,
+                end REAL,
+                text TEXT NOT NULL,
+                source TEXT,
+                indexed REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS documents_hash ON documents (content_hash)")
+        # External-content FTS table: the text is stored once, in documents
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                text, content='documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+                INSERT INTO documents_fts (rowid, text) VALUES (new.id, new.text);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+                INSERT INTO documents_fts (documents_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END
+        """)
+
+    def add_many(self, records: Iterable[Dict]) -> int:
+        """
+        Index OCR records in one transaction, replacing earlier rows for the
+        same content hashes. Accepts the records ocr-image.py and ocr.py
+        write: images (text) or video spans (start, end, text). Records with
+        errors are skipped.
+
+        Returns:
+            Number of rows written
+        """
+        by_hash: Dict[str, List[Dict]] = {}
+        for record in records:
+            if record.get('error') or not record.get('content_hash'):
+                continue
+            by_hash.setdefault(record['content_hash'], []).append(record)
+
+        now = time.time()
+        rows = [
+            (content_hash, 'video' if 'start' in record else 'image', record.get('start'), record.get('end'),
+             record.get('text') or '', record.get('source'), now)
+            for content_hash, group in by_hash.items() for record in group
+            # Videos only need their spans that have text; images always get a row
+            if record.get('text', '').strip() or 'start' not in record
+        ]
+        with self.store.transaction() as conn:
+            conn.executemany("DELETE FROM documents WHERE content_hash = ?", [(h,) for h in by_hash])
+            conn.executemany(
+                "INSERT INTO documents (content_hash, kind, start, end, text, source, indexed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def add(self, record: Dict) -> int:
+        return self.add_many([record])
+
+    def search(self, query: str, limit: int = 200, content_hashes: Optional[Iterable[str]] = None,
+               highlight=('[', ']')) -> List[Dict]:
+        """
+        Best-first matches for a free-text query.
+
+        Args:
+            query: Words and/or "quoted phrases"
+            limit: Maximum number of matching images/videos
+            content_hashes: Only return these contents (e.g. one folder's images)
+            highlight: Markers put around matched terms in the snippet
+
+        Returns:
+            One dict per content hash: content_hash, kind, source, snippet,
+            score, plus start/end of the best span for videos
+        """
+        fts_query = to_fts_query(query)
+        if not fts_query:
+            return []
+        sql = (
+            "SELECT d.content_hash, d.kind, d.source, d.start, d.end, "
+            "snippet(documents_fts, 0, ?, ?, '…', 16), bm25(documents_fts) "
+            "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+            "WHERE documents_fts MATCH ?"
+        )
+        params = [highlight[0], highlight[1], fts_query]
+        if content_hashes is not None:
+            sql += " AND d.content_hash IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(content_hashes)))
+        sql += " ORDER BY bm25(documents_fts)"
+
+        hits, seen = [], set()
+        for content_hash, kind, source, start, end, snippet, score in self.store.execute(sql, params):
+            # Video spans: keep the best-scoring span per video
+            if content_hash in seen:
+                continue
+            seen.add(content_hash)
+            hit = {'content_hash': content_hash, 'kind': kind, 'source': source,
+                   'snippet': snippet, 'score': -score}
+            if kind == 'video':
+                hit.update(start=start, end=end)
+            hits.append(hit)
+            if len(hits) >= limit:
+                break
+        return hits
+
+    def indexed_hashes(self, content_hashes: Iterable[str]) -> set:
+        """Which of these contents have been OCR'd and indexed"""
+        rows = self.store.execute(
+            "SELECT DISTINCT content_hash FROM documents WHERE content_hash IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(content_hashes)),)
+        )
+        return {row[0] for row in rows}
+
+    def get_stats(self) -> Dict:
+        documents, contents = self.store.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT content_hash) FROM documents"
+        ).fetchone()
+        return {"rows": documents, "indexed_contents": contents}
+
+    def optimize(self):
+        """Merge the FTS segments (worth running after large imports)"""
+        self.store.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+
+    def clear(self):
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM documents")
+            conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('delete-all')")
+
+
+# -------------------------
+# CLI Testing Interface
+# -------------------------
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search OCR text indexed by ocr-image.py and ocr.py")
+    sub = parser.add_subparsers(dest="command", required=True)
+    search_cmd = sub.add_parser("search", help="Full-text search, e.g. search 'launch day'")
+    search_cmd.add_argument("query", nargs="+")
+    search_cmd.add_argument("-n", "--limit", type=int, default=20)
+    import_cmd = sub.add_parser("import", help="Index records from .jsonl files written with --jsonl")
+    import_cmd.add_argument("files", nargs="+")
+    sub.add_parser("stats", help="Show index size")
+    args = parser.parse_args()
+
+    index = OCRTextIndex()
+    if args.command == "search":
+        start = time.perf_counter()
+        hits = index.search(" ".join(args.query), limit=args.limit)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for hit in hits:
+            where = f" @ {hit['start']:.1f}s-{hit['end']:.1f}s" if hit['kind'] == 'video' else ""
+            print(f"{hit['score']:6.2f}  {hit['source'] or hit['content_hash']}{where}")
+            print(f"        {' '.join(hit['snippet'].split())}")
+        print(f"\n🔍 {len(hits)} matches in {elapsed_ms:.1f} ms")
+    elif args.command == "import":
+        total = 0
+        for path in args.files:
+            with open(path, encoding="utf-8") as f:
+                total += index.add_many(json.loads(line) for line in f if line.strip())
+        index.optimize()
+        print(f"✅ Indexed {total} rows from {len(args.files)} file(s)")
+    else:
+        stats = index.get_stats()
+        print(f"📊 {stats['indexed_contents']} images/videos, {stats['rows']} rows ({index.db_file})")
+    sys.exit(0)
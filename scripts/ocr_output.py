@@ -0,0 +1,283 @@
+"""
+ocr_output.py
+
+Machine-readable output shared by ocr.py and ocr-image.py.
+- text_from_data / words_from_data turn one Tesseract image_to_data call
+  into plain text plus word boxes with confidences
+- OCROutput streams one JSON record per video text span or image to a
+  .jsonl file, and optionally merged SRT / WebVTT caption tracks; every
+  record is flushed as it is written, so an interrupted run is still usable
+- OCRResultCache stores finished results by content hash and OCR settings,
+  so re-running on the same media (under any filename) is instant
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.cache_store import SQLiteStore
+from scripts.content_hash import get_hasher
+
+# Bump when the record layout changes so stale cache entries are ignored
+RECORD_VERSION = 2
+
+
+def text_from_data(data) -> str:
+    """
+    Rebuild image_to_string-style text from image_to_data output:
+    words joined per line, lines per paragraph, blank line between paragraphs.
+    """
+    paragraphs = []
+    current_par = current_line = None
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word:
+            continue
+        par = (data['block_num'][i], data['par_num'][i])
+        line = par + (data['line_num'][i],)
+        if par != current_par:
+            paragraphs.append([[word]])
+        elif line != current_line:
+            paragraphs[-1].append([word])
+        else:
+            paragraphs[-1][-1].append(word)
+        current_par, current_line = par, line
+    return "\n\n".join("\n".join(" ".join(words) for words in lines) for lines in paragraphs)
+
+
+def words_from_data(data) -> List[Dict]:
+    """Recognised words with confidence and bounding box"""
+    words = []
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word:
+            continue
+        try:
+            conf = int(float(data['conf'][i]))
+        except (ValueError, TypeError):
+            conf = -1
+        words.append({
+            'text': word,
+            'conf': conf,
+            'left': int(data['left'][i]),
+            'top': int(data['top'][i]),
+            'width': int(data['width'][i]),
+            'height': int(data['height'][i]),
+        })
+    return words
+
+
+def format_timestamp(seconds: float, decimal: str = '.') -> str:
+    """HH:MM:SS.mmm (WebVTT) or HH:MM:SS,mmm (SRT with decimal=',')"""
+    millis = int(round(max(seconds, 0) * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal}{millis:03d}"
+
+
+def caption_text(text: str) -> str:
+    """Cue text: a blank line would end the cue, so drop empty lines"""
+    return "\n".join(line for line in text.splitlines() if line.strip())
+
+
+class CaptionWriter:
+    """
+    Streams an SRT or WebVTT track. Consecutive cues with the same text are
+    merged into one, and spans without text (or with OCR errors) are skipped.
+
+    Args:
+        path: Output file
+        fmt: 'srt' or 'vtt'
+    """
+
+    def __init__(self, path, fmt: str):
+        if fmt not in ('srt', 'vtt'):
+            raise ValueError(f"Unknown caption format: {fmt}")
+        self.fmt = fmt
+        self.file = open(path, 'w', encoding='utf-8')
+        self.cue = None
+        self.count = 0
+        if fmt == 'vtt':
+            self.file.write("WEBVTT\n\n")
+
+    def add(self, start: float, end: float, text: str):
+        text = caption_text(text)
+        if not text:
+            return
+        if self.cue and self.cue[2] == text and start <= self.cue[1]:
+            self.cue[1] = max(self.cue[1], end)
+            return
+        self._flush_cue()
+        self.cue = [start, end, text]
+
+    def _flush_cue(self):
+        if not self.cue:
+            return
+        start, end, text = self.cue
+        self.count += 1
+        if self.fmt == 'srt':
+            self.file.write(f"{self.count}\n{format_timestamp(start, ',')} --> {format_timestamp(end, ',')}\n{text}\n\n")
+        else:
+            self.file.write(f"{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n")
+        self.file.flush()
+        self.cue = None
+
+    def close(self):
+        self._flush_cue()
+        self.file.close()
+
+
+class OCROutput:
+    """
+    Fan-out writer for OCR records.
+
+    Args:
+        jsonl: Path for one JSON record per line ('-' = stdout, None = off)
+        srt: Path for an SRT caption track (video spans only)
+        vtt: Path for a WebVTT caption track (video spans only)
+    """
+
+    def __init__(self, jsonl=None, srt=None, vtt=None):
+        self.records = 0
+        self._jsonl = None
+        self._owns_jsonl = False
+        if jsonl == '-':
+            self._jsonl = sys.stdout
+        elif jsonl:
+            self._jsonl = open(jsonl, 'w', encoding='utf-8')
+            self._owns_jsonl = True
+        self.captions = [CaptionWriter(path, fmt) for path, fmt in ((srt, 'srt'), (vtt, 'vtt')) if path]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._jsonl or self.captions)
+
+    def write(self, record: Dict):
+        """Write one record; spans (records with start/end) also feed the caption tracks"""
+        if self._jsonl:
+            self._jsonl.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._jsonl.flush()
+        if 'start' in record and not record.get('error'):
+            for captions in self.captions:
+                captions.add(record['start'], record['end'], record.get('text', ''))
+        self.records += 1
+
+    def close(self):
+        for captions in self.captions:
+            captions.close()
+        if self._owns_jsonl:
+            self._jsonl.close()
+        self._jsonl = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def settings_key(settings: Dict) -> str:
+    """Stable digest of the OCR settings a result depends on"""
+    payload = json.dumps({'version': RECORD_VERSION, **settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class OCRResultCache:
+    """
+    OCR results keyed by (content hash, settings key). Values are whatever
+    JSON the caller stores: a list of spans for a video, one record for an
+    image. Results with errors should not be cached, so they are retried.
+    """
+
+    def __init__(self, db_file: str = "ocr_cache.db"):
+        self.db_file = Path(__file__).parent / db_file
+        self.store = SQLiteStore(self.db_file, lambda conn: conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                content_hash TEXT NOT NULL,
+                settings_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (content_hash, settings_key)
+            )
+        """))
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def content_hash(path) -> str:
+        """Content digest of a media file (persisted by content_hash.py)"""
+        return get_hasher().digest(path)
+
+    def get(self, content_hash: str, settings: Dict):
+        row = self.store.execute(
+            "SELECT payload FROM results WHERE content_hash = ? AND settings_key = ?",
+            (content_hash, settings_key(settings))
+        ).fetchone()
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return json.loads(row[0])
+
+    def set(self, content_hash: str, settings: Dict, payload):
+        self.store.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+            (content_hash, settings_key(settings), json.dumps(payload, ensure_ascii=False), time.time())
+        )
+
+    def get_many(self, content_hashes, settings: Dict) -> Dict[str, object]:
+        """Cached payloads for many hashes at once ({content_hash: payload})"""
+        key = settings_key(settings)
+        hashes = list(dict.fromkeys(content_hashes))
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            rows = self.store.execute(
+                f"SELECT content_hash, payload FROM results WHERE settings_key = ? "
+                f"AND content_hash IN ({','.join('?' * len(chunk))})",
+                (key, *chunk)
+            ).fetchall()
+            found.update((row[0], json.loads(row[1])) for row in rows)
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(hashes) - len(found)
+        return found
+
+    def set_many(self, items, settings: Dict) -> int:
+        """Store many (content_hash, payload) pairs in one transaction"""
+        key, now = settings_key(settings), time.time()
+        return self.store.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+            [(content_hash, key, json.dumps(payload, ensure_ascii=False), now) for content_hash, payload in items]
+        )
+
+    def clear(self) -> int:
+        return self.store.execute("DELETE FROM results").rowcount
+
+
+# -------------------------
+# CLI Testing Interface
+# -------------------------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert an OCR .jsonl file into caption tracks")
+    parser.add_argument("jsonl", help="JSONL written by ocr.py --jsonl")
+    parser.add_argument("--srt", help="Write an SRT track here")
+    parser.add_argument("--vtt", help="Write a WebVTT track here")
+    args = parser.parse_args()
+
+    if not (args.srt or args.vtt):
+        parser.error("nothing to do: pass --srt and/or --vtt")
+    with open(args.jsonl, encoding='utf-8') as f, OCROutput(srt=args.srt, vtt=args.vtt) as output:
+        for line in f:
+            if line.strip():
+                output.write(json.loads(line))
+    cues = ", ".join(f"{c.count} {c.fmt.upper()} cues" for c in output.captions)
+    print(f"✅ {output.records} records -> {cues}")
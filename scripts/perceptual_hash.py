@@ -0,0 +1,397 @@
+"""
+perceptual_hash.py
+
+Near-duplicate detection for media folders (burst shots, re-saves, resizes).
+- Hashing: every image is decoded once at reduced size (JPEG draft mode) to
+  a 32x32 grayscale thumbnail in a pool of worker processes; dHash (64-bit
+  gradient hash) and pHash (64-bit DCT hash) are then computed for the whole
+  batch at once with numpy. Hashes are stored by content hash, so a folder
+  is only ever hashed once.
+- Clustering: multi-index hamming lookup. Each dHash is split into
+  threshold + 1 chunks; two hashes within `threshold` bits must agree
+  exactly on at least one chunk, so only hashes sharing a chunk value are
+  compared (vectorised), and matches are merged with union-find. A pair
+  also has to be close in pHash, which weeds out look-alike gradients.
+
+Used as a CLI (report / move duplicates) and as a pre-pass in the image
+search, so only one representative per cluster is sent to Gemini.
+"""
+
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.cache_store import SQLiteStore
+from scripts.media_loader import open_image
+
+# Max dHash / pHash bit differences (of 64) for two images to count as near-duplicates
+DEFAULT_THRESHOLD = 6
+DEFAULT_PHASH_THRESHOLD = 12
+
+THUMB_SIZE = 32
+HASH_CHUNKSIZE = 64
+# Row block for the pairwise check inside one bucket (bounds memory for huge buckets)
+COMPARE_BLOCK = 2048
+
+_POPCOUNT_LUT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so dct(X) = D @ X @ D.T"""
+    k = np.arange(n)[:, None]
+    d = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    d[0] /= np.sqrt(2)
+    return d.astype(np.float32)
+
+
+_DCT = _dct_matrix(THUMB_SIZE)
+
+
+def popcount(x: np.ndarray) -> np.ndarray:
+    """Set bits per uint64 element"""
+    if hasattr(np, "bitwise_count"):  # numpy 2.0+
+        return np.bitwise_count(x)
+    return _POPCOUNT_LUT[x.view(np.uint8)].reshape(*x.shape, 8).sum(axis=-1)
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def load_thumbnail(path) -> Optional[bytes]:
+    """
+    Worker: decode an image straight to a 32x32 grayscale thumbnail.
+    JPEGs are decoded at 1/2-1/8 scale by the DCT (draft mode), which is
+    most of the speed-up over a full decode. Returns raw bytes or None.
+    """
+    try:
+        with open_image(path) as img:
+            img.draft("L", (THUMB_SIZE * 4, THUMB_SIZE * 4))
+            img = ImageOps.exif_transpose(img).convert("L")
+            return img.resize((THUMB_SIZE, THUMB_SIZE), Image.BILINEAR).tobytes()
+    except Exception:
+        return None
+
+
+def hash_thumbnails(thumbs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    dHash and pHash for a stack of 32x32 grayscale thumbnails, vectorised.
+
+    Args:
+        thumbs: uint8 array of shape (N, 32, 32)
+
+    Returns:
+        (dhashes, phashes) as uint64 arrays of length N
+    """
+    pixels = thumbs.astype(np.float32)
+    n = len(pixels)
+
+    # dHash: shrink to 9 columns x 8 rows of band means; each bit says whether
+    # brightness increases from one column to the next
+    rows = pixels.reshape(n, 8, 4, THUMB_SIZE).mean(axis=2)
+    cols = np.linspace(0, THUMB_SIZE, 10).astype(int)
+    small = np.stack([rows[:, :, a:b].mean(axis=2) for a, b in zip(cols[:-1], cols[1:])], axis=2)
+    dbits = small[:, :, 1:] > small[:, :, :-1]
+
+    # pHash: low 8x8 frequencies of the 2-D DCT, thresholded at their median (DC excluded)
+    low = (_DCT @ pixels @ _DCT.T)[:, :8, :8].reshape(n, 64)
+    pbits = low > np.median(low[:, 1:], axis=1)[:, None]
+
+    def pack(bits):
+        return np.packbits(bits.reshape(n, 64), axis=1).view(">u8").ravel().astype(np.uint64)
+
+    return pack(dbits), pack(pbits)
+
+
+class PerceptualHashStore:
+    """
+    dHash/pHash per content hash, persisted in SQLite.
+
+    Args:
+        db_file: Database file name in the script directory
+    """
+
+    def __init__(self, db_file: str = "perceptual_hashes.db"):
+        self.db_file = Path(__file__).parent / db_file
+        self.store = SQLiteStore(self.db_file, lambda conn: conn.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                content_hash TEXT PRIMARY KEY,
+                dhash INTEGER NOT NULL,
+                phash INTEGER NOT NULL
+            )
+        """))
+
+    def _load(self, content_hashes: Sequence[str]) -> Dict[str, Tuple[int, int]]:
+        found = {}
+        for i in range(0, len(content_hashes), 500):
+            chunk = content_hashes[i:i + 500]
+            rows = self.store.execute(
+                f"SELECT content_hash, dhash, phash FROM hashes "
+                f"WHERE content_hash IN ({','.join('?' * len(chunk))})", chunk
+            )
+            found.update((h, (_to_unsigned(d), _to_unsigned(p))) for h, d, p in rows)
+        return found
+
+    def compute(self, items: Iterable[Tuple[Path, str]], workers: Optional[int] = None,
+                progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Tuple[int, int]]:
+        """
+        Hashes for (path, content_hash) items; only unseen contents are decoded.
+
+        Args:
+            items: (path, content_hash) pairs, e.g. from FolderManifest
+            workers: Decoder processes (default: CPU count)
+            progress_callback: Optional fn(done, total) while decoding
+
+        Returns:
+            {content_hash: (dhash, phash)}; unreadable images are left out
+        """
+        paths = {}
+        for path, content_hash in items:
+            paths.setdefault(content_hash, path)
+        hashes = self._load(list(paths))
+        todo = [(content_hash, path) for content_hash, path in paths.items() if content_hash not in hashes]
+        if not todo:
+            return hashes
+
+        thumbs, done_hashes = [], []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            decoded = executor.map(load_thumbnail, [path for _, path in todo], chunksize=HASH_CHUNKSIZE)
+            for i, ((content_hash, _), thumb) in enumerate(zip(todo, decoded), 1):
+                if thumb is not None:
+                    thumbs.append(np.frombuffer(thumb, dtype=np.uint8))
+                    done_hashes.append(content_hash)
+                if progress_callback and (i % 256 == 0 or i == len(todo)):
+                    progress_callback(i, len(todo))
+
+        if thumbs:
+            dhashes, phashes = hash_thumbnails(np.stack(thumbs).reshape(-1, THUMB_SIZE, THUMB_SIZE))
+            new = {h: (int(d), int(p)) for h, d, p in zip(done_hashes, dhashes, phashes)}
+            self.store.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?)",
+                [(h, _to_signed(d), _to_signed(p)) for h, (d, p) in new.items()]
+            )
+            hashes.update(new)
+        return hashes
+
+
+def find_clusters(hashes: Dict[str, Tuple[int, int]], threshold: int = DEFAULT_THRESHOLD,
+                  phash_threshold: int = DEFAULT_PHASH_THRESHOLD) -> List[List[str]]:
+    """
+    Group near-duplicates: keys whose dHashes differ in at most `threshold`
+    bits and pHashes in at most `phash_threshold` bits, merged transitively.
+
+    Returns:
+        Clusters with two or more keys, largest first
+    """
+    keys = list(hashes)
+    if len(keys) < 2:
+        return []
+    dh = np.fromiter((hashes[k][0] for k in keys), dtype=np.uint64, count=len(keys))
+    ph = np.fromiter((hashes[k][1] for k in keys), dtype=np.uint64, count=len(keys))
+
+    # Pigeonhole: within `threshold` bits means one of threshold + 1 chunks is identical
+    chunks = min(threshold + 1, 64)
+    bounds = np.linspace(0, 64, chunks + 1).astype(int)
+    pairs = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        mask = np.uint64((1 << int(hi - lo)) - 1)
+        bucket = (dh >> np.uint64(lo)) & mask
+        order = np.argsort(bucket, kind="stable")
+        sorted_bucket = bucket[order]
+        starts = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+        sizes = np.diff(np.r_[starts, len(order)])
+        for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            members = order[start:start + size]
+            for row in range(0, size, COMPARE_BLOCK):
+                block = members[row:row + COMPARE_BLOCK]
+                close = ((popcount(dh[block][:, None] ^ dh[members][None, :]) <= threshold)
+                         & (popcount(ph[block][:, None] ^ ph[members][None, :]) <= phash_threshold))
+                a, b = np.nonzero(close)
+                i, j = block[a], members[b]
+                pairs.append(np.stack([i[i < j], j[i < j]], axis=1))
+
+    # Union-find over the matching pairs (a pair can turn up in several chunks)
+    parent = list(range(len(keys)))
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    for i, j in np.unique(np.concatenate(pairs), axis=0).tolist() if pairs else []:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    groups: Dict[int, List[str]] = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(find(i), []).append(key)
+    return sorted((g for g in groups.values() if len(g) > 1), key=len, reverse=True)
+
+
+def dedupe(paths: Sequence[Path], content_hashes: Dict[Path, str],
+           score: Optional[Callable[[Path], float]] = None, threshold: int = DEFAULT_THRESHOLD,
+           workers: Optional[int] = None, progress_callback=None,
+           store: Optional[PerceptualHashStore] = None) -> Tuple[List[Path], Dict[Path, List[Path]]]:
+    """
+    Pick one representative per near-duplicate cluster (identical copies
+    included).
+
+    Args:
+        paths: Images, in the order the caller wants to keep
+        content_hashes: {path: content hash} (e.g. from FolderManifest)
+        score: Higher is a better representative (default: larger file)
+        threshold: dHash bit threshold (0 = identical content only)
+
+    Returns:
+        (representatives in input order, {representative: [duplicates]})
+    """
+    score = score or (lambda path: os.path.getsize(path))
+    store = store or PerceptualHashStore()
+    by_hash: Dict[str, List[Path]] = {}
+    for path in paths:
+        by_hash.setdefault(content_hashes[path], []).append(path)
+
+    groups = [[h] for h in by_hash]
+    if threshold > 0:
+        hashes = store.compute([(members[0], h) for h, members in by_hash.items()], workers, progress_callback)
+        clustered = find_clusters(hashes, threshold)
+        in_cluster = {h for cluster in clustered for h in cluster}
+        groups = clustered + [[h] for h in by_hash if h not in in_cluster]
+
+    duplicates = {}
+    for group in groups:
+        members = [path for h in group for path in by_hash[h]]
+        if len(members) > 1:
+            best = max(members, key=score)
+            duplicates[best] = [path for path in members if path != best]
+    hidden = {path for dups in duplicates.values() for path in dups}
+    return [path for path in paths if path not in hidden], duplicates
+
+
+def dedupe_entries(entries, threshold: int = DEFAULT_THRESHOLD, workers: Optional[int] = None,
+                   progress_callback=None):
+    """
+    dedupe() for FolderManifest entries, keeping the highest resolution
+    (then the largest file) of each cluster.
+
+    Returns:
+        (representative entries in input order, {representative path: [duplicate paths]})
+    """
+    info = {entry.path: entry for entry in entries}
+    keep, duplicates = dedupe(
+        [entry.path for entry in entries], {entry.path: entry.content_hash for entry in entries},
+        score=lambda p: ((info[p].width or 0) * (info[p].height or 0), info[p].size),
+        threshold=threshold, workers=workers, progress_callback=progress_callback
+    )
+    return [info[path] for path in keep], duplicates
+
+
+# -------------------------
+# CLI
+# -------------------------
+def benchmark(count: int = 100_000, cluster_size: int = 4, noise_bits: int = 3, threshold: int = DEFAULT_THRESHOLD):
+    """Cluster synthetic hashes: count images in bursts of cluster_size"""
+    rng = np.random.default_rng(0)
+    bases = rng.integers(0, 2 ** 63, size=(count // cluster_size, 2), dtype=np.int64).astype(np.uint64) * np.uint64(2)
+    hashes = {}
+    for b, (d, p) in enumerate(bases):
+        for m in range(cluster_size):
+            flips = [rng.choice(64, size=rng.integers(0, noise_bits + 1), replace=False) for _ in range(2)]
+            dn = int(d) ^ sum(1 << int(bit) for bit in flips[0])
+            pn = int(p) ^ sum(1 << int(bit) for bit in flips[1])
+            hashes[f"{b}-{m}"] = (dn, pn)
+
+    start = time.perf_counter()
+    clusters = find_clusters(hashes, threshold)
+    elapsed = time.perf_counter() - start
+    exact = sum(1 for c in clusters if len(c) == cluster_size and len({k.split('-')[0] for k in c}) == 1)
+    print(f"📊 {len(hashes)} hashes clustered in {elapsed:.2f}s: {len(clusters)} clusters, "
+          f"{exact}/{len(bases)} bursts recovered exactly")
+
+    # Decode + hash throughput on generated JPEGs
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(100):
+            # Smooth, photo-like content (pure noise would make entropy decoding dominate)
+            path = Path(tmp) / f"img{i}.jpg"
+            Image.fromarray(rng.integers(0, 255, size=(30, 40, 3), dtype=np.uint8)).resize(
+                (4000, 3000), Image.BICUBIC).save(path, quality=90)
+            paths.append(path)
+        store = PerceptualHashStore(str(Path(tmp) / "bench.db"))
+        start = time.perf_counter()
+        store.compute([(p, str(i)) for i, p in enumerate(paths)])
+        rate = len(paths) / (time.perf_counter() - start)
+        print(f"🖼️  Hashed 12MP JPEGs at {rate:.0f} images/sec on {os.cpu_count()} CPU(s) "
+              f"(~{count / rate / 60:.1f} min for {count} images, once)")
+
+
+if __name__ == "__main__":
+    import sys
+    import shutil
+    import argparse
+    from scripts.folder_manifest import FolderManifest
+
+    parser = argparse.ArgumentParser(description="Find near-duplicate images (burst shots, re-saves) in a folder")
+    parser.add_argument("folder", nargs="?", help="Folder to scan")
+    parser.add_argument("-t", "--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help=f"Max dHash bit difference, 0 = identical files only (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Decoder processes (default: CPUs)")
+    parser.add_argument("--move-to", help="Move every duplicate (all but the best of each cluster) here")
+    parser.add_argument("--benchmark", action="store_true", help="Time clustering on 100k synthetic hashes")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(threshold=args.threshold)
+        sys.exit(0)
+    if not args.folder:
+        parser.error("folder is required (or use --benchmark)")
+
+    start = time.perf_counter()
+    manifest = FolderManifest(args.folder)
+    manifest.refresh()
+    entries = manifest.entries()
+    print(f"📁 {len(entries)} images in {manifest.folder}")
+
+    keep, duplicates = dedupe_entries(
+        entries, threshold=args.threshold, workers=args.workers,
+        progress_callback=lambda done, total: print(f"\r  Hashing {done}/{total}", end="", flush=True)
+    )
+    print()
+    for best, dups in sorted(duplicates.items(), key=lambda item: -len(item[1])):
+        print(f"\n✓ {best.name}")
+        for dup in dups:
+            print(f"    ≈ {dup.name}")
+
+    extra = sum(len(dups) for dups in duplicates.values())
+    print(f"\n📊 {extra} near-duplicates in {len(duplicates)} clusters; "
+          f"{len(keep)} of {len(entries)} images are distinct ({time.perf_counter() - start:.1f}s)")
+
+    if args.move_to and extra:
+        os.makedirs(args.move_to, exist_ok=True)
+        for dups in duplicates.values():
+            for dup in dups:
+                target = Path(args.move_to) / dup.name
+                n = 1
+                while target.exists():
+                    target = Path(args.move_to) / f"{dup.stem}_{n}{dup.suffix}"
+                    n += 1
+                shutil.move(str(dup), str(target))
+        print(f"📦 Moved {extra} duplicates to {args.move_to}")
@@ -5,10 +5,19 @@ Helper script to expand short user queries into detailed semantic search descrip
 Uses Gemini API to generate comprehensive image search criteria.
 """
 
+import os
+import sys
+import re
 import json
 import random
+import threading
+import unicodedata
 from pathlib import Path
-from google import genai
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.cache_store import SQLiteStore
+from scripts.client_pool import get_client
 
 MODEL_NAME = "gemini-2.0-flash-exp"
 
@@ -84,7 +93,7 @@ def expand_query(user_query: str, api_key: str = None) -> str:
     if not api_key:
         api_key = load_api_key()
     
-    client = genai.Client(api_key=api_key)
+    client = get_client(api_key)
     
     prompt = EXPANSION_PROMPT.format(query=user_query)
     
@@ -108,9 +117,151 @@ def expand_query(user_query: str, api_key: str = None) -> str:
         return user_query
 
 
-def expand_query_with_cache(user_query: str, api_key: str = None, cache_file: str = "query_cache.json") -> str:
+# Words that carry no meaning for image search
+STOPWORDS = {"a", "an", "the", "some", "photo", "photos", "image", "images", "picture", "pictures",
+             "of", "in", "on", "at"}
+
+# Spelling variants folded onto one token (applied after hyphens are removed).
+# These and simple plurals are the only differences a cached expansion is
+# reused across: a character-level similarity can't tell "shirt" from
+# "tshirt" or "rolled" from "unrolled".
+SYNONYMS = {
+    "tee": "tshirt",
+    "teeshirt": "tshirt",
+    "sleeved": "sleeve",
+    "grey": "gray",
+    "colour": "color",
+}
+
+
+def _singular(token: str) -> str:
+    if token.endswith(("sses", "xes", "ches", "shes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def normalize_query(user_query: str) -> str:
+    """
+    Canonical form of a query: lowercase, hyphens joined ("t-shirt" -> "tshirt"),
+    punctuation, articles and filler words dropped, simple plurals and a few
+    spelling variants folded.
+    """
+    text = unicodedata.normalize("NFKC", user_query).lower()
+    text = re.sub(r"(?<=\w)[-'’](?=\w)", "", text)
+    # "t shirt" written as two words
+    text = re.sub(r"\bt shirt", "tshirt", text)
+    tokens = []
+    for token in re.findall(r"\w+", text):
+        if token in STOPWORDS:
+            continue
+        token = _singular(token)
+        tokens.append(SYNONYMS.get(token, token))
+    return " ".join(tokens)
+
+
+class QueryExpansionCache:
+    """
+    Expansion cache kept in memory and backed by a shared SQLite store.
+
+    Lookups match the normalised query exactly, so only case, punctuation,
+    filler words, plurals and SYNONYMS variants share an expansion. Rows
+    written by other processes are picked up incrementally, so the store is
+    never re-read in full.
+    """
+
+    def __init__(self, cache_file: str = "query_cache.db"):
+        cache_path = Path(__file__).parent / cache_file
+        is_new = not cache_path.exists()
+        self.store = SQLiteStore(cache_path, lambda conn: conn.execute("""
+            CREATE TABLE IF NOT EXISTS expansions (
+                query_key TEXT PRIMARY KEY,
+                expanded TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+        """))
+        if is_new:
+            self._migrate_json_cache(cache_path.with_suffix(".json"))
+        self._lock = threading.Lock()
+        self._expansions = {}   # normalised query -> expansion
+        self._last_rowid = 0
+        self._sync()
+
+    def _migrate_json_cache(self, json_path: Path):
+        """Import expansions from the old JSON cache file, if present"""
+        if not json_path.exists():
+            return
+        try:
+            with open(json_path, 'r') as f:
+                cache = json.load(f)
+            now = datetime.now().isoformat()
+            self.store.executemany(
+                "INSERT OR IGNORE INTO expansions VALUES (?, ?, ?)",
+                [(normalize_query(key), expanded, now) for key, expanded in cache.items()]
+            )
+            print(f"Migrated {len(cache)} expansions from {json_path.name}")
+        except Exception as e:
+            print(f"Failed to migrate query cache: {e}")
+
+    def _sync(self):
+        """Load rows added since the last sync (by this or another process)"""
+        rows = self.store.execute(
+            "SELECT rowid, query_key, expanded FROM expansions WHERE rowid > ? ORDER BY rowid",
+            (self._last_rowid,)
+        ).fetchall()
+        with self._lock:
+            for rowid, query_key, expanded in rows:
+                # Older rows were keyed on lower().strip() only
+                key = normalize_query(query_key)
+                self._expansions[key] = expanded
+                self._last_rowid = max(self._last_rowid, rowid)
+
+    def lookup(self, user_query: str):
+        """
+        Find the cached expansion of a query (compared in normalised form).
+
+        Returns:
+            (expanded, normalised_query), or None on a miss
+        """
+        key = normalize_query(user_query)
+        for attempt in range(2):
+            with self._lock:
+                if key in self._expansions:
+                    return self._expansions[key], key
+            if attempt == 0:
+                # Another session may have expanded it meanwhile
+                self._sync()
+        return None
+
+    def add(self, user_query: str, expanded: str):
+        """Store an expansion under the normalised query"""
+        key = normalize_query(user_query)
+        self.store.execute(
+            "INSERT OR REPLACE INTO expansions VALUES (?, ?, ?)",
+            (key, expanded, datetime.now().isoformat())
+        )
+        with self._lock:
+            self._expansions[key] = expanded
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_query_cache(cache_file: str = "query_cache.db") -> QueryExpansionCache:
+    """Shared in-process expansion cache (one per file per process)"""
+    with _caches_lock:
+        if cache_file not in _caches:
+            _caches[cache_file] = QueryExpansionCache(cache_file)
+        return _caches[cache_file]
+
+
+def expand_query_with_cache(user_query: str, api_key: str = None, cache_file: str = "query_cache.db") -> str:
     """
     Expand query with caching to avoid repeated API calls for same queries.
+    Queries are normalised ("White T-Shirts" == "white tshirt"); any other
+    difference gets its own expansion.
     
     Args:
         user_query: Short phrase from user
@@ -120,33 +271,24 @@ def expand_query_with_cache(user_query: str, api_key: str = None, cache_file: st
     Returns:
         Expanded description (from cache or fresh API call)
     """
-    cache_path = Path(__file__).parent / cache_file
-    
-    # Load cache
-    cache = {}
-    if cache_path.exists():
-        try:
-            with open(cache_path, 'r') as f:
-                cache = json.load(f)
-        except:
-            cache = {}
+    cache = get_query_cache(cache_file)
     
     # Check cache
-    query_key = user_query.lower().strip()
-    if query_key in cache:
-        print(f"Using cached expansion for: '{user_query}'")
-        return cache[query_key]
+    hit = cache.lookup(user_query)
+    if hit:
+        expanded, matched_query = hit
+        print(f"Using cached expansion of '{matched_query}' for: '{user_query}'")
+        return expanded
     
     # Expand and cache
     expanded = expand_query(user_query, api_key)
-    cache[query_key] = expanded
     
-    # Save cache
-    try:
-        with open(cache_path, 'w') as f:
-            json.dump(cache, f, indent=2)
-    except Exception as e:
-        print(f"Failed to save cache: {e}")
+    # A failed expansion falls back to the raw query; don't cache that
+    if expanded != user_query:
+        try:
+            cache.add(user_query, expanded)
+        except Exception as e:
+            print(f"Failed to save cache: {e}")
     
     return expanded
 
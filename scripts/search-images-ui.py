@@ -1,31 +1,54 @@
 import os
+import sys
 import shutil
 import random
 import json
 import time
+import importlib.util
 from pathlib import Path
 from datetime import datetime
 import streamlit as st
-from PIL import Image
-from google import genai
 from google.genai import types
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import the query expander
 from scripts.query_expander import expand_query_with_cache
+from scripts.image_cache import ImageAnalysisCache
+from scripts.folder_manifest import FolderManifest
+from scripts.thumbnails import ThumbnailCache, DEFAULT_LONG_EDGE, DEFAULT_QUALITY
+from scripts.batch_classifier import classify_images, classify_queries
+from scripts.client_pool import get_client
+from scripts.key_scheduler import KeyScheduler, is_rate_limit_error, retry_delay, DEFAULT_RPM, DEFAULT_RPD
+from scripts.search_job import SearchJob
+from scripts.ocr_index import OCRTextIndex
+from scripts.perceptual_hash import dedupe_entries, DEFAULT_THRESHOLD
+from scripts.media_loader import HEIC_BACKEND
+from scripts.image_quality import (
+    QualityFilter, score_folder, describe_rejections,
+    DEFAULT_MIN_SHARPNESS, DEFAULT_MAX_CLIPPED, DEFAULT_MIN_SHORT_EDGE
+)
+
+# Optional: local CLIP pre-filter (needs numpy + sentence-transformers)
+# sentence-transformers is only imported when the model is first needed, so check for it up front
+try:
+    from scripts.embedding_index import EmbeddingIndex
+    EMBEDDINGS_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+except ImportError:
+    EMBEDDINGS_AVAILABLE = False
 
 # -------------------------
 # CONFIG  /Users/jay/Desktop/miss-you-india /Users/jay/Downloads/fall-2025 
 # -------------------------
 MODEL_NAME = "gemini-2.0-flash-exp"
-MAX_RETRIES_PER_KEY = 2  # Retries before switching API key
-ROTATION_INTERVAL = 10  # Rotate key every N images as preventive measure
+GRID_THUMBNAIL_EDGE = 512  # Long edge of the thumbnails shown in the result grid
+JOB_POLL_SECONDS = 1.0  # How often the page refreshes while a search runs in the background
+GRID_PAGE_SIZES = [25, 50, 100, 200]  # Result grid page sizes; 50 is the default
 
-# Optional: HEIC support 
-try: 
-    from pillow_heif import register_heif_opener
-    register_heif_opener()
-except ImportError:
+# Partial reruns for the result grid (st.fragment needs Streamlit 1.37+)
+run_as_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+# HEIC decoders are registered once, by media_loader
+if HEIC_BACKEND is None:
     st.warning("Install pillow-heif to support .HEIC images.")
 
 # -------------------------
@@ -93,111 +116,91 @@ st.markdown("""
 # -------------------------
 # API KEY MANAGEMENT
 # -------------------------
-class APIKeyManager:
-    def __init__(self):
-        self.creds_file = Path(__file__).parent / "creds.json"
-        self.all_keys = []
-        self.current_key_index = 0
-        self.used_keys = set()
-        self.load_keys()
-    
-    def load_keys(self):
-        """Load all API keys from creds.json"""
-        if not self.creds_file.exists():
-            raise FileNotFoundError("creds.json not found in script directory.")
-        
-        try:
-            with open(self.creds_file, 'r') as f:
-                creds = json.load(f)
-            self.all_keys = creds.get("api_keys", [])
-            if not self.all_keys:
-                raise ValueError("No API keys found in creds.json")
-            random.shuffle(self.all_keys)  # Randomize order
-        except Exception as e:
-            raise Exception(f"Error reading creds.json: {e}")
+def load_api_keys():
+    """Load all API keys from creds.json (in random order)"""
+    creds_file = Path(__file__).parent / "creds.json"
+    if not creds_file.exists():
+        raise FileNotFoundError("creds.json not found in script directory.")
     
-    def get_random_key(self):
-        """Get a random API key that hasn't been used recently"""
-        if len(self.used_keys) >= len(self.all_keys):
-            # All keys have been used, reset
-            self.used_keys.clear()
-        
-        available_keys = [k for k in self.all_keys if k not in self.used_keys]
-        if not available_keys:
-            available_keys = self.all_keys
-        
-        key = random.choice(available_keys)
-        self.used_keys.add(key)
-        return key
+    try:
+        with open(creds_file, 'r') as f:
+            creds = json.load(f)
+    except Exception as e:
+        raise Exception(f"Error reading creds.json: {e}")
     
-    def get_next_key(self):
-        """Get next API key in rotation"""
-        self.current_key_index = (self.current_key_index + 1) % len(self.all_keys)
-        return self.all_keys[self.current_key_index]
-    
-    def get_key_count(self):
-        """Return total number of available keys"""
-        return len(self.all_keys)
+    api_keys = creds.get("api_keys", [])
+    if not api_keys:
+        raise ValueError("No API keys found in creds.json")
+    random.shuffle(api_keys)  # Randomize order
+    return api_keys
+
+@st.cache_resource
+def get_key_scheduler():
+    """One scheduler per server process, so all sessions share the keys' quota"""
+    return KeyScheduler(load_api_keys())
 
 # -------------------------
 # HELPER FUNCTIONS
 # -------------------------
-def get_mime_type(image_path):
-    ext = Path(image_path).suffix.lower()
-    return {
-        '.jpg':'image/jpeg', '.jpeg':'image/jpeg', '.png':'image/png', 
-        '.webp':'image/webp', '.gif':'image/gif', '.bmp':'image/bmp', 
-        '.heic':'image/heic'
-    }.get(ext, 'image/jpeg')
-
-def is_image_file(filename):
-    return Path(filename).suffix.lower() in {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.heic'}
-
-def is_rate_limit_error(error_msg):
-    """Check if error is due to rate limiting"""
-    rate_limit_indicators = [
-        'rate limit',
-        'quota',
-        'too many requests',
-        '429',
-        'resource exhausted',
-        'limit exceeded'
-    ]
-    error_str = str(error_msg).lower()
-    return any(indicator in error_str for indicator in rate_limit_indicators)
-
-def analyze_image_with_retry(image_path, api_key_manager, expanded_query, status_placeholder=None):
+@st.cache_resource
+def get_thumbnail_cache():
+    """One thumbnail cache per server process, shared by all sessions"""
+    return ThumbnailCache()
+
+def acquire_key(scheduler, status_placeholder=None):
+    """Take a key with quota left, waiting (with a notice) if every key is exhausted"""
+    api_key = scheduler.try_acquire()
+    if api_key is None:
+        if status_placeholder:
+            status_placeholder.warning(f"⏳ All API keys are at their rate limit, waiting "
+                                       f"{scheduler.wait_time():.0f}s for quota...")
+        api_key = scheduler.acquire()
+    return api_key
+
+def call_with_key_rotation(scheduler, request_fn, status_placeholder=None, manual_key=None):
     """
-    Analyze image with automatic API key rotation on rate limit errors.
-    Returns: (is_match, explanation, api_key_used)
+    Run request_fn(client) on the key with the most quota headroom, moving to
+    another key if the request is rejected with a rate limit error.
+    With manual_key, a single attempt is made with that key.
+    Returns: (result, api_key_used, error_message); api_key_used is None on failure
     """
-    max_attempts = min(3, api_key_manager.get_key_count())  # Try up to 3 different keys
+    max_attempts = 1 if manual_key else 3
     
     for attempt in range(max_attempts):
+        api_key = manual_key or acquire_key(scheduler, status_placeholder)
         try:
-            # Get a fresh API key for this attempt
-            if attempt == 0:
-                api_key = api_key_manager.get_random_key()
-            else:
-                api_key = api_key_manager.get_next_key()
-                if status_placeholder:
-                    status_placeholder.warning(f"⚠️ Switching to different API key (attempt {attempt + 1}/{max_attempts})")
-                time.sleep(1)  # Brief pause before retry
-            
-            client = genai.Client(api_key=api_key)
+            client = get_client(api_key)
+            result = request_fn(client)
+            if not manual_key:
+                scheduler.report_success(api_key)
+            return result, api_key, None
+        
+        except Exception as e:
+            error_msg = str(e)
             
-            # Analyze the image
-            from io import BytesIO
-            with Image.open(image_path) as img:
-                img_rgb = img.convert("RGB")
-                buf = BytesIO()
-                img_rgb.save(buf, format='JPEG')
-                image_bytes = buf.getvalue()
-
-            mime_type = get_mime_type(image_path)
-            image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+            if is_rate_limit_error(e):
+                if not manual_key:
+                    # Bench this key; the next acquire picks another or waits out the cooldown
+                    scheduler.report_rate_limited(api_key, retry_delay(e))
+                if attempt < max_attempts - 1:
+                    if status_placeholder:
+                        status_placeholder.warning(f"🔄 Rate limit hit, switching API key "
+                                                   f"(attempt {attempt + 2}/{max_attempts})...")
+                    continue
+                return None, None, f"Rate limit error after {max_attempts} attempts: {error_msg}"
+            else:
+                # Non-rate-limit error, return immediately
+                return None, None, f"Error: {error_msg}"
+    
+    return None, None, "Failed after all retry attempts"
 
-            prompt = f"""Analyze this image carefully and determine if it matches the following description:
+def analyze_image_with_retry(image_part, scheduler, expanded_query, status_placeholder=None, manual_key=None):
+    """
+    Analyze image with automatic API key rotation on rate limit errors.
+    image_part is built once and reused across retries.
+    Returns: (is_match, explanation, api_key_used)
+    """
+    prompt = f"""Analyze this image carefully and determine if it matches the following description:
 
 "{expanded_query}"
 
@@ -206,31 +209,258 @@ Important instructions:
 - Ignore irrelevant background details
 - Consider all the criteria mentioned in the description
 - Answer ONLY "Yes" or "No", followed by a brief explanation of why it matches or doesn't match"""
-            
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=[prompt, image_part]
-            )
-            text = response.text.strip()
-            is_match = text.lower().startswith("yes")
-            
-            return is_match, text, api_key
+    
+    def request(client):
+        response = client.models.generate_content(
+            model=MODEL_NAME,
+            contents=[prompt, image_part]
+        )
+        return response.text.strip()
+    
+    text, api_key, error = call_with_key_rotation(scheduler, request, status_placeholder, manual_key)
+    if error:
+        return False, error, None
+    return text.lower().startswith("yes"), text, api_key
+
+def analyze_queries_with_retry(image_part, scheduler, expanded_queries, status_placeholder=None, manual_key=None):
+    """
+    Evaluate one image against several expanded queries in a single request,
+    retrying any query whose verdict could not be parsed on its own.
+    Returns: {query_index: (is_match, explanation, api_key_used)}
+    """
+    verdicts, api_key, _ = call_with_key_rotation(
+        scheduler,
+        lambda client: classify_queries(client, expanded_queries, image_part, MODEL_NAME),
+        status_placeholder,
+        manual_key
+    )
+    results = {i: (is_match, text, api_key) for i, (is_match, text) in (verdicts or {}).items()}
+    
+    for i, expanded_query in enumerate(expanded_queries):
+        if i not in results:
+            results[i] = analyze_image_with_retry(image_part, scheduler, expanded_query, status_placeholder, manual_key)
+    return results
+
+@st.cache_resource
+def get_ocr_index():
+    """Full-text index of the text ocr-image.py / ocr.py found in images"""
+    return OCRTextIndex()
+
+@st.cache_resource
+def get_image_cache():
+    """One analysis cache per server process, shared by all sessions"""
+    return ImageAnalysisCache()
+
+def load_folder_images(input_folder):
+    """
+    List the folder's images via the manifest (only new or changed files are
+    read and hashed) and evict cached data for deleted or replaced files.
+    Returns: (image_paths, {image_path: content_hash})
+    """
+    manifest = FolderManifest(input_folder)
+    with st.spinner("📁 Scanning folder for new or changed images..."):
+        diff = manifest.refresh()
+    entries = manifest.entries()
+    if not entries:
+        st.warning("No images found in folder.")
+        st.stop()
+    
+    # Forget results, thumbnails and embeddings for files that were deleted or replaced
+    stale_hashes = manifest.stale_hashes(diff)
+    get_image_cache().evict_images(stale_hashes)
+    get_thumbnail_cache().evict(stale_hashes)
+    if EMBEDDINGS_AVAILABLE and diff.removed:
+        EmbeddingIndex(input_folder).remove([e.path for e in diff.removed])
+    
+    return [entry.path for entry in entries], {entry.path: entry.content_hash for entry in entries}
+
+def skip_low_quality(input_folder, images, quality_filter):
+    """
+    Drop blurry, badly exposed and tiny images before they reach Gemini.
+    Scores are computed once per file and kept in the folder manifest.
+    Returns: (usable images, {reason: [rejected entries]})
+    """
+    manifest = FolderManifest(input_folder)
+    wanted = set(images)
+    entries = [entry for entry in manifest.entries() if entry.path in wanted]
+    progress = st.progress(0, text="🔍 Checking image sharpness and exposure...")
+    score_folder(
+        manifest, entries,
+        progress_callback=lambda done, total: progress.progress(
+            done / total, text=f"🔍 Scoring new images for sharpness and exposure ({done}/{total})")
+    )
+    progress.empty()
+    usable, rejected = quality_filter.split(entries)
+    return [entry.path for entry in usable], rejected
+
+def skip_near_duplicates(input_folder, images, threshold):
+    """
+    Keep one image per cluster of near-duplicates (burst shots, re-saves).
+    Returns: (images to analyze, {representative: [duplicates]})
+    """
+    wanted = set(images)
+    entries = [entry for entry in FolderManifest(input_folder).entries() if entry.path in wanted]
+    progress = st.progress(0, text="🧬 Hashing images to find near-duplicates...")
+    representatives, duplicates = dedupe_entries(
+        entries, threshold=threshold,
+        progress_callback=lambda done, total: progress.progress(
+            done / total, text=f"🧬 Hashing new images for near-duplicates ({done}/{total})")
+    )
+    progress.empty()
+    return [entry.path for entry in representatives], duplicates
+
+def make_search_worker(expanded_queries, content_hashes, image_cache, thumbnails, scheduler,
+                       manual_key=None, long_edge=None, quality=None):
+    """
+    Build the SearchJob batch function. Runs in the job's worker thread, so it
+    only uses objects passed in here (no st.* calls).
+    Each completed image maps to {query_index: (is_match, explanation)}; every
+    answer is written to the analysis cache as soon as it arrives, which also
+    checkpoints the job for later sessions. Errors are not cached.
+    """
+    def image_part(img_path):
+        image_bytes = thumbnails.get_bytes(img_path, content_hashes[img_path], long_edge, quality)
+        return types.Part.from_bytes(data=image_bytes, mime_type='image/jpeg')
+    
+    def process_batch(batch, job):
+        verdicts = {img_path: {} for img_path in batch}
+        for img_path in batch:
+            for q, expanded_query in enumerate(expanded_queries):
+                cached = image_cache.get(img_path, expanded_query, content_hashes[img_path])
+                if cached:
+                    verdicts[img_path][q] = cached
         
-        except Exception as e:
-            error_msg = str(e)
-            
-            if is_rate_limit_error(error_msg):
-                if attempt < max_attempts - 1:
-                    if status_placeholder:
-                        status_placeholder.warning(f"🔄 Rate limit hit, switching API key...")
+        # Single query: pack the uncached images of the batch into one request
+        pending = [img_path for img_path in batch if not verdicts[img_path]]
+        if len(expanded_queries) == 1 and len(pending) > 1:
+            batch_key = manual_key or acquire_key(scheduler, job)
+            try:
+                answers = classify_images(
+                    get_client(batch_key), expanded_queries[0], [image_part(p) for p in pending], MODEL_NAME
+                )
+                if not manual_key:
+                    scheduler.report_success(batch_key)
+            except Exception as e:
+                if not manual_key and is_rate_limit_error(e):
+                    scheduler.report_rate_limited(batch_key, retry_delay(e))
+                # Anything not answered here is retried image-by-image below
+                answers = {}
+            for i, (is_match, text) in answers.items():
+                verdicts[pending[i]][0] = (is_match, text)
+                image_cache.set(pending[i], expanded_queries[0], is_match, text, content_hashes[pending[i]])
+        
+        done, failed = {}, {}
+        for img_path in batch:
+            missing = [q for q in range(len(expanded_queries)) if q not in verdicts[img_path]]
+            if missing:
+                job.text(f"Analyzing: {Path(img_path).name}")
+                try:
+                    part = image_part(img_path)
+                    if len(missing) == 1:
+                        results = {0: analyze_image_with_retry(
+                            part, scheduler, expanded_queries[missing[0]], job, manual_key
+                        )}
+                    else:
+                        results = analyze_queries_with_retry(
+                            part, scheduler, [expanded_queries[q] for q in missing], job, manual_key
+                        )
+                except Exception as e:
+                    failed[img_path] = f"Error: could not read image: {e}"
                     continue
-                else:
-                    return False, f"Rate limit error after trying {max_attempts} keys: {error_msg}", None
-            else:
-                # Non-rate-limit error, return immediately
-                return False, f"Error: {error_msg}", None
+                
+                for j, q in enumerate(missing):
+                    is_match, text, key_used = results[j]
+                    # key_used is None when every attempt failed
+                    if key_used:
+                        verdicts[img_path][q] = (is_match, text)
+                        image_cache.set(img_path, expanded_queries[q], is_match, text, content_hashes[img_path])
+                    else:
+                        failed[img_path] = text
+            
+            if img_path not in failed:
+                done[img_path] = verdicts[img_path]
+        return done, failed
+    
+    return process_batch
+
+def start_search_job(queries, expanded_queries, images, content_hashes, notice, batch_size=1, duplicates=None):
+    """
+    Replace any running search with a new background job over images.
+    duplicates maps analyzed images to near-duplicates that share their verdict.
+    """
+    if st.session_state.search_job:
+        st.session_state.search_job.cancel()
+    
+    worker = make_search_worker(
+        expanded_queries, content_hashes, get_image_cache(), get_thumbnail_cache(), get_key_scheduler(),
+        manual_key, upload_long_edge, upload_quality
+    )
+    # Multi-query requests already pack several questions per image
+    job = SearchJob(
+        images, worker, batch_size=batch_size if len(queries) == 1 else 1,
+        context={"queries": queries, "expanded": expanded_queries, "notice": notice,
+                 "duplicates": duplicates or {}}
+    )
+    st.session_state.search_job = job
+    st.session_state.search_query = queries[0]
+    st.session_state.content_hashes = content_hashes
+    st.session_state.selected_images = []
+    st.session_state.grid_page = 0
+    st.session_state.grid_version += 1
+    st.session_state.text_search = None
+    job.start()
+
+def run_text_search(query, images, content_hashes):
+    """
+    Answer a query from the local OCR index instead of the model. There is
+    nothing to wait for, so the results replace the current ones at once.
+    """
+    if st.session_state.search_job:
+        st.session_state.search_job.cancel()
+        st.session_state.search_job = None
+    
+    paths_by_hash = {}
+    for img_path in images:
+        paths_by_hash.setdefault(content_hashes[img_path], []).append(img_path)
     
-    return False, "Failed after all retry attempts", None
+    index = get_ocr_index()
+    start = time.perf_counter()
+    hits = index.search(query, limit=len(paths_by_hash), content_hashes=paths_by_hash, highlight=("**", "**"))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    # Identical copies of an image share a hash (and its text)
+    detected = [(img_path, hit["snippet"]) for hit in hits for img_path in paths_by_hash[hit["content_hash"]]]
+    
+    st.session_state.search_query = query
+    st.session_state.expanded_query = ""
+    st.session_state.detected_images = detected
+    st.session_state.multi_results = {query: ("", detected)}
+    st.session_state.content_hashes = content_hashes
+    st.session_state.selected_images = []
+    st.session_state.grid_page = 0
+    st.session_state.grid_version += 1
+    st.session_state.text_search = {
+        "matches": len(detected),
+        "elapsed_ms": elapsed_ms,
+        "indexed": len(index.indexed_hashes(paths_by_hash)),
+        "unique": len(paths_by_hash),
+    }
+
+def sync_search_results(job, snapshot):
+    """Rebuild the per-query match lists from the job's completed images"""
+    results = snapshot["results"]
+    duplicates = job.context["duplicates"]
+    st.session_state.multi_results = {
+        query: (expanded_query, [
+            (path, verdicts[q][1])
+            for img_path, verdicts in results.items() if verdicts[q][0]
+            for path in [img_path] + duplicates.get(img_path, [])
+        ])
+        for q, (query, expanded_query) in enumerate(zip(job.context["queries"], job.context["expanded"]))
+    }
+    if st.session_state.search_query not in st.session_state.multi_results:
+        st.session_state.search_query = job.context["queries"][0]
+    st.session_state.expanded_query, st.session_state.detected_images = \
+        st.session_state.multi_results[st.session_state.search_query]
 
 # -------------------------
 # STREAMLIT UI
@@ -241,28 +471,91 @@ st.write("""
 Search images using natural language. Your query will be automatically expanded into a detailed description for better accuracy.
 """)
 
-# Initialize API Key Manager
+# Initialize the API key scheduler
 try:
-    if 'api_key_manager' not in st.session_state:
-        st.session_state.api_key_manager = APIKeyManager()
-    api_key_manager = st.session_state.api_key_manager
+    scheduler = get_key_scheduler()
 except Exception as e:
     st.error(f"Failed to initialize API keys: {e}")
     st.stop()
 
+image_cache = get_image_cache()
+thumbnail_cache = get_thumbnail_cache()
+
 # Sidebar: input/output folders
 input_folder = st.sidebar.text_input("Input Folder Path", value="./images")
 output_base = st.sidebar.text_input("Output Base Folder", value="./selected_images")
 
 st.sidebar.markdown("### API Key Info")
-st.sidebar.info(f"🔑 {api_key_manager.get_key_count()} API keys loaded from creds.json")
-st.sidebar.caption("Keys will automatically rotate to avoid rate limits")
+st.sidebar.info(f"🔑 {scheduler.get_key_count()} API keys loaded from creds.json")
+key_rpm = st.sidebar.number_input("Requests per minute per key", min_value=1, value=DEFAULT_RPM)
+key_rpd = st.sidebar.number_input("Requests per day per key", min_value=1, value=DEFAULT_RPD)
+scheduler.set_limits(key_rpm, key_rpd)
+st.sidebar.caption("Each request uses the key with the most quota left; "
+                   "keys that hit a rate limit are rested before reuse")
+with st.sidebar.expander("Key usage"):
+    st.dataframe(scheduler.get_stats(), use_container_width=True)
 
 # Manual API key override (optional)
 manual_key = st.sidebar.text_input("Override with manual API key (optional)", type="password")
 if manual_key:
     st.sidebar.warning("⚠️ Using manual key - auto-rotation disabled")
 
+st.sidebar.markdown("### Upload Settings")
+upload_long_edge = st.sidebar.number_input(
+    "Max image size sent to AI (px)", min_value=256, max_value=4096, value=DEFAULT_LONG_EDGE, step=128,
+    help="Images are downscaled to this long edge before upload; thumbnails are cached on disk"
+)
+upload_quality = st.sidebar.slider("Upload JPEG quality", min_value=50, max_value=95, value=DEFAULT_QUALITY)
+batch_size = st.sidebar.number_input(
+    "Images per AI request", min_value=1, max_value=16, value=1,
+    help="Pack several images into one request; unparsed answers are retried one image at a time"
+)
+
+st.sidebar.markdown("### Local Pre-filter")
+if EMBEDDINGS_AVAILABLE:
+    use_prefilter = st.sidebar.checkbox(
+        "Pre-filter with local embeddings", value=True,
+        help="Index the folder once with a local CLIP model and only send the closest matches to Gemini"
+    )
+    prefilter_top_k = st.sidebar.number_input(
+        "Candidates sent to Gemini (top-K)", min_value=10, max_value=5000, value=200, step=10
+    )
+else:
+    use_prefilter = False
+    st.sidebar.caption("Install numpy and sentence-transformers to enable the local pre-filter")
+
+st.sidebar.markdown("### Near-duplicates")
+skip_duplicates = st.sidebar.checkbox(
+    "Analyze one image per burst", value=True,
+    help="Near-identical images (burst shots, re-saves, resizes) are sent to Gemini once; "
+         "the rest of the cluster shares that verdict"
+)
+duplicate_threshold = st.sidebar.slider(
+    "Near-duplicate sensitivity (bits)", min_value=0, max_value=16, value=DEFAULT_THRESHOLD,
+    disabled=not skip_duplicates,
+    help="Max perceptual-hash difference; 0 only merges identical files"
+)
+
+st.sidebar.markdown("### Quality Filter")
+use_quality_filter = st.sidebar.checkbox(
+    "Skip blurry and badly exposed shots", value=True,
+    help="Images are scored locally (sharpness, clipped shadows/highlights, size) "
+         "and unusable ones are never sent to Gemini"
+)
+min_sharpness = st.sidebar.slider(
+    "Minimum sharpness", min_value=0.0, max_value=200.0, value=DEFAULT_MIN_SHARPNESS, step=5.0,
+    disabled=not use_quality_filter,
+    help="Laplacian variance at 512px; 0 turns the blur check off"
+)
+max_clipped = st.sidebar.slider(
+    "Max. black / blown-out share", min_value=0.1, max_value=1.0, value=DEFAULT_MAX_CLIPPED, step=0.05,
+    disabled=not use_quality_filter
+)
+min_short_edge = st.sidebar.number_input(
+    "Minimum short edge (px)", min_value=0, value=DEFAULT_MIN_SHORT_EDGE, step=32,
+    disabled=not use_quality_filter
+)
+
 # Initialize session state
 if "detected_images" not in st.session_state:
     st.session_state.detected_images = []
@@ -272,134 +565,264 @@ if "search_query" not in st.session_state:
     st.session_state.search_query = ""
 if "expanded_query" not in st.session_state:
     st.session_state.expanded_query = ""
+if "content_hashes" not in st.session_state:
+    st.session_state.content_hashes = {}
+if "multi_results" not in st.session_state:
+    st.session_state.multi_results = {}  # query -> (expanded_query, detected_images)
+if "search_job" not in st.session_state:
+    st.session_state.search_job = None  # SearchJob, kept across reruns
+if "grid_page" not in st.session_state:
+    st.session_state.grid_page = 0
+if "grid_page_size" not in st.session_state:
+    st.session_state.grid_page_size = GRID_PAGE_SIZES[1]
+if "grid_version" not in st.session_state:
+    st.session_state.grid_version = 0  # Bumped to reset the selection checkboxes
+if "text_search" not in st.session_state:
+    st.session_state.text_search = None  # Summary of the last OCR text search
 
 # -------------------------
 # Search Query
 # -------------------------
 st.markdown("### 🔍 Enter Your Search Query")
-search_query = st.text_input(
-    "Short phrase (e.g., 'rolled sleeves', 'white tshirt', 'ocean with boat'):",
-    placeholder="Type your search query here..."
+search_mode = st.radio(
+    "Search mode", ["Single query", "Multiple queries (one pass)", "Text in image (OCR)"], horizontal=True,
+    help="Multiple queries are all checked in one AI call per image, so N queries cost one pass over the folder. "
+         "Text in image searches the text ocr-image.py found, instantly and without AI calls"
 )
+multi_query_mode = search_mode == "Multiple queries (one pass)"
+text_search_mode = search_mode == "Text in image (OCR)"
+
+if text_search_mode:
+    search_query = st.text_input(
+        "Words or \"exact phrase\" shown in the image (e.g., 'launch day', '\"order confirmed\"'):",
+        placeholder="Type the text to find..."
+    )
+elif multi_query_mode:
+    queries_text = st.text_area(
+        "One short phrase per line:",
+        placeholder="white tshirt\nrolled sleeves\nocean with boat"
+    )
+    # Keep order, drop blanks and duplicates
+    queries = list(dict.fromkeys(q.strip() for q in queries_text.splitlines() if q.strip()))
+    search_query = queries[0] if queries else ""
+else:
+    search_query = st.text_input(
+        "Short phrase (e.g., 'rolled sleeves', 'white tshirt', 'ocean with boat'):",
+        placeholder="Type your search query here..."
+    )
 
 col1, col2 = st.columns([3, 1])
 with col1:
     run_search = st.button("🚀 Run Search", type="primary", use_container_width=True)
 with col2:
-    preview_expansion = st.button("👁️ Preview Expansion", use_container_width=True)
+    preview_expansion = st.button("👁️ Preview Expansion", use_container_width=True, disabled=text_search_mode)
 
 # Preview expansion without running search
 if preview_expansion and search_query:
     with st.spinner("Expanding your query..."):
-        preview_key = manual_key if manual_key else api_key_manager.get_random_key()
+        preview_key = manual_key if manual_key else scheduler.acquire()
         expanded = expand_query_with_cache(search_query, preview_key)
         st.markdown("#### 📝 Expanded Query:")
         st.markdown(f'<div class="expanded-query">{expanded}</div>', unsafe_allow_html=True)
 
-# Run the actual search
-if run_search and search_query:
+# Run several queries in a single pass over the folder
+if run_search and multi_query_mode and queries:
     if not os.path.exists(input_folder):
         st.error(f"Input folder '{input_folder}' not found")
         st.stop()
     
-    all_images = [f for f in Path(input_folder).iterdir() if f.is_file() and is_image_file(f.name)]
-    if not all_images:
-        st.warning("No images found in folder.")
+    all_images, content_hashes = load_folder_images(input_folder)
+    
+    with st.spinner(f"🔄 Expanding {len(queries)} queries..."):
+        expand_key = manual_key if manual_key else scheduler.acquire()
+        expanded = [expand_query_with_cache(q, expand_key) for q in queries]
+    
+    notice = f"Found {len(all_images)} images. Checking {len(queries)} queries per image in one AI call..."
+    if use_quality_filter:
+        images, rejected = skip_low_quality(
+            input_folder, all_images, QualityFilter(min_sharpness, max_clipped, int(min_short_edge))
+        )
+        if rejected:
+            notice += f" Skipping {len(all_images) - len(images)} low-quality shots ({describe_rejections(rejected)})."
+        all_images = images
+    duplicates = {}
+    if skip_duplicates:
+        images, duplicates = skip_near_duplicates(input_folder, all_images, duplicate_threshold)
+        if duplicates:
+            notice += f" {len(all_images) - len(images)} near-duplicates share their cluster's verdict."
+        all_images = images
+    
+    start_search_job(queries, expanded, all_images, content_hashes, notice, duplicates=duplicates)
+
+# Text search: answered from the local OCR index, no AI calls
+if run_search and search_query and text_search_mode:
+    if not os.path.exists(input_folder):
+        st.error(f"Input folder '{input_folder}' not found")
         st.stop()
     
+    all_images, content_hashes = load_folder_images(input_folder)
+    run_text_search(search_query, all_images, content_hashes)
+
+# Run the actual search
+if run_search and search_query and search_mode == "Single query":
+    if not os.path.exists(input_folder):
+        st.error(f"Input folder '{input_folder}' not found")
+        st.stop()
+    
+    all_images, content_hashes = load_folder_images(input_folder)
+    folder_images = all_images
+    
     # Expand the query first
     with st.spinner("🔄 Expanding your query for better search accuracy..."):
-        expand_key = manual_key if manual_key else api_key_manager.get_random_key()
+        expand_key = manual_key if manual_key else scheduler.acquire()
         expanded_query = expand_query_with_cache(search_query, expand_key)
-        st.session_state.expanded_query = expanded_query
     
-    # Show the expanded query
-    st.markdown("#### 📝 Search Using Expanded Description:")
-    st.markdown(f'<div class="expanded-query">{expanded_query}</div>', unsafe_allow_html=True)
+    notice = f"Found {len(all_images)} images. Running AI analysis with automatic key rotation..."
+    if use_quality_filter:
+        images, rejected = skip_low_quality(
+            input_folder, all_images, QualityFilter(min_sharpness, max_clipped, int(min_short_edge))
+        )
+        if rejected:
+            notice += f" Skipping {len(all_images) - len(images)} low-quality shots ({describe_rejections(rejected)})."
+        all_images = images
+    duplicates = {}
+    if skip_duplicates:
+        images, duplicates = skip_near_duplicates(input_folder, all_images, duplicate_threshold)
+        if duplicates:
+            notice += f" {len(all_images) - len(images)} near-duplicates share their cluster's verdict."
+        all_images = images
+    if use_prefilter and len(all_images) > prefilter_top_k:
+        index = EmbeddingIndex(input_folder)
+        index_progress = st.progress(0, text="📦 Updating local embedding index...")
+        # The index covers the whole folder (build() drops paths it isn't given);
+        # the quality/duplicate filters only narrow the search below
+        index.build(
+            folder_images,
+            lambda done, total: index_progress.progress(done / total, text=f"📦 Embedding new images ({done}/{total})")
+        )
+        index_progress.empty()
+        # CLIP's text encoder takes at most 77 tokens, so rank with the short query
+        candidates = index.search(search_query, top_k=int(prefilter_top_k), restrict_to=all_images)
+        notice = (f"🎯 Pre-filter kept the {len(candidates)} closest of {len(all_images)} images "
+                  f"for AI verification")
+        all_images = [path for path, _ in candidates]
     
-    st.info(f"Found {len(all_images)} images. Running AI analysis with automatic key rotation...")
+    start_search_job([search_query], [expanded_query], all_images, content_hashes, notice, batch_size, duplicates)
 
-    detected_images = []
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    key_rotation_info = st.empty()
-
-    images_processed_with_current_key = 0
+# -------------------------
+# Search progress (the job keeps running across reruns)
+# -------------------------
+search_job = st.session_state.search_job
+if search_job:
+    snapshot = search_job.snapshot()
+    sync_search_results(search_job, snapshot)
     
-    for i, img_path in enumerate(all_images):
-        # Rotate key preventively every N images
-        if not manual_key and images_processed_with_current_key >= ROTATION_INTERVAL:
-            key_rotation_info.markdown(
-                f'<div class="api-key-info">🔄 Preventively rotating API key after {ROTATION_INTERVAL} images</div>', 
-                unsafe_allow_html=True
-            )
-            images_processed_with_current_key = 0
-            time.sleep(0.5)
-            key_rotation_info.empty()
-        
-        status_text.text(f"Analyzing: {img_path.name} ({i+1}/{len(all_images)})")
-        
-        if manual_key:
-            # Use manual key without rotation
-            client = genai.Client(api_key=manual_key)
-            from io import BytesIO
-            with Image.open(img_path) as img:
-                img_rgb = img.convert("RGB")
-                buf = BytesIO()
-                img_rgb.save(buf, format='JPEG')
-                image_bytes = buf.getvalue()
-            mime_type = get_mime_type(img_path)
-            image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
-            prompt = f"""Analyze this image carefully and determine if it matches the following description:
-"{expanded_query}"
-Important instructions:
-- Focus on the main subject of the image
-- Ignore irrelevant background details
-- Consider all the criteria mentioned in the description
-- Answer ONLY "Yes" or "No", followed by a brief explanation of why it matches or doesn't match"""
-            try:
-                response = client.models.generate_content(model=MODEL_NAME, contents=[prompt, image_part])
-                text = response.text.strip()
-                is_match = text.lower().startswith("yes")
-            except Exception as e:
-                is_match, text = False, str(e)
-        else:
-            # Use automatic key rotation
-            is_match, text, key_used = analyze_image_with_retry(
-                img_path, api_key_manager, expanded_query, status_text
-            )
-            images_processed_with_current_key += 1
-        
-        if is_match:
-            detected_images.append((img_path, text))
+    queries_run = search_job.context["queries"]
+    expanded_run = search_job.context["expanded"]
+    if len(queries_run) == 1:
+        st.markdown("#### 📝 Search Using Expanded Description:")
+        st.markdown(f'<div class="expanded-query">{expanded_run[0]}</div>', unsafe_allow_html=True)
+    else:
+        with st.expander("📝 Expanded descriptions", expanded=False):
+            for query, expanded_query in zip(queries_run, expanded_run):
+                st.markdown(f"**{query}**")
+                st.markdown(f'<div class="expanded-query">{expanded_query}</div>', unsafe_allow_html=True)
+    st.info(search_job.context["notice"])
+    
+    processed, total = snapshot["processed"], snapshot["total"]
+    st.progress(processed / total if total else 1.0, text=f"Analyzed {processed}/{total} images")
+    matches_found = {query: len(found) for query, (_, found) in st.session_state.multi_results.items()}
+    
+    if snapshot["status"] == "running":
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            if snapshot["message"]:
+                st.warning(snapshot["message"])
+            st.caption(f"🔄 {snapshot['current'] or 'Starting...'} — matches so far: "
+                       f"{sum(matches_found.values())}, shown below as they arrive")
+        with col2:
+            if st.button("⏹️ Cancel Search", use_container_width=True):
+                search_job.cancel()
+                st.rerun()
+    else:
+        if snapshot["status"] == "done":
+            if len(matches_found) > 1:
+                summary = ", ".join(f"{query}: {count}" for query, count in matches_found.items())
+                st.success(f"✅ Analysis complete! Matches per query — {summary}")
+            else:
+                st.success(f"✅ Analysis complete! {sum(matches_found.values())} images matched your query.")
+            cache_stats = image_cache.get_stats()
+            st.caption(f"📦 Cache: {cache_stats['cache_hits']} hits, {cache_stats['hit_rate']} hit rate, "
+                       f"{cache_stats['total_cached_entries']} entries ({cache_stats['cache_file_size']})")
+        elif snapshot["status"] == "cancelled":
+            st.warning(f"⏸️ Search cancelled after {processed}/{total} images. Completed results are kept.")
+        elif snapshot["status"] == "failed":
+            st.error(f"Search stopped: {snapshot['error']}")
         
-        progress_bar.progress((i + 1) / len(all_images))
+        if snapshot["failed"]:
+            st.warning(f"⚠️ {len(snapshot['failed'])} images could not be analyzed "
+                       f"(e.g. {next(iter(snapshot['failed'].values()))}). Resume to retry them.")
+        if processed < total or snapshot["failed"]:
+            if st.button("▶️ Resume Search", use_container_width=True):
+                search_job.resume()
+                st.rerun()
 
-    status_text.empty()
-    key_rotation_info.empty()
-    st.success(f"✅ Analysis complete! {len(detected_images)} images matched your query.")
-    
-    # Store results in session state
-    st.session_state.detected_images = detected_images
-    st.session_state.selected_images = []  # Reset selection
-    st.session_state.search_query = search_query
+text_search = st.session_state.text_search
+if text_search and not search_job:
+    st.success(f"🔤 {text_search['matches']} images contain that text "
+               f"(searched the OCR index in {text_search['elapsed_ms']:.0f} ms, no AI calls)")
+    if text_search["indexed"] < text_search["unique"]:
+        st.caption(f"Only {text_search['indexed']} of {text_search['unique']} images in this folder have been OCR'd. "
+                   f"Run `python scripts/ocr-image.py \"{input_folder}\"` to index the rest.")
 
 # -------------------------
 # Display images with clickable selection
 # -------------------------
-if st.session_state.detected_images:
+if len(st.session_state.multi_results) > 1:
     st.markdown("---")
-    
-    # Show the expanded query used for this search
-    if st.session_state.expanded_query:
-        with st.expander("📋 View Expanded Query Used", expanded=False):
-            st.markdown(f'<div class="expanded-query">{st.session_state.expanded_query}</div>', unsafe_allow_html=True)
+    result_queries = list(st.session_state.multi_results)
+    shown_query = st.selectbox(
+        "Show matches for",
+        result_queries,
+        index=result_queries.index(st.session_state.search_query),
+        format_func=lambda q: f"{q} ({len(st.session_state.multi_results[q][1])} matches)"
+    )
+    if shown_query != st.session_state.search_query:
+        st.session_state.search_query = shown_query
+        st.session_state.expanded_query, st.session_state.detected_images = st.session_state.multi_results[shown_query]
+        st.session_state.selected_images = []
+        st.session_state.grid_page = 0
+        st.session_state.grid_version += 1
+
+def toggle_selection(img_path, widget_key):
+    """Checkbox callback: update the selection without a full page rerun"""
+    if st.session_state[widget_key]:
+        if img_path not in st.session_state.selected_images:
+            st.session_state.selected_images.append(img_path)
+    elif img_path in st.session_state.selected_images:
+        st.session_state.selected_images.remove(img_path)
+
+def set_page_selection(page_images, selected):
+    """Select or deselect every image on the current page"""
+    chosen = set(st.session_state.selected_images)
+    if selected:
+        st.session_state.selected_images += [p for p in page_images if p not in chosen]
+    else:
+        st.session_state.selected_images = [p for p in st.session_state.selected_images if p not in set(page_images)]
+    # Checkboxes only take their value on creation, so give them new keys
+    st.session_state.grid_version += 1
+
+# Only this part of the page reruns on selection and paging clicks
+@run_as_fragment
+def render_results_grid():
+    detected_images = st.session_state.detected_images
+    selected = set(st.session_state.selected_images)
     
     # Save button at the top (only enabled when images are selected)
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        if len(st.session_state.selected_images) > 0:
-            if st.button(f"💾 Save {len(st.session_state.selected_images)} Selected Image(s)", type="primary", use_container_width=True):
+        if len(selected) > 0:
+            if st.button(f"💾 Save {len(selected)} Selected Image(s)", type="primary", use_container_width=True):
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 folder_name = f"{st.session_state.search_query.replace(' ','_')}_{timestamp}"
                 save_path = Path(output_base) / folder_name
@@ -408,32 +831,50 @@ if st.session_state.detected_images:
                 for img_path in st.session_state.selected_images:
                     shutil.copy(img_path, save_path)
                 
-                st.success(f"✅ Successfully saved {len(st.session_state.selected_images)} image(s) to: {save_path}")
+                st.success(f"✅ Successfully saved {len(selected)} image(s) to: {save_path}")
                 st.balloons()
         else:
             st.button(f"💾 Save Selected Images", disabled=True, use_container_width=True)
             st.caption("Select at least one image to enable save")
     
-    st.markdown("### 🖼️ Click on images to select/deselect")
-    st.caption(f"Selected: {len(st.session_state.selected_images)} / {len(st.session_state.detected_images)}")
+    st.markdown("### 🖼️ Tick images to select/deselect")
+    
+    # Pagination: only the current page's thumbnails are sent to the browser
+    page_size = st.session_state.grid_page_size
+    page_count = max(1, -(-len(detected_images) // page_size))
+    page = min(st.session_state.grid_page, page_count - 1)
+    
+    nav = st.columns([1, 1, 2, 2, 1, 1])
+    with nav[0]:
+        if st.button("⬅️ Prev", disabled=page == 0, use_container_width=True):
+            page -= 1
+    with nav[1]:
+        if st.button("Next ➡️", disabled=page >= page_count - 1, use_container_width=True):
+            page += 1
+    with nav[2]:
+        st.selectbox("Images per page", GRID_PAGE_SIZES, key="grid_page_size", label_visibility="collapsed",
+                     format_func=lambda n: f"{n} per page")
+    st.session_state.grid_page = page
+    page_images = [img_path for img_path, _ in detected_images[page * page_size:(page + 1) * page_size]]
+    with nav[3]:
+        st.caption(f"Page {page + 1}/{page_count} · Selected: {len(selected)} / {len(detected_images)}")
+    with nav[4]:
+        st.button("☑️ Page", on_click=set_page_selection, args=(page_images, True),
+                  help="Select every image on this page", use_container_width=True)
+    with nav[5]:
+        st.button("⬜ Page", on_click=set_page_selection, args=(page_images, False),
+                  help="Deselect every image on this page", use_container_width=True)
     
     # Display images in grid
     cols = st.columns(5)
-    for i, (img_path, explanation) in enumerate(st.session_state.detected_images):
+    for i, (img_path, explanation) in enumerate(detected_images[page * page_size:(page + 1) * page_size]):
         with cols[i % 5]:
-            is_selected = img_path in st.session_state.selected_images
-            
-            # Create clickable image with selection state
-            if st.button(
-                f"{'✅ ' if is_selected else '⬜ '}{Path(img_path).name}",
-                key=f"imgbtn_{i}",
-                use_container_width=True
-            ):
-                if is_selected:
-                    st.session_state.selected_images.remove(img_path)
-                else:
-                    st.session_state.selected_images.append(img_path)
-                st.rerun()
+            is_selected = img_path in selected
+            widget_key = f"select_{st.session_state.grid_version}_{img_path}"
+            st.checkbox(
+                Path(img_path).name, value=is_selected, key=widget_key,
+                on_change=toggle_selection, args=(img_path, widget_key)
+            )
             
             # Display image with border based on selection
             if is_selected:
@@ -441,9 +882,31 @@ if st.session_state.detected_images:
             else:
                 st.markdown('<div class="image-container image-unselected">', unsafe_allow_html=True)
             
-            st.image(str(img_path), use_container_width=True)
+            # Small cached JPEG instead of the original
+            try:
+                thumb_path = thumbnail_cache.get_path(
+                    img_path, st.session_state.content_hashes.get(img_path), long_edge=GRID_THUMBNAIL_EDGE
+                )
+            except Exception:
+                thumb_path = img_path
+            st.image(str(thumb_path), use_container_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
             
-            # Show explanation in expander
-            with st.expander("🤖 AI Analysis"):
-                st.caption(explanation)
\ No newline at end of file
+            # Show explanation (or the matched OCR text) in expander
+            with st.expander("📄 Text found" if st.session_state.text_search else "🤖 AI Analysis"):
+                st.caption(explanation)
+
+if st.session_state.detected_images:
+    st.markdown("---")
+    
+    # Show the expanded query used for this search
+    if st.session_state.expanded_query:
+        with st.expander("📋 View Expanded Query Used", expanded=False):
+            st.markdown(f'<div class="expanded-query">{st.session_state.expanded_query}</div>', unsafe_allow_html=True)
+    
+    render_results_grid()
+
+# Keep rendering new results while the background search is running
+if st.session_state.search_job and st.session_state.search_job.is_running:
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
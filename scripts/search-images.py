@@ -10,12 +10,36 @@ import sys
 import shutil
 import json
 import random
+import argparse
 from pathlib import Path
-from google import genai
 from google.genai import types
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def load_api_key():
-    """Load and randomly select an API key from creds.json"""
+from scripts.analysis_engine import AnalysisEngine
+from scripts.client_pool import get_client
+from scripts.key_scheduler import KeyScheduler, is_rate_limit_error, retry_delay, DEFAULT_RPM, DEFAULT_RPD
+from scripts.image_cache import ImageAnalysisCache
+from scripts.folder_manifest import FolderManifest
+from scripts.thumbnails import ThumbnailCache, DEFAULT_LONG_EDGE, DEFAULT_QUALITY
+from scripts.batch_classifier import classify_images, chunked
+from scripts.perceptual_hash import dedupe_entries, DEFAULT_THRESHOLD
+from scripts.media_loader import HEIC_BACKEND, HEIC_EXTENSIONS
+from scripts.image_quality import (
+    QualityFilter, score_folder, describe_rejections,
+    DEFAULT_MIN_SHARPNESS, DEFAULT_MAX_CLIPPED, DEFAULT_MIN_SHORT_EDGE
+)
+
+MODEL_NAME = "gemini-2.0-flash-exp"
+MAX_RETRY_ROUNDS = 3  # Times an unanswered or rate-limited image is resubmitted to the engine
+
+SEARCH_CRITERIA = "Find images of a person wearing a black long-sleeve shirt (e.g., dress shirt or button-up). The sleeves must be rolled up past the wrist and the forearms visible. Exclude t-shirts, polos, short-sleeve shirts, tank tops, and sleeveless garments."
+
+SEARCH_PROMPT = SEARCH_CRITERIA + """
+Answer ONLY "Yes" or "No", followed by a brief explanation.
+"""
+
+def load_api_keys():
+    """Load all API keys from creds.json (in random order)"""
     creds_file = Path(__file__).parent / "creds.json"
     
     if not creds_file.exists():
@@ -44,11 +68,11 @@ def load_api_key():
             print("Error: No API keys found in creds.json")
             sys.exit(1)
         
-        # Randomly select one API key
-        selected_key = random.choice(api_keys)
-        print(f"Using API key: {selected_key[:20]}...")
+        # Shuffle so repeated runs don't always lean on the same key first
+        random.shuffle(api_keys)
+        print(f"Loaded {len(api_keys)} API key(s)")
         
-        return selected_key
+        return api_keys
         
     except json.JSONDecodeError as e:
         print(f"Error: Invalid JSON format in creds.json: {e}")
@@ -57,50 +81,27 @@ def load_api_key():
         print(f"Error reading creds.json: {e}")
         sys.exit(1)
 
-def get_mime_type(image_path):
-    """Determine MIME type from file extension"""
-    extension = Path(image_path).suffix.lower()
-    mime_types = {
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.png': 'image/png',
-        '.webp': 'image/webp',
-        '.gif': 'image/gif',
-        '.bmp': 'image/bmp'
-    }
-    return mime_types.get(extension, 'image/jpeg')
-
-def is_image_file(filename):
-    """Check if file is an image based on extension"""
-    image_extensions = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.heic'}
-    return Path(filename).suffix.lower() in image_extensions
-
-def analyze_image(image_path, client):
+def analyze_image(image_path, client, thumbnails, content_hash=None, on_rate_limit=None):
     """
-    Analyze a single image to detect sleeve rolling
-    Returns: True if sleeves are being rolled, False otherwise
+    Analyze a single image to detect sleeve rolling.
+    Uploads a downscaled JPEG thumbnail rather than the original file.
+    on_rate_limit(error) is called if the request was rejected with a 429.
+    Returns: (is_rolling, response_text, succeeded)
     """
     try:
-        # Load image
-        with open(image_path, 'rb') as f:
-            image_bytes = f.read()
-        
-        mime_type = get_mime_type(image_path)
+        # Load (or create) the cached thumbnail
+        image_bytes = thumbnails.get_bytes(image_path, content_hash)
         
         # Create image part
         image = types.Part.from_bytes(
             data=image_bytes,
-            mime_type=mime_type
+            mime_type='image/jpeg'
         )
         
         # Generate content 
-        prompt = """Find images of a person wearing a black long-sleeve shirt (e.g., dress shirt or button-up). The sleeves must be rolled up past the wrist and the forearms visible. Exclude t-shirts, polos, short-sleeve shirts, tank tops, and sleeveless garments.
-Answer ONLY "Yes" or "No", followed by a brief explanation.
-"""
-
         response = client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=[prompt, image]
+            model=MODEL_NAME,
+            contents=[SEARCH_PROMPT, image]
         )
         
         response_text = response.text.strip()
@@ -108,48 +109,211 @@ Answer ONLY "Yes" or "No", followed by a brief explanation.
         # Check if response indicates sleeve rolling
         is_rolling = response_text.lower().startswith('yes')
         
-        return is_rolling, response_text
+        return is_rolling, response_text, True
         
     except Exception as e:
         print(f"  ⚠ Error analyzing {image_path}: {e}")
-        return False, str(e)
+        if on_rate_limit and is_rate_limit_error(e):
+            on_rate_limit(e)
+        return False, str(e), False
 
-def process_folder(input_folder, output_folder):
+def analyze_batch(entries, client, thumbnails, on_rate_limit=None):
     """
-    Process all images in input folder and copy matching ones to output folder
+    Analyze several images in one request.
+    Entries the batch left unanswered (failed request or unparseable verdict),
+    and single images rejected with a 429, come back as None, so the caller
+    can resubmit them as single-image tasks that each go through the key
+    scheduler.
+    Returns: list of (is_rolling, response_text, succeeded) or None, one per entry
     """
-    # Load API key from creds.json
-    api_key = load_api_key()
+    if len(entries) == 1:
+        rate_limited = []
+        
+        def note_rate_limit(e):
+            rate_limited.append(e)
+            if on_rate_limit:
+                on_rate_limit(e)
+        
+        result = analyze_image(entries[0].path, client, thumbnails, entries[0].content_hash, note_rate_limit)
+        return [None if rate_limited else result]
+    
+    try:
+        parts = [
+            types.Part.from_bytes(data=thumbnails.get_bytes(e.path, e.content_hash), mime_type='image/jpeg')
+            for e in entries
+        ]
+        verdicts = classify_images(client, SEARCH_CRITERIA, parts, MODEL_NAME)
+    except Exception as e:
+        print(f"  ⚠ Batch request failed, {len(entries)} images will be retried one by one: {e}")
+        if on_rate_limit and is_rate_limit_error(e):
+            on_rate_limit(e)
+        verdicts = {}
     
-    # Create client with API key directly
-    client = genai.Client(api_key=api_key)
+    return [(*verdicts[i], True) if i in verdicts else None for i in range(len(entries))]
+
+def process_folder(input_folder, output_folder, max_in_flight=8, per_key_limit=2, ordered=False,
+                   max_edge=DEFAULT_LONG_EDGE, quality=DEFAULT_QUALITY, batch_size=1,
+                   rpm=DEFAULT_RPM, rpd=DEFAULT_RPD, dedupe_threshold=DEFAULT_THRESHOLD,
+                   quality_filter=QualityFilter()):
+    """
+    Process all images in input folder and copy matching ones to output folder.
+    Images are analyzed concurrently; matches are copied as results arrive.
+    
+    Args:
+        input_folder: Folder containing images to analyze
+        output_folder: Folder matching images are copied to
+        max_in_flight: Maximum number of analysis requests in flight at once
+        per_key_limit: Maximum concurrent requests per API key
+        ordered: Report results in folder order instead of completion order
+        max_edge: Long edge in pixels of the thumbnail uploaded to the model
+        quality: JPEG quality of the uploaded thumbnail
+        batch_size: Images packed into each request (1 = one image per request)
+        rpm: Requests per minute allowed per API key
+        rpd: Requests per day allowed per API key
+        dedupe_threshold: Analyze one image per near-duplicate cluster (dHash bit
+                          threshold, 0 = identical files only, None = analyze all);
+                          the others get the representative's verdict
+        quality_filter: QualityFilter; blurry, badly exposed and tiny images are
+                        skipped without analysis (None = analyze all)
+    """
+    # Load API keys from creds.json
+    api_keys = load_api_keys()
     
     # Create output folder if it doesn't exist
     os.makedirs(output_folder, exist_ok=True)
     
-    # Get all image files
+    # Get all image files (only new or changed files are read and hashed)
     input_path = Path(input_folder)
     if not input_path.exists():
         print(f"Error: Input folder '{input_folder}' does not exist.")
         sys.exit(1)
     
-    image_files = [f for f in input_path.iterdir() if f.is_file() and is_image_file(f.name)]
+    manifest = FolderManifest(input_folder)
+    diff = manifest.refresh()
+    entries = manifest.entries()
     
-    if not image_files:
+    if not entries:
         print(f"No image files found in '{input_folder}'")
         sys.exit(1)
     
-    print(f"Found {len(image_files)} images to process")
+    if HEIC_BACKEND is None:
+        heic_count = sum(entry.path.suffix.lower() in HEIC_EXTENSIONS for entry in entries)
+        if heic_count:
+            print(f"Warning: {heic_count} HEIC images can't be decoded; install pillow-heif to include them")
+    
+    cache = ImageAnalysisCache()
+    thumbnails = ThumbnailCache(long_edge=max_edge, quality=quality)
+    
+    # Forget results for files that were deleted or replaced
+    stale_hashes = manifest.stale_hashes(diff)
+    evicted = cache.evict_images(stale_hashes)
+    thumbnails.evict(stale_hashes)
+    
+    # Unusable shots never reach the model (scores are kept in the manifest)
+    usable, rejected = entries, {}
+    if quality_filter is not None:
+        score_folder(
+            manifest, entries,
+            progress_callback=lambda done, total: print(f"\rQuality scoring {done}/{total}",
+                                                    end="\n" if done == total else "", flush=True)
+        )
+        usable, rejected = quality_filter.split(entries)
+    
+    # Burst shots and re-saves: only one image per cluster goes to the model
+    duplicates = {}
+    representatives = usable
+    if dedupe_threshold is not None:
+        representatives, duplicates = dedupe_entries(
+            usable, threshold=dedupe_threshold,
+            progress_callback=lambda done, total: print(f"\rPerceptual hashing {done}/{total}",
+                                                    end="\n" if done == total else "", flush=True)
+        )
+    
+    # Reuse earlier results for images already analyzed with this prompt
+    cached_results = []
+    to_analyze = []
+    for entry in representatives:
+        cached = cache.get(entry.path, SEARCH_PROMPT, entry.content_hash)
+        if cached:
+            cached_results.append((entry, cached))
+        else:
+            to_analyze.append(entry)
+    
+    # Paces requests to each key's quota and benches keys that still get 429s
+    scheduler = KeyScheduler(api_keys, rpm=rpm, rpd=rpd)
+    
+    def analyze(batch, key):
+        results = analyze_batch(
+            batch, get_client(key), thumbnails,
+            on_rate_limit=lambda e: scheduler.report_rate_limited(key, retry_delay(e))
+        )
+        if any(result and result[2] for result in results):
+            scheduler.report_success(key)
+        return results
+    
+    engine = AnalysisEngine(
+        api_keys,
+        analyze,
+        max_in_flight=max_in_flight,
+        per_key_limit=per_key_limit,
+        scheduler=scheduler
+    )
+    
+    print(f"Found {len(entries)} images to process")
+    print(f"Folder changes: {len(diff.added)} new, {len(diff.changed)} changed, "
+          f"{len(diff.removed)} removed ({evicted} cache entries evicted)")
     print(f"Output folder: {output_folder}")
+    if rejected:
+        print(f"Quality filter: skipping {len(entries) - len(usable)} images "
+              f"({describe_rejections(rejected)})")
+    if duplicates:
+        print(f"Near-duplicates: {len(usable) - len(representatives)} images share a verdict with "
+              f"one of {len(duplicates)} cluster representatives")
+    print(f"Cached results: {len(cached_results)} (analyzing {len(to_analyze)})")
+    print(f"Concurrency: {engine.max_in_flight} requests in flight ({per_key_limit} per key), "
+          f"{batch_size} image(s) per request")
+    print(f"Rate limits: {rpm} requests/min and {rpd} requests/day per key "
+          f"({rpm * len(api_keys)}/min combined)")
     print("-" * 60)
     
     processed = 0
     matched = 0
     
-    for image_file in image_files:
-        print(f"\n[{processed + 1}/{len(image_files)}] Processing: {image_file.name}")
-        
-        is_rolling, explanation = analyze_image(image_file, client)
+    def analyzed():
+        for entry, (is_rolling, explanation) in cached_results:
+            yield entry.path, (is_rolling, explanation), " (cached)"
+        # Images a batch left unanswered, or rejected with a 429, go back to the
+        # engine as single-image tasks, so every retry is paced by the scheduler
+        # (a rate-limited key is benched and the retry lands on another one)
+        batches = chunked(to_analyze, batch_size)
+        for retry_round in range(MAX_RETRY_ROUNDS + 1):
+            unanswered = []
+            for batch, batch_results in engine.run(batches, ordered=ordered):
+                for entry, result in zip(batch, batch_results):
+                    if result is None:
+                        unanswered.append(entry)
+                        continue
+                    is_rolling, explanation, succeeded = result
+                    # Failed calls are not cached so they are retried next run
+                    if succeeded:
+                        cache.set(entry.path, SEARCH_PROMPT, is_rolling, explanation, entry.content_hash)
+                    yield entry.path, (is_rolling, explanation), ""
+            if not unanswered:
+                return
+            if retry_round < MAX_RETRY_ROUNDS:
+                print(f"\n  ↻ Retrying {len(unanswered)} unanswered or rate-limited image(s)")
+            batches = [[entry] for entry in unanswered]
+        for entry in unanswered:
+            yield entry.path, (False, f"Error: no answer after {MAX_RETRY_ROUNDS} retries"), ""
+    
+    def results():
+        for image_file, verdict, source in analyzed():
+            yield image_file, verdict, source
+            for duplicate in duplicates.get(image_file, []):
+                yield duplicate, verdict, f" (near-duplicate of {image_file.name})"
+    
+    for image_file, (is_rolling, explanation), source in results():
+        print(f"\n[{processed + 1}/{len(usable)}] Processed{source}: {image_file.name}")
         
         if is_rolling:
             # Copy file to output folder with same filename
@@ -168,23 +332,128 @@ def process_folder(input_folder, output_folder):
     print(f"PROCESSING COMPLETE")
     print("=" * 60)
     print(f"Total images processed: {processed}")
+    if rejected:
+        print(f"Skipped by quality filter: {len(entries) - len(usable)} ({describe_rejections(rejected)})")
     print(f"Images with rolled sleeves: {matched}")
+    print(f"Cache hit rate: {cache.get_stats()['hit_rate']}")
+    throttled = sum(s["rate_limited"] for s in scheduler.get_stats().values())
+    print(f"Rate-limited requests: {throttled}")
     print(f"Output folder: {output_folder}")
     print("=" * 60 + "\n")
 
 def main():
     """Main function"""
-    if len(sys.argv) < 3:
-        print("Usage: python sleeve_detector.py <input_folder> <output_folder>")
-        print("\nExample:")
-        print("  python sleeve_detector.py ./images ./rolled_sleeves")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Copy images matching the prompt from input_folder to output_folder",
+        epilog="Example:\n  python search-images.py ./images ./rolled_sleeves --workers 16",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("input_folder", help="Folder containing images to analyze")
+    parser.add_argument("output_folder", help="Folder matching images are copied to")
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=8,
+        help="Maximum analysis requests in flight at once (default: 8)"
+    )
+    parser.add_argument(
+        "--per-key",
+        type=int,
+        default=2,
+        help="Maximum concurrent requests per API key (default: 2)"
+    )
+    parser.add_argument(
+        "--ordered",
+        action="store_true",
+        help="Report results in folder order instead of as they complete"
+    )
+    parser.add_argument(
+        "--max-edge",
+        type=int,
+        default=DEFAULT_LONG_EDGE,
+        help=f"Long edge in pixels of the image uploaded to the model (default: {DEFAULT_LONG_EDGE})"
+    )
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=DEFAULT_QUALITY,
+        help=f"JPEG quality of the uploaded image (default: {DEFAULT_QUALITY})"
+    )
+    parser.add_argument(
+        "-b", "--batch-size",
+        type=int,
+        default=1,
+        help="Images packed into each request; unparsed verdicts fall back to single calls (default: 1)"
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=DEFAULT_RPM,
+        help=f"Requests per minute allowed per API key (default: {DEFAULT_RPM})"
+    )
+    parser.add_argument(
+        "--rpd",
+        type=float,
+        default=DEFAULT_RPD,
+        help=f"Requests per day allowed per API key (default: {DEFAULT_RPD})"
+    )
+    parser.add_argument(
+        "--dedupe-threshold",
+        type=int,
+        default=DEFAULT_THRESHOLD,
+        help="Analyze one image per cluster of near-duplicates (burst shots, re-saves) and copy "
+             f"the verdict to the rest; max perceptual-hash bit difference (default: {DEFAULT_THRESHOLD})"
+    )
+    parser.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Analyze every image, even identical copies"
+    )
+    parser.add_argument(
+        "--min-sharpness",
+        type=float,
+        default=DEFAULT_MIN_SHARPNESS,
+        help="Skip blurry images: minimum Laplacian variance at 512px, 0 = off "
+             f"(default: {DEFAULT_MIN_SHARPNESS:g})"
+    )
+    parser.add_argument(
+        "--max-clipped",
+        type=float,
+        default=DEFAULT_MAX_CLIPPED,
+        help="Skip images with more than this fraction of pure black or blown-out pixels, 1 = off "
+             f"(default: {DEFAULT_MAX_CLIPPED:g})"
+    )
+    parser.add_argument(
+        "--min-size",
+        type=int,
+        default=DEFAULT_MIN_SHORT_EDGE,
+        help=f"Skip images whose short edge is below this many pixels (default: {DEFAULT_MIN_SHORT_EDGE})"
+    )
+    parser.add_argument(
+        "--no-quality-filter",
+        action="store_true",
+        help="Analyze every image, however blurry or badly exposed"
+    )
     
-    input_folder = sys.argv[1]
-    output_folder = sys.argv[2]
+    args = parser.parse_args()
     
     # Process folder
-    process_folder(input_folder, output_folder)
+    process_folder(
+        args.input_folder,
+        args.output_folder,
+        max_in_flight=args.workers,
+        per_key_limit=args.per_key,
+        ordered=args.ordered,
+        max_edge=args.max_edge,
+        quality=args.quality,
+        batch_size=max(1, args.batch_size),
+        rpm=args.rpm,
+        rpd=args.rpd,
+        dedupe_threshold=None if args.no_dedupe else args.dedupe_threshold,
+        quality_filter=None if args.no_quality_filter else QualityFilter(
+            args.min_sharpness, args.max_clipped, args.min_size
+        )
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
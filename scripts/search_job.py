@@ -0,0 +1,123 @@
+"""
+search_job.py
+
+Background search job for the Streamlit image search page.
+The analysis loop runs in a worker thread, so the page can render matches as
+they arrive instead of blocking until the whole folder is done. The job object
+lives in st.session_state and survives reruns; every completed image is
+checkpointed in the job (and in the analysis cache by the caller), so a
+cancelled or interrupted job resumes with only the remaining images.
+"""
+
+import threading
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# process_batch(batch, job) -> ({item: result}, {item: error_message})
+ProcessBatch = Callable[[List[Any], "SearchJob"], Tuple[Dict[Any, Any], Dict[Any, str]]]
+
+
+class SearchJob:
+    """
+    Runs process_batch over items in a background thread.
+
+    Args:
+        items: Work items (image paths), processed in order
+        process_batch: Called with each batch and the job; returns results for
+                       completed items and error messages for failed ones.
+                       Failed items are retried when the job is resumed.
+        batch_size: Items handed to process_batch at a time
+        context: Free-form data the page needs to render results (queries etc.)
+    """
+
+    def __init__(self, items: List[Any], process_batch: ProcessBatch,
+                 batch_size: int = 1, context: Optional[Dict] = None):
+        self.items = list(items)
+        self.process_batch = process_batch
+        self.batch_size = max(1, int(batch_size))
+        self.context = context or {}
+        self.results: Dict[Any, Any] = {}   # completed items, in completion order
+        self.failed: Dict[Any, str] = {}
+        self.status = "pending"             # pending | running | cancelled | done | failed
+        self.message = ""                   # latest warning (rate limits etc.)
+        self.current = ""                   # latest progress line
+        self.error = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def processed(self) -> int:
+        return len(self.results) + len(self.failed)
+
+    def remaining(self) -> List[Any]:
+        """Items not completed yet (including failed ones, which are retried)"""
+        with self._lock:
+            return [item for item in self.items if item not in self.results]
+
+    def start(self):
+        """Start, or resume after cancel/failure, with the remaining items"""
+        if self.is_running:
+            return
+        self._cancel.clear()
+        with self._lock:
+            self.failed.clear()
+            self.status = "running"
+            self.error = None
+            self.message = ""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    resume = start
+
+    def cancel(self):
+        """Stop after the batch in flight; completed results are kept"""
+        self._cancel.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Consistent copy of the job's progress for rendering"""
+        with self._lock:
+            return {
+                "results": dict(self.results),
+                "failed": dict(self.failed),
+                "status": self.status,
+                "message": self.message,
+                "current": self.current,
+                "error": self.error,
+                "processed": self.processed,
+                "total": len(self.items),
+            }
+
+    # Duck-type the st.empty() placeholders the API helpers report to
+    def warning(self, message: str):
+        with self._lock:
+            self.message = message
+
+    def text(self, message: str):
+        with self._lock:
+            self.current = message
+
+    def _run(self):
+        pending = self.remaining()
+        try:
+            for start in range(0, len(pending), self.batch_size):
+                if self._cancel.is_set():
+                    break
+                batch = pending[start:start + self.batch_size]
+                done, failed = self.process_batch(batch, self)
+                with self._lock:
+                    self.results.update(done)
+                    self.failed.update(failed)
+                    self.message = ""
+            with self._lock:
+                unfinished = self.processed < len(self.items)
+                self.status = "cancelled" if self._cancel.is_set() and unfinished else "done"
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                self.status = "failed"
+                self.error = str(e)
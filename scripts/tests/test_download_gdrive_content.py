@@ -0,0 +1,158 @@
+"""
+Tests for the Drive folder downloader (download-gdrive-content.py) against
+an in-memory fake of the Drive service.
+
+Run from the repository root:  python -m pytest scripts/tests
+"""
+
+import hashlib
+import importlib.util
+import os
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "download-gdrive-content.py")
+FOLDER = "application/vnd.google-apps.folder"
+
+
+def load_downloader():
+    # Hyphenated script name, so it can't be imported by name
+    spec = importlib.util.spec_from_file_location("download_gdrive_content", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+gdrive = load_downloader()
+
+
+class FakeRequest:
+    def __init__(self, result):
+        self._result = result
+        self.headers = {}
+
+    def execute(self, num_retries=0):
+        return self._result(self.headers)
+
+
+class FakeFiles:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q, fields, pageSize, pageToken=None):
+        parent = q.split("'")[1]
+        children = [meta for meta, _ in self.drive.files.values() if meta.get("parent") == parent]
+        start = int(pageToken or 0)
+        page = children[start:start + self.drive.page_size]
+        result = {"files": page}
+        if start + self.drive.page_size < len(children):
+            result["nextPageToken"] = str(start + self.drive.page_size)
+        return FakeRequest(lambda headers: result)
+
+    def get_media(self, fileId):
+        def serve(headers):
+            first, last = headers["Range"][len("bytes="):].split("-")
+            self.drive.ranges.append((fileId, int(first)))
+            return self.drive.served(fileId)[int(first):int(last) + 1]
+        return FakeRequest(serve)
+
+
+class FakeDrive:
+    """Files are {id: (metadata, content)}; `corrupt` holds ids served with one byte flipped"""
+
+    def __init__(self, page_size=1000):
+        self.files = {}
+        self.corrupt = set()
+        self.ranges = []
+        self.page_size = page_size
+
+    def add(self, file_id, name, content=b"", parent="root", mime_type="image/jpeg"):
+        meta = {"id": file_id, "name": name, "mimeType": mime_type, "parent": parent}
+        if mime_type != FOLDER:
+            meta.update(size=str(len(content)), md5Checksum=hashlib.md5(content).hexdigest())
+        self.files[file_id] = (meta, content)
+        return meta
+
+    def served(self, file_id):
+        content = self.files[file_id][1]
+        if file_id in self.corrupt:
+            content = bytes([content[0] ^ 0xFF]) + content[1:]
+        return content
+
+
+class FakeService:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def files(self):
+        return FakeFiles(self.drive)
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(gdrive, "CHUNK_SIZE", 4)
+
+
+def test_part_file_resumes_where_it_stopped(tmp_path, small_chunks):
+    drive = FakeDrive()
+    content = b"0123456789abcdef"
+    item = drive.add("f1", "photo.jpg", content)
+    target = str(tmp_path / "photo.jpg")
+    with open(target + ".part", "wb") as f:
+        f.write(content[:6])
+
+    resumed = gdrive.download_file(FakeService(drive), item, target)
+
+    assert resumed == 6
+    assert [first for _, first in drive.ranges] == [6, 10, 14]
+    assert open(target, "rb").read() == content
+    assert not os.path.exists(target + ".part")
+
+
+def test_md5_mismatch_discards_the_download(tmp_path, small_chunks):
+    drive = FakeDrive()
+    item = drive.add("f1", "photo.jpg", b"0123456789")
+    drive.corrupt.add("f1")
+    target = str(tmp_path / "photo.jpg")
+
+    with pytest.raises(IOError, match="md5 mismatch"):
+        gdrive.download_file(FakeService(drive), item, target)
+    assert not os.path.exists(target)
+    assert not os.path.exists(target + ".part")
+
+    # The next run starts from scratch and succeeds
+    drive.corrupt.clear()
+    assert gdrive.download_file(FakeService(drive), item, target) == 0
+    assert open(target, "rb").read() == b"0123456789"
+
+
+def test_stale_local_file_is_downloaded_again(tmp_path, small_chunks):
+    drive = FakeDrive()
+    drive.add("f1", "fresh.jpg", b"new bytes!")
+    drive.add("f2", "same.jpg", b"unchanged")
+    # Same size as the Drive copy but different content
+    (tmp_path / "fresh.jpg").write_bytes(b"old bytes!")
+    (tmp_path / "same.jpg").write_bytes(b"unchanged")
+
+    stats = gdrive.download_folder(lambda: FakeService(drive), "root", str(tmp_path), workers=2)
+
+    assert (stats.downloaded, stats.skipped, stats.failed) == (1, 1, 0)
+    assert (tmp_path / "fresh.jpg").read_bytes() == b"new bytes!"
+    assert {file_id for file_id, _ in drive.ranges} == {"f1"}
+
+
+def test_same_name_files_are_both_kept(tmp_path, small_chunks):
+    drive = FakeDrive(page_size=2)
+    drive.add("f1", "IMG_1.jpg", b"first")
+    drive.add("f2", "IMG_1.jpg", b"second")
+    drive.add("f3", "img_1.JPG", b"third")
+    drive.add("d1", "album", mime_type=FOLDER)
+    drive.add("f4", "IMG_1.jpg", b"nested", parent="d1")
+
+    stats = gdrive.download_folder(lambda: FakeService(drive), "root", str(tmp_path), workers=3)
+
+    assert stats.failed == 0 and stats.downloaded == 4
+    assert (tmp_path / "IMG_1.jpg").read_bytes() == b"first"
+    assert (tmp_path / "IMG_1 (2).jpg").read_bytes() == b"second"
+    assert (tmp_path / "img_1 (3).JPG").read_bytes() == b"third"
+    assert (tmp_path / "album" / "IMG_1.jpg").read_bytes() == b"nested"
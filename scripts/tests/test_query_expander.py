@@ -0,0 +1,61 @@
+"""
+Tests for query normalisation and expansion-cache reuse (query_expander.py).
+
+Run from the repository root:  python -m pytest scripts/tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from scripts.query_expander import QueryExpansionCache, normalize_query
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return QueryExpansionCache(str(tmp_path / "query_cache.db"))
+
+
+# Pairs that look alike character by character but mean different things
+DIFFERENT_MEANING = [
+    ("long sleeve shirt", "long sleeve tshirt"),
+    ("man wearing black shirt with rolled sleeves", "man wearing black shirt with unrolled sleeves"),
+    ("woman holding coffee cup at the beach", "woman holding coffee cup at the bench"),
+    ("girl wearing sunglasses and hat", "girl wearing sunglasses and cap"),
+    ("two men in frame", "three men in frame"),
+    ("red dress", "green dress"),
+    ("last shirt", "lastshirt"),
+]
+
+# Spelling, plural and synonym variants of one query
+SAME_MEANING = [
+    ("White T-Shirt", "white tshirts"),
+    ("white tee", "a photo of a white t shirt"),
+    ("grey colour hoodie", "Gray color hoodies"),
+    ("rolled sleeves", "Rolled sleeve."),
+]
+
+
+@pytest.mark.parametrize("cached, query", DIFFERENT_MEANING)
+def test_different_queries_do_not_share_an_expansion(cache, cached, query):
+    cache.add(cached, f"expansion of {cached}")
+    assert cache.lookup(query) is None
+    assert cache.lookup(cached) == (f"expansion of {cached}", normalize_query(cached))
+
+
+@pytest.mark.parametrize("cached, query", SAME_MEANING)
+def test_variants_share_an_expansion(cache, cached, query):
+    cache.add(cached, f"expansion of {cached}")
+    hit = cache.lookup(query)
+    assert hit is not None
+    assert hit[0] == f"expansion of {cached}"
+
+
+def test_other_process_rows_are_picked_up(tmp_path):
+    first = QueryExpansionCache(str(tmp_path / "query_cache.db"))
+    second = QueryExpansionCache(str(tmp_path / "query_cache.db"))
+    first.add("blue denim jacket", "denim")
+    assert second.lookup("Blue denim jackets") == ("denim", "blue denim jacket")
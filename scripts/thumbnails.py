@@ -0,0 +1,87 @@
+"""
+thumbnails.py
+
+On-disk cache of downscaled JPEG thumbnails, keyed by image content hash.
+Used for model uploads (instead of full-resolution originals) and for the
+Streamlit result grid, so each image is decoded and resized only once.
+"""
+
+import sys
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.content_hash import get_hasher
+from scripts.media_loader import load_image
+
+DEFAULT_LONG_EDGE = 1024  # Plenty for a yes/no vision check
+DEFAULT_QUALITY = 85
+
+
+def make_thumbnail(image_path: Path, long_edge: int = DEFAULT_LONG_EDGE,
+                   quality: int = DEFAULT_QUALITY) -> bytes:
+    """Decode, orient, downscale and JPEG-encode an image"""
+    # Draft decoding, and the grid/upload sizes share one decode (media_loader LRU)
+    img = load_image(image_path, long_edge)
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+class ThumbnailCache:
+    """
+    Thumbnails are stored as <cache_dir>/<hash[:2]>/<hash>_<edge>_q<quality>.jpg,
+    so different sizes of the same image can live side by side.
+    """
+
+    def __init__(self, cache_dir: str = "thumbnail_cache",
+                 long_edge: int = DEFAULT_LONG_EDGE, quality: int = DEFAULT_QUALITY):
+        self.cache_dir = Path(__file__).parent / cache_dir
+        self.long_edge = long_edge
+        self.quality = quality
+
+    def get_path(self, image_path: Path, content_hash: Optional[str] = None,
+                 long_edge: Optional[int] = None, quality: Optional[int] = None) -> Path:
+        """
+        Return the path of the cached thumbnail, creating it if needed.
+
+        Args:
+            image_path: Original image
+            content_hash: Content hash if already known (e.g. from folder_manifest)
+            long_edge: Override the default long-edge size in pixels
+            quality: Override the default JPEG quality
+        """
+        long_edge = long_edge or self.long_edge
+        quality = quality or self.quality
+        content_hash = content_hash or get_hasher().digest(image_path)
+
+        thumb_path = self.cache_dir / content_hash[:2] / f"{content_hash}_{long_edge}_q{quality}.jpg"
+        if thumb_path.exists():
+            return thumb_path
+
+        data = make_thumbnail(image_path, long_edge, quality)
+        thumb_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so concurrent workers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=thumb_path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, thumb_path)
+        return thumb_path
+
+    def evict(self, content_hashes) -> int:
+        """Delete all cached sizes for the given content hashes"""
+        removed = 0
+        for content_hash in content_hashes:
+            for thumb_path in (self.cache_dir / content_hash[:2]).glob(f"{content_hash}_*.jpg"):
+                thumb_path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def get_bytes(self, image_path: Path, content_hash: Optional[str] = None,
+                  long_edge: Optional[int] = None, quality: Optional[int] = None) -> bytes:
+        """Return the thumbnail JPEG bytes (see get_path)"""
+        return self.get_path(image_path, content_hash, long_edge, quality).read_bytes()